@@ -0,0 +1,260 @@
+"""
+Micro-benchmarks for the hot paths of the Dash app, on synthetic data (see synthetic_data.py).
+
+For every scale, this generates a synthetic data set, loads the app on it in a fresh process
+(COUNTY_RESULTS_DATA_DIR), and times create_map, update_heatmap, update_scatter (also with a filter expression),
+calculate_state_summary, county filter masks and the bin_counties_* functions. Each case records its median and
+best wall time, its peak Python memory (tracemalloc) and, for figures, the size of the figure JSON.
+
+With --backends memory sqlite, every case is also timed with the sqlite backend (cfg.DATA_BACKEND, see
+dash_app/county_results_sql.py), on a database built from the same data set. Its result cache is cleared
+before every run, so each run pays for its queries. Every case also records the process RSS after it ran.
+
+Results are compared with a stored baseline (benchmarks/baseline.json by default); the run fails
+(exit code 1) when any time, peak memory or JSON size is worse than the baseline by more than --threshold.
+Timings are machine-specific, so record a baseline on the machine that runs the comparison.
+
+Run from the top-level of the repo:
+    python benchmarks/bench_hot_paths.py --scales 1 10                   # compare with the baseline
+    python benchmarks/bench_hot_paths.py --scales 1 10 --save-baseline   # record a new baseline
+    python benchmarks/bench_hot_paths.py --scales 1 10 --backends memory sqlite
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+BENCHMARKS_DIR = os.path.dirname(os.path.abspath(__file__))
+DASH_APP_DIR = os.path.join(BENCHMARKS_DIR, "..", "dash_app")
+DEFAULT_BASELINE = os.path.join(BENCHMARKS_DIR, "baseline.json")
+DATABASE_NAME = "us_county_election_results.db"
+
+# Differences below these are noise, whatever the relative change
+MIN_TIME_DIFFERENCE_S = 0.002
+MIN_MEMORY_DIFFERENCE_MB = 0.5
+
+
+def load_cases():
+    """
+    Import the app on the data set in COUNTY_RESULTS_DATA_DIR and return {case name: zero-argument function}.
+    Must run in the process that will time the cases, with dash_app/ as working directory.
+    """
+    sys.path.insert(0, DASH_APP_DIR)
+    import dash
+    import app  # noqa: F401  (registers the pages, which load the data)
+    import county_results_utils as cutils
+    import county_results_data as cdata
+    import county_results_sql as csql
+    import county_results_filters as cfilters
+
+    pages = {page["module"].rsplit(".", 1)[-1]: sys.modules[page["module"]] for page in dash.page_registry.values()}
+    nationwide_map, heatmap, scatterplot = pages["nationwide_map"], pages["heatmap"], pages["scatterplot_tool"]
+
+    year = max(cdata.load_available_years())
+    # The state with the most counties is the slowest one to draw
+    big_state = cdata.county_rows(year)["state_name"].value_counts().index[0]
+    county_filter = f"population_pct_hispanic_{year} > 0.3 and votes_total_{year} > 50000 and region = Southwest"
+
+    cases = {
+        "create_map[All, margin_bin]": lambda: nationwide_map.create_map(year, "All", "margin_bin"),
+        "create_map[state, votes_total]": lambda: nationwide_map.create_map(year, big_state, "votes_total"),
+        "update_heatmap[state, margin_bin]": lambda: heatmap.update_heatmap(big_state, year, "margin_bin"),
+        "update_scatter[All]": lambda: scatterplot.update_scatter(
+            f"votes_pct_democrat_{year - 4}", f"votes_pct_democrat_{year}",
+            f"population_pct_hispanic_{year}", f"votes_total_{year}", "All"
+        ),
+        "update_scatter[filter]": lambda: scatterplot.update_scatter(
+            f"votes_pct_democrat_{year - 4}", f"votes_pct_democrat_{year}",
+            f"population_pct_hispanic_{year}", f"votes_total_{year}", "All", "auto", county_filter
+        ),
+        "county_mask[uncached]": lambda: (cfilters._mask.cache_clear(), cfilters.county_mask(county_filter)),
+    }
+    if cdata.BACKEND == "sqlite":
+        cases["calculate_state_summary[state]"] = lambda: cdata.get_state_summary(big_state, year)
+        caches = [
+            csql.county_rows, csql.state_summary, cdata._overall_column, heatmap._queried_treemap_layout, cfilters._mask
+        ]
+
+        def uncached(func):
+            # Every run queries the database, as on a cache miss
+            def run():
+                for cache in caches:
+                    cache.cache_clear()
+                return func()
+            return run
+        return {name: uncached(func) for name, func in cases.items()}
+
+    df = cdata.load_county_data_by_year()
+    cases.update({
+        "calculate_state_summary[state]": lambda: cutils.calculate_state_summary(df, big_state, year),
+        "bin_counties_by_margin": lambda: cutils.bin_counties_by_margin(df["votes_pct_two_party_democrat"]),
+        "bin_counties_by_margin_in_votes": lambda: cutils.bin_counties_by_margin_in_votes(df["margin_in_votes"]),
+        "bin_counties_by_swing": lambda: cutils.bin_counties_by_swing(df["votes_pct_swing_from_prev_election"]),
+    })
+    return cases
+
+
+def write_database(data_dir):
+    """Load a data set's by-year csv into a sqlite database next to it, indexed like the pipeline's. Returns its path."""
+    import sqlite3
+    import pandas as pd
+
+    path = os.path.join(data_dir, DATABASE_NAME)
+    if os.path.exists(path):
+        return path
+    df = pd.read_csv(os.path.join(data_dir, "county_election_data_by_year.csv"), dtype={"county_fips": str})
+    # The pipeline's table has no bin codes, the app computes them
+    df = df.drop(columns=[c for c in df.columns if c.endswith("_code")])
+    tmp_path = f"{path}.tmp"
+    with sqlite3.connect(tmp_path) as con:
+        df.to_sql("final__county_election_data_by_year", con, index=False)
+        con.execute(
+            "create index final__county_election_data_by_year__year_state_name"
+            " on final__county_election_data_by_year (year, state_name)"
+        )
+    con.close()
+    os.replace(tmp_path, path)
+    return path
+
+
+def measure_case(func, repeat):
+    """Median/best time over `repeat` runs (after one warm-up), then one more run under tracemalloc."""
+    result = func()
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        times.append(time.perf_counter() - start)
+
+    tracemalloc.start()
+    func()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+
+    import county_results_memory as cmemory
+    return {
+        "rss_mb": cmemory.process_rss_bytes() / 2**20,
+        "time_median_s": statistics.median(times),
+        "time_best_s": min(times),
+        "peak_memory_mb": peak / 2**20,
+        # Size of what the browser would receive, for figures
+        "json_bytes": len(result.to_json()) if hasattr(result, "to_json") and hasattr(result, "data") else None,
+    }
+
+
+def run_cases(repeat):
+    """Time every case in this process, printing the results as JSON on stdout."""
+    os.chdir(DASH_APP_DIR)
+    cases = load_cases()
+    results = {name: measure_case(func, repeat) for name, func in cases.items()}
+    print(json.dumps(results))
+
+
+def run_scale(scale, repeat, data_root, backend="memory"):
+    """Generate a data set at `scale` and time every case on it in a fresh process, with the given data backend."""
+    sys.path.insert(0, BENCHMARKS_DIR)
+    import synthetic_data
+
+    data_dir = os.path.join(data_root, f"scale_{scale:g}")
+    if not os.path.exists(os.path.join(data_dir, "county_election_data_by_year.csv")):
+        synthetic_data.write_data_set(data_dir, scale)
+    env = dict(os.environ, COUNTY_RESULTS_DATA_DIR=os.path.abspath(data_dir), COUNTY_RESULTS_DATA_BACKEND=backend)
+    if backend == "sqlite":
+        env["COUNTY_RESULTS_DATABASE"] = os.path.abspath(write_database(data_dir))
+    output = subprocess.run(
+        [sys.executable, os.path.abspath(__file__), "--run-cases", "--repeat", str(repeat)],
+        env=env, check=True, capture_output=True, text=True
+    ).stdout
+    # The app may log to stdout while loading; the results are the last line
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def compare(results, baseline, threshold):
+    """
+    Compare results with the baseline, both {scale: {case: metrics}}.
+
+    Returns:
+        List of human-readable regressions, empty when everything is within the threshold
+    """
+    checks = [
+        # Best of several runs is far less noisy than the median on a shared machine
+        ("time_best_s", MIN_TIME_DIFFERENCE_S),
+        ("peak_memory_mb", MIN_MEMORY_DIFFERENCE_MB),
+        ("json_bytes", 0),
+    ]
+    regressions = []
+    for scale, cases in results.items():
+        for case, metrics in cases.items():
+            base = baseline.get(scale, {}).get(case)
+            if base is None:
+                continue
+            for metric, min_difference in checks:
+                new, old = metrics.get(metric), base.get(metric)
+                if new is None or old is None:
+                    continue
+                if new > old * (1 + threshold) and new - old > min_difference:
+                    regressions.append(f"scale {scale} {case}: {metric} {old:.4g} -> {new:.4g} (+{(new / old - 1) * 100:.0f}%)")
+    return regressions
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--scales", type=float, nargs="+", default=[1, 10], help="multiples of the real ~3,100 counties")
+    parser.add_argument("--repeat", type=int, default=5, help="timed runs per case")
+    parser.add_argument("--backends", nargs="+", default=["memory"], choices=["memory", "sqlite"], help="data backends to time")
+    parser.add_argument("--threshold", type=float, default=0.25, help="allowed relative regression (0.25 = 25%%)")
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE)
+    parser.add_argument("--save-baseline", action="store_true", help="write the results as the new baseline")
+    parser.add_argument("--data-dir", help="where to keep generated data sets (default: a temporary directory)")
+    parser.add_argument("--output", help="also write the results to this JSON file")
+    parser.add_argument("--run-cases", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.run_cases:
+        run_cases(args.repeat)
+        sys.exit(0)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        data_root = args.data_dir or tmp
+        # Results of the memory backend are keyed by the scale alone, like baselines recorded before --backends
+        results = {
+            f"{scale:g}" if backend == "memory" else f"{scale:g}-{backend}": run_scale(scale, args.repeat, data_root, backend)
+            for scale in args.scales for backend in args.backends
+        }
+
+    print(f"{'scale':>8}  {'case':<36} {'median ms':>10} {'best ms':>10} {'peak MB':>9} {'JSON KB':>9} {'RSS MB':>8}")
+    for scale, cases in results.items():
+        for case, m in cases.items():
+            json_kb = f"{m['json_bytes'] / 1024:>9.1f}" if m["json_bytes"] is not None else f"{'-':>9}"
+            print(
+                f"{scale:>8}  {case:<36} {m['time_median_s'] * 1000:>10.2f} {m['time_best_s'] * 1000:>10.2f} "
+                f"{m['peak_memory_mb']:>9.2f} {json_kb} {m.get('rss_mb', 0):>8.1f}"
+            )
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+
+    if args.save_baseline:
+        with open(args.baseline, "w") as f:
+            json.dump(results, f, indent=2)
+        print(f"Saved baseline to {args.baseline}")
+        sys.exit(0)
+
+    if not os.path.exists(args.baseline):
+        print(f"No baseline at {args.baseline}; run with --save-baseline first")
+        sys.exit(0)
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    regressions = compare(results, baseline, args.threshold)
+    if regressions:
+        print(f"\n{len(regressions)} regression(s) over {args.threshold:.0%}:")
+        for line in regressions:
+            print(f"  {line}")
+        sys.exit(1)
+    print(f"\nNo regressions over {args.threshold:.0%} against {args.baseline}")
@@ -0,0 +1,100 @@
+"""
+Benchmark election-night ingestion (pipeline/ingest_results.py) against reloading the whole dataset version.
+
+Publishes a copy of a data set (e.g. synthetic data, see synthetic_data.py) as a dataset version in a temporary
+directory, loads the app on it, then for each --counties N: drops a file of new results for N counties of the
+latest year, and times the ingester's upsert and publish, and the app's refresh (applying the update file and
+carrying the derived tables and page data over). For comparison it also times a full load of the same version
+with every derived table and page rebuilt, which is what a new pipeline run costs each worker.
+
+Run from the top-level of the repo:
+    python benchmarks/synthetic_data.py --scale 10 --output-dir /tmp/county_data_x10
+    python benchmarks/bench_ingest.py --data-dir /tmp/county_data_x10 --counties 10 100 1000
+"""
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+BENCHMARKS_DIR = os.path.dirname(os.path.abspath(__file__))
+DASH_APP_DIR = os.path.join(BENCHMARKS_DIR, "..", "dash_app")
+PIPELINE_DIR = os.path.join(BENCHMARKS_DIR, "..", "pipeline")
+DATA_SET = "county_election_data_by_year"
+
+
+def publish_copy(source_dir, data_dir):
+    """Publish source_dir's Arrow snapshot as the first dataset version of data_dir."""
+    from county_results import manifest as cmanifest
+
+    version = cmanifest.new_version()
+    path = os.path.join(cmanifest.version_dir(data_dir, version), f"{DATA_SET}.arrow")
+    shutil.copy(os.path.join(source_dir, f"{DATA_SET}.arrow"), path)
+    cmanifest.publish(data_dir, version, {DATA_SET: path})
+
+
+def drop_results(df, drop_dir, counties, seed):
+    """Write a drop file with new vote counts for `counties` random counties of the latest year."""
+    import numpy as np
+
+    latest = df[df["year"] == df["year"].max()].drop_duplicates("county_fips")
+    rows = latest.sample(min(counties, len(latest)), random_state=seed)
+    rows = rows[["county_fips", "year", "votes_democrat", "votes_republican", "votes_other"]].copy()
+    rows["votes_democrat"] += np.random.default_rng(seed).integers(1, 5000, len(rows))
+    path = os.path.join(drop_dir, f"{seed:06d}.csv")
+    rows.to_csv(path, index=False)
+    return path
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--data-dir", required=True, help="directory with a county_election_data_by_year.arrow")
+    parser.add_argument("--counties", type=int, nargs="+", default=[10, 100, 1000], help="counties per update")
+    args = parser.parse_args()
+
+    work_dir = tempfile.mkdtemp(prefix="bench_ingest_")
+    data_dir = os.path.join(work_dir, "final")
+    drop_dir = os.path.join(work_dir, "incoming")
+    os.makedirs(drop_dir)
+    source_dir = os.path.abspath(args.data_dir)
+    # The app reads COUNTY_RESULTS_DATA_DIR when it is imported
+    os.environ["COUNTY_RESULTS_DATA_DIR"] = data_dir
+    os.chdir(DASH_APP_DIR)
+    sys.path.insert(0, DASH_APP_DIR)
+    sys.path.insert(0, PIPELINE_DIR)
+    try:
+        publish_copy(source_dir, data_dir)
+        import ingest_results
+        import app  # noqa: F401
+        import county_results_data as cdata
+        import county_results_startup as cstartup
+
+        cdata.preload()
+        for name, builder in cstartup.builders():
+            builder()
+        table, manifest = ingest_results.load_published(data_dir)
+        options = argparse.Namespace(drop_dir=drop_dir, data_dir=data_dir, compact_after=10**9)
+        print(f"{len(table.df):,} rows")
+        print(f"{'counties':>8} {'ingest s':>10} {'refresh s':>10} {'full load s':>12}")
+        for seed, counties in enumerate(args.counties, 1):
+            path = drop_results(table.df, drop_dir, counties, seed)
+            start = time.perf_counter()
+            manifest = ingest_results.ingest([path], table, manifest, options, None)
+            ingest_seconds = time.perf_counter() - start
+
+            start = time.perf_counter()
+            cdata.refresh()
+            refresh_seconds = time.perf_counter() - start
+
+            # What the same version costs loaded from scratch
+            start = time.perf_counter()
+            full = cdata.load_snapshot(manifest)
+            with cdata.using(full):
+                cdata.preload()
+                for name, builder in cstartup.builders():
+                    builder()
+            full_seconds = time.perf_counter() - start
+            print(f"{counties:>8} {ingest_seconds:>10.3f} {refresh_seconds:>10.3f} {full_seconds:>12.3f}")
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
@@ -0,0 +1,181 @@
+"""
+End-to-end benchmark of the data pipeline on synthetic raw files (see synthetic_raw_data.py).
+
+For every scale, this generates the raw files in a fresh temporary directory, then runs each stage
+there, in its own process, like the README's "Data Pipeline" steps:
+ 1. load_csvs      pipeline/load_csvs_to_raw_data_tables.py
+ 2. staging_sql    pipeline/transform_raw_data_to_staging.sql
+ 3. final_sql      pipeline/transform_staging_to_final.sql
+ 4. save_csvs      pipeline/save_datatables_to_csv.py
+
+Each stage records its wall time, the peak RSS of its process, and the database size after it ran.
+After the last stage, the row counts of every table (raw, staging and final) and output file are recorded too.
+The SQL files are run with pipeline/run_sql_file.py, like pipeline.sh does, which also records the wall time
+of every statement (its COUNTY_RESULTS_PROFILE_DIR timings); those are in the results too, per SQL stage.
+
+Linux/macOS only (per-process peak RSS comes from os.wait4). Run from the top-level of the repo:
+    python benchmarks/bench_pipeline.py --scales 0.5 1 2 --output pipeline_benchmark.json
+"""
+import argparse
+import json
+import os
+import platform
+import shutil
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import time
+
+BENCHMARKS_DIR = os.path.dirname(os.path.abspath(__file__))
+PIPELINE_DIR = os.path.join(BENCHMARKS_DIR, "..", "pipeline")
+DATABASE = "us_county_election_results.db"
+OUTPUT_FILES = [
+    "county_election_data_by_year.csv",
+    "county_election_data_overall.csv",
+]
+
+
+def stage_commands():
+    """(stage name, command) for every pipeline stage, run with the temporary directory as working directory."""
+    def sql(file_name):
+        path = os.path.abspath(os.path.join(PIPELINE_DIR, file_name))
+        return [sys.executable, os.path.abspath(os.path.join(PIPELINE_DIR, "run_sql_file.py")), DATABASE, path]
+
+    return [
+        ("load_csvs", [sys.executable, os.path.abspath(os.path.join(PIPELINE_DIR, "load_csvs_to_raw_data_tables.py"))]),
+        ("staging_sql", sql("transform_raw_data_to_staging.sql")),
+        ("final_sql", sql("transform_staging_to_final.sql")),
+        ("save_csvs", [sys.executable, os.path.abspath(os.path.join(PIPELINE_DIR, "save_datatables_to_csv.py"))]),
+    ]
+
+
+def run_stage(command, cwd, env=None):
+    """
+    Run one stage and wait for it with os.wait4, which returns the resource usage of that child only.
+
+    Returns:
+        {"wall_s", "peak_rss_mb"}
+    """
+    start = time.perf_counter()
+    process = subprocess.Popen(command, cwd=cwd, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+    _, status, usage = os.wait4(process.pid, 0)
+    wall = time.perf_counter() - start
+    # The process is already reaped; tell Popen so it doesn't wait for it again.
+    process.returncode = os.waitstatus_to_exitcode(status)
+    stderr = process.stderr.read().decode(errors="replace")
+    process.stderr.close()
+    if process.returncode != 0:
+        raise RuntimeError(f"{' '.join(command)} failed with exit code {process.returncode}:\n{stderr}")
+    # ru_maxrss is in kilobytes on Linux, bytes on macOS
+    peak_rss = usage.ru_maxrss * (1 if sys.platform == "darwin" else 1024)
+    return {"wall_s": wall, "peak_rss_mb": peak_rss / 2**20}
+
+
+def statement_seconds(profile_dir):
+    """Seconds per statement from the .folded timings run_sql_file.py wrote to profile_dir."""
+    seconds = {}
+    for file_name in sorted(os.listdir(profile_dir)):
+        with open(os.path.join(profile_dir, file_name)) as f:
+            for line in f:
+                stack, milliseconds = line.rstrip("\n").rsplit(" ", 1)
+                seconds[stack.split(";", 1)[1]] = int(milliseconds) / 1000
+    return seconds
+
+
+def count_rows(work_dir):
+    """Rows of every table in the database and of every output csv."""
+    con = sqlite3.connect(os.path.join(work_dir, DATABASE))
+    tables = [name for (name,) in con.execute("select name from sqlite_master where type = 'table' order by name")]
+    table_rows = {name: con.execute(f'select count(*) from "{name}"').fetchone()[0] for name in tables}
+    con.close()
+
+    final_dir = os.path.join(work_dir, "data", "final")
+    files = list(OUTPUT_FILES)
+    # Plus the files of the dataset version the save stage published (see county_results/manifest.py)
+    if os.path.exists(os.path.join(final_dir, "manifest.json")):
+        with open(os.path.join(final_dir, "manifest.json")) as f:
+            files += json.load(f)["files"].values()
+    outputs = {}
+    for file_name in files:
+        path = os.path.join(final_dir, file_name)
+        if not os.path.exists(path):
+            continue
+        outputs[file_name] = {"bytes": os.path.getsize(path)}
+        if file_name.endswith(".csv"):
+            with open(path, "rb") as f:
+                # Minus the header; the csv files have no quoted newlines
+                outputs[file_name]["rows"] = sum(1 for _ in f) - 1
+    return table_rows, outputs
+
+
+def run_scale(scale, seed, keep_dir=None):
+    """Generate raw files at `scale`, run every stage on them, and return the measurements."""
+    work_dir = tempfile.mkdtemp(prefix=f"pipeline_x{scale:g}_", dir=keep_dir)
+    try:
+        # Generate in a separate process too: Linux carries a process's peak RSS over fork and exec,
+        # so this process must stay small for the stages' peak RSS to be their own.
+        generate_s = run_stage([
+            sys.executable, os.path.join(BENCHMARKS_DIR, "synthetic_raw_data.py"),
+            "--scale", str(scale), "--seed", str(seed), "--output-dir", work_dir
+        ], work_dir)["wall_s"]
+        raw_dir = os.path.join(work_dir, "data", "raw_data")
+        raw_bytes = sum(os.path.getsize(os.path.join(raw_dir, f)) for f in os.listdir(raw_dir))
+        os.makedirs(os.path.join(work_dir, "data", "final"), exist_ok=True)
+
+        stages = {}
+        for name, command in stage_commands():
+            # Only the SQL stages are timed per statement: profiling the Python stages would slow them down
+            profile_dir = os.path.join(work_dir, "profiles", name) if name.endswith("_sql") else None
+            env = dict(os.environ, COUNTY_RESULTS_PROFILE_DIR=profile_dir) if profile_dir else None
+            stages[name] = run_stage(command, work_dir, env)
+            stages[name]["db_mb"] = os.path.getsize(os.path.join(work_dir, DATABASE)) / 2**20
+            if profile_dir:
+                stages[name]["statements"] = statement_seconds(profile_dir)
+        table_rows, outputs = count_rows(work_dir)
+    finally:
+        if keep_dir is None:
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+    return {
+        "counties": table_rows["raw_data__hmdb__county_seats"],
+        "generate_s": generate_s,
+        "raw_mb": raw_bytes / 2**20,
+        "stages": stages,
+        "total_s": sum(s["wall_s"] for s in stages.values()),
+        "table_rows": table_rows,
+        "outputs": outputs,
+        "work_dir": work_dir if keep_dir is not None else None,
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--scales", type=float, nargs="+", default=[0.5, 1], help="multiples of the real ~3,100 counties (up to ~16)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--keep-dir", help="keep every run's files in a directory under this one instead of deleting them")
+    parser.add_argument("--output", help="write the results to this JSON file")
+    args = parser.parse_args()
+
+    results = {
+        "python": platform.python_version(),
+        "sqlite": sqlite3.sqlite_version,
+        "machine": platform.machine(),
+        "cpus": os.cpu_count(),
+        "scales": {},
+    }
+    print(f"{'scale':>5} {'counties':>9} {'stage':<12} {'wall s':>9} {'peak RSS MB':>12} {'db MB':>9}")
+    for scale in args.scales:
+        result = run_scale(scale, args.seed, args.keep_dir)
+        results["scales"][f"{scale:g}"] = result
+        for name, stage in result["stages"].items():
+            print(
+                f"{scale:>5g} {result['counties']:>9,} {name:<12} {stage['wall_s']:>9.2f} "
+                f"{stage['peak_rss_mb']:>12.1f} {stage['db_mb']:>9.1f}"
+            )
+        by_year = result["outputs"].get("county_election_data_by_year.csv", {}).get("rows")
+        print(f"{scale:>5g} {result['counties']:>9,} {'total':<12} {result['total_s']:>9.2f}   by-year rows: {by_year}")
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
@@ -0,0 +1,364 @@
+"""
+Load test that replays user sessions against the Dash app with many concurrent users.
+
+A session is a sequence of page loads and _dash-update-component POSTs, in order, with the pauses between them.
+Sessions come from either of two sources:
+ - a recording: start the app with COUNTY_RESULTS_RECORD_SESSIONS=sessions.jsonl (see
+   dash_app/county_results_recorder.py), click through it in a browser, and pass --sessions sessions.jsonl
+ - without --sessions, a few scripted sessions (SCRIPTED_SESSIONS below): county map year/state changes and
+   dual-mode toggles, heatmap and scatterplot use
+
+Each virtual user replays sessions one after the other (every user starts at a different one) until --duration
+is over. Recorded pauses are multiplied by --think-time (0 = no pauses, as fast as possible).
+Throughput and p50/p95/p99 latency are reported per callback and per page.
+
+Unless --url is given, the app is started locally with gunicorn, like benchmarks/measure_workers.py.
+Run from the top-level of the repo, with data in data/final:
+    python benchmarks/load_test.py --users 200 --workers 8 --duration 60 --output load_test.json
+    python benchmarks/load_test.py --url http://127.0.0.1:8050 --sessions sessions.jsonl --think-time 1
+"""
+import argparse
+import json
+import os
+import signal
+import subprocess
+import sys
+import threading
+import time
+import urllib.request
+from collections import defaultdict
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from measure_workers import DASH_APP_DIR, callback_payload, wait_until_ready
+sys.path.insert(0, DASH_APP_DIR)
+import county_results_config as cfg
+
+# Longest pause kept from a recording, so a user who left a tab open doesn't stall a virtual user
+MAX_THINK_SECONDS = 10
+
+
+def page_load(path, pause=0.0):
+    return {"kind": "page", "page": path, "pause": pause}
+
+
+def callback(page, body, pause=0.0):
+    return {"kind": "callback", "page": page, "body": body, "pause": pause}
+
+
+def map_request(mode, year_left, year_right, state, color_left, color_right, views=None, county_filter=""):
+    return callback_payload(["county-map-dual.figure", "county-map-2-dual.figure", "county-map-views-dual.data"], {
+        ("comparison-mode-dual", "value"): mode,
+        ("year-dropdown-dual", "value"): year_left,
+        ("year-dropdown-2-dual", "value"): year_right,
+        ("state-dropdown-dual", "value"): state,
+        ("color-by-dropdown-dual", "value"): color_left,
+        ("color-by-dropdown-2-dual", "value"): color_right,
+        ("county-filter-dual", "value"): county_filter
+    }, state={("county-map-views-dual", "data"): views})
+
+
+def map_summary_request(state, year_left, year_right, mode):
+    return callback_payload("summary-table-container-dual.children", {
+        ("state-dropdown-dual", "value"): state,
+        ("year-dropdown-dual", "value"): year_left,
+        ("year-dropdown-2-dual", "value"): year_right,
+        ("comparison-mode-dual", "value"): mode
+    })
+
+
+def map_mode_request(mode):
+    outputs = [
+        f"{i}.style" for i in (
+            "left-controls-dual", "left-controls-title-dual", "left-year-control-dual", "left-color-control-dual",
+            "right-controls-dual", "left-map-container-dual", "right-map-container-dual"
+        )
+    ] + ["year-dropdown-dual.value", "color-by-dropdown-dual.value", "year-dropdown-2-dual.value", "color-by-dropdown-2-dual.value"]
+    return callback_payload(outputs, {("comparison-mode-dual", "value"): mode})
+
+
+def heatmap_requests(state, year, color):
+    return [
+        callback_payload("heatmap-squarify.figure", {
+            ("state-dropdown", "value"): state,
+            ("year-dropdown", "value"): year,
+            ("color-dim", "value"): color
+        }),
+        callback_payload("heatmap-summary-table.children", {
+            ("state-dropdown", "value"): state,
+            ("year-dropdown", "value"): year
+        }),
+    ]
+
+
+def scatter_request(x, y, color, size, state="All", render_mode="auto", county_filter=""):
+    return callback_payload("scatterplot.figure", {
+        ("x-axis", "value"): x,
+        ("y-axis", "value"): y,
+        ("color-dim", "value"): color,
+        ("size-dim", "value"): size,
+        ("state-filter", "value"): state,
+        ("scatter-render-mode", "value"): render_mode,
+        ("scatter-filter", "value"): county_filter
+    })
+
+
+def map_views(mode, year_left, year_right, state, color_left, color_right, county_filter="", previous=None):
+    """
+    The county-map-views-dual store after update_maps drew these panes (what the browser sends back as State).
+    previous is the store before: with cfg.COUNTY_MAP_PATCH_STATE_ZOOM on, a pane that only changed state on the
+    map of every county keeps that figure.
+    """
+    previous = previous or {}
+    panes = {"left": (year_left, color_left)}
+    if mode == "dual":
+        panes["right"] = (year_right, color_right)
+    views = dict(previous)
+    for pane, (year, color) in panes.items():
+        view = {"year": year, "state": state, "color": color, "filter": county_filter, "figure": state}
+        drawn = previous.get(pane)
+        if cfg.COUNTY_MAP_PATCH_STATE_ZOOM and drawn and drawn["figure"] == "All" and (
+            drawn["year"], drawn["color"], drawn["filter"]
+        ) == (year, color, county_filter):
+            view["figure"] = "All"
+        views[pane] = view
+    return views
+
+
+def county_map_session():
+    """Page load, a few years and states in single mode, then a comparison in dual mode."""
+    page = "/county-map"
+    steps = [page_load(page)]
+    view = views = None
+    for pause, (mode, year_left, year_right, state) in zip(
+        [0, 3, 3, 4, 3, 5, 3],
+        [("single", 2024, 2024, "All"), ("single", 2020, 2024, "All"), ("single", 2020, 2024, "Texas"),
+         ("single", 2020, 2024, "Georgia"), ("single", 2016, 2024, "Georgia"),
+         ("dual", 2000, 2024, "Georgia"), ("dual", 2000, 2024, "All")]
+    ):
+        if view is not None and mode != view[0]:
+            steps.append(callback(page, map_mode_request(mode), pause))
+            pause = 0
+        steps.append(callback(page, map_request(mode, year_left, year_right, state, "margin_bin", "margin_bin", views), pause))
+        steps.append(callback(page, map_summary_request(state, year_left, year_right, mode)))
+        view = (mode, year_left, year_right, state, "margin_bin", "margin_bin")
+        views = map_views(*view, previous=views)
+    return steps
+
+
+def heatmap_session():
+    page = "/heatmap"
+    steps = [page_load(page)]
+    for pause, (state, year, color) in zip(
+        [0, 3, 4, 3, 3],
+        [("Alabama", 2024, "winning_margin_in_votes_bin"), ("Texas", 2024, "winning_margin_in_votes_bin"),
+         ("Texas", 2024, "margin_bin"), ("Texas", 2016, "margin_bin"), ("California", 2016, "swing_bin")]
+    ):
+        figure, table = heatmap_requests(state, year, color)
+        steps += [callback(page, figure, pause), callback(page, table)]
+    return steps
+
+
+def scatterplot_session():
+    page = "/scatterplot"
+    steps = [page_load(page)]
+    for pause, args in zip([0, 4, 3, 3, 5], [
+        ("votes_pct_democrat_2020", "votes_pct_democrat_2024", "population_pct_hispanic_2024", "votes_total_2024"),
+        ("bachelor_degree_pct_of_adults_2024", "votes_pct_democrat_2024", "population_pct_hispanic_2024", "votes_total_2024"),
+        ("bachelor_degree_pct_of_adults_2024", "votes_pct_democrat_2024", "population_pct_black_2024", "votes_total_2024"),
+        ("bachelor_degree_pct_of_adults_2024", "votes_pct_democrat_2024", "population_pct_black_2024", "votes_total_2024", "Texas"),
+        ("bachelor_degree_pct_of_adults_2024", "votes_pct_democrat_2024", "population_pct_hispanic_2024", "votes_total_2024", "All",
+         "auto", "population_pct_hispanic_2024 > 0.3 and votes_total_2024 > 50000 and region = Southwest"),
+    ]):
+        steps.append(callback(page, scatter_request(*args), pause))
+    return steps
+
+
+SCRIPTED_SESSIONS = [county_map_session, heatmap_session, scatterplot_session]
+
+
+def load_sessions(path):
+    """
+    Read a recording (JSON lines from county_results_recorder) into sessions: lists of steps in time order,
+    each with the pause since the previous step of the same session.
+    """
+    events = defaultdict(list)
+    with open(path) as f:
+        for line in f:
+            if line.strip():
+                event = json.loads(line)
+                events[event["session"]].append(event)
+    sessions = []
+    for session_events in events.values():
+        session_events.sort(key=lambda e: e["time"])
+        steps = []
+        previous = None
+        for event in session_events:
+            pause = min(event["time"] - previous, MAX_THINK_SECONDS) if previous is not None else 0.0
+            previous = event["time"]
+            if event["kind"] == "page":
+                steps.append(page_load(event["page"], pause))
+            elif event.get("body"):
+                steps.append(callback(event["page"], event["body"], pause))
+        if steps:
+            sessions.append(steps)
+    return sessions
+
+
+def step_label(step):
+    """Name a step is reported under: 'page load <path>', or the callback's output ids."""
+    if step["kind"] == "page":
+        return f"page load {step['page']}"
+    outputs = step["body"]["outputs"]
+    if not isinstance(outputs, list):
+        return outputs["id"]
+    return f"{outputs[0]['id']} (+{len(outputs) - 1})"
+
+
+def send(base_url, step):
+    """One step as the browser sends it. A page load also fetches the layout and callback graph, like Dash's renderer."""
+    if step["kind"] == "page":
+        for path in (step["page"], "/_dash-layout", "/_dash-dependencies"):
+            with urllib.request.urlopen(f"{base_url}{path}", timeout=60) as response:
+                response.read()
+        return
+    request = urllib.request.Request(
+        f"{base_url}/_dash-update-component", data=json.dumps(step["body"]).encode(),
+        headers={"Content-Type": "application/json"}
+    )
+    with urllib.request.urlopen(request, timeout=60) as response:
+        response.read()
+
+
+def run_load(base_url, sessions, users, duration, think_time):
+    """
+    Replay sessions with `users` concurrent virtual users for `duration` seconds.
+
+    Returns:
+        List of (label, page, seconds or None for an error) per request
+    """
+    samples = []
+    lock = threading.Lock()
+    stop_at = time.time() + duration
+
+    def user(offset):
+        i = offset
+        while time.time() < stop_at:
+            for step in sessions[i % len(sessions)]:
+                if step["pause"] and think_time:
+                    time.sleep(step["pause"] * think_time)
+                if time.time() >= stop_at:
+                    break
+                start = time.perf_counter()
+                try:
+                    send(base_url, step)
+                    elapsed = time.perf_counter() - start
+                except OSError:
+                    elapsed = None
+                with lock:
+                    samples.append((step_label(step), step["page"], elapsed))
+            i += 1
+
+    threads = [threading.Thread(target=user, args=(n,), daemon=True) for n in range(users)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return samples
+
+
+def percentile(sorted_values, p):
+    return sorted_values[min(len(sorted_values) - 1, int(p * len(sorted_values)))] * 1000 if sorted_values else None
+
+
+def summarize(samples, duration):
+    """Throughput and latency percentiles per callback, per page, and overall."""
+    def stats(group):
+        latencies = sorted(s for s in group if s is not None)
+        return {
+            "requests": len(latencies),
+            "errors": len(group) - len(latencies),
+            "throughput_rps": len(latencies) / duration,
+            "latency_p50_ms": percentile(latencies, 0.50),
+            "latency_p95_ms": percentile(latencies, 0.95),
+            "latency_p99_ms": percentile(latencies, 0.99),
+        }
+
+    by_callback, by_page = defaultdict(list), defaultdict(list)
+    for label, page, elapsed in samples:
+        by_callback[label].append(elapsed)
+        by_page[page or "unknown"].append(elapsed)
+    return {
+        "overall": stats([s[2] for s in samples]),
+        "callbacks": {label: stats(group) for label, group in sorted(by_callback.items())},
+        "pages": {page: stats(group) for page, group in sorted(by_page.items())},
+    }
+
+
+def start_server(workers, port):
+    """Start the app with gunicorn (dash_app/gunicorn.conf.py) and wait until every worker is up."""
+    env = dict(os.environ, WEB_CONCURRENCY=str(workers), PORT=str(port))
+    server = subprocess.Popen(
+        [sys.executable, "-m", "gunicorn", "-c", "gunicorn.conf.py", "wsgi:server"],
+        cwd=DASH_APP_DIR, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+    try:
+        wait_until_ready(f"http://127.0.0.1:{port}", server.pid, workers)
+    except Exception:
+        server.kill()
+        raise
+    return server
+
+
+def print_table(title, rows):
+    print(f"\n{title:<44} {'req/s':>8} {'errors':>7} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8}")
+    for name, s in rows.items():
+        print(
+            f"{name[:44]:<44} {s['throughput_rps']:>8.1f} {s['errors']:>7} {s['latency_p50_ms'] or 0:>8.1f} "
+            f"{s['latency_p95_ms'] or 0:>8.1f} {s['latency_p99_ms'] or 0:>8.1f}"
+        )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sessions", help="recorded sessions (JSON lines); default: the scripted sessions")
+    parser.add_argument("--users", type=int, default=50, help="concurrent virtual users")
+    parser.add_argument("--duration", type=float, default=30, help="seconds of load")
+    parser.add_argument("--think-time", type=float, default=0.0, help="multiplier for the pauses between steps")
+    parser.add_argument("--url", help="test an app that is already running, instead of starting one")
+    parser.add_argument("--workers", type=int, default=4, help="gunicorn workers, when starting the app")
+    parser.add_argument("--port", type=int, default=8062)
+    parser.add_argument("--output", help="write the results to this JSON file")
+    args = parser.parse_args()
+
+    sessions = load_sessions(args.sessions) if args.sessions else [make() for make in SCRIPTED_SESSIONS]
+    if not sessions:
+        sys.exit(f"No sessions in {args.sessions}")
+
+    server = None if args.url else start_server(args.workers, args.port)
+    base_url = args.url or f"http://127.0.0.1:{args.port}"
+    try:
+        samples = run_load(base_url, sessions, args.users, args.duration, args.think_time)
+    finally:
+        if server is not None:
+            server.send_signal(signal.SIGTERM)
+            server.wait(timeout=30)
+
+    results = {
+        "users": args.users,
+        "duration_s": args.duration,
+        "think_time": args.think_time,
+        "workers": None if args.url else args.workers,
+        "sessions": len(sessions),
+        **summarize(samples, args.duration),
+    }
+    overall = results["overall"]
+    print(
+        f"{overall['requests']} requests, {overall['errors']} errors, {overall['throughput_rps']:.1f} req/s, "
+        f"p50 {overall['latency_p50_ms'] or 0:.1f} ms, p95 {overall['latency_p95_ms'] or 0:.1f} ms, p99 {overall['latency_p99_ms'] or 0:.1f} ms"
+    )
+    print_table("callback", results["callbacks"])
+    print_table("page", results["pages"])
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
@@ -0,0 +1,207 @@
+"""
+Measure memory and throughput of the production Dash server as the worker count grows.
+
+For each worker count, this starts gunicorn with dash_app/gunicorn.conf.py (wsgi:server), then:
+ - reads each worker's unique (USS) and proportional (PSS) memory from /proc/<pid>/smaps_rollup,
+   once right after boot and again after the load phase
+ - sends concurrent callback requests for a fixed time and reports throughput and latency
+
+Linux only (it reads /proc). Run from the top-level of the repo, with data in data/final:
+    python benchmarks/measure_workers.py --workers 1 2 4 8 --duration 20 --output worker_scaling.json
+--no-preload starts the workers without preload_app, each loading its own copy of the data (like the dev server
+did per process), for a before/after comparison.
+"""
+import argparse
+import json
+import os
+import signal
+import subprocess
+import sys
+import threading
+import time
+import urllib.request
+
+DASH_APP_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "dash_app")
+
+
+def callback_payload(output, inputs, state=None):
+    """
+    Body of a _dash-update-component POST, as the browser would send it.
+    `output` is "id.property", or a list of them for a callback with several outputs.
+    """
+    outputs = [output] if isinstance(output, str) else list(output)
+    specs = [dict(zip(("id", "property"), o.split("."))) for o in outputs]
+    return {
+        "output": outputs[0] if len(outputs) == 1 else f"..{'...'.join(outputs)}..",
+        "outputs": specs[0] if len(outputs) == 1 else specs,
+        "inputs": [{"id": i, "property": p, "value": v} for (i, p), v in inputs.items()],
+        "changedPropIds": [f"{i}.{p}" for i, p in inputs],
+        "state": [{"id": i, "property": p, "value": v} for (i, p), v in (state or {}).items()]
+    }
+
+
+# A small mix of the heavier callbacks, cycled through by every client.
+REQUESTS = [
+    callback_payload(["county-map-dual.figure", "county-map-2-dual.figure", "county-map-views-dual.data"], {
+        ("comparison-mode-dual", "value"): "single",
+        ("year-dropdown-dual", "value"): 2024,
+        ("year-dropdown-2-dual", "value"): 2024,
+        ("state-dropdown-dual", "value"): "All",
+        ("color-by-dropdown-dual", "value"): "margin_bin",
+        ("color-by-dropdown-2-dual", "value"): "margin_bin"
+    }, state={("county-map-views-dual", "data"): None}),
+    callback_payload("heatmap-squarify.figure", {
+        ("state-dropdown", "value"): "Alabama",
+        ("year-dropdown", "value"): 2024,
+        ("color-dim", "value"): "winning_margin_in_votes_bin"
+    }),
+    callback_payload("heatmap-summary-table.children", {
+        ("state-dropdown", "value"): "Alabama",
+        ("year-dropdown", "value"): 2020
+    }),
+]
+
+
+def read_memory_kb(pid):
+    # USS = private pages only this process holds; PSS also counts a fair share of shared pages.
+    fields = {}
+    with open(f"/proc/{pid}/smaps_rollup") as f:
+        for line in f:
+            parts = line.split()
+            if len(parts) >= 2 and parts[0].endswith(":") and parts[1].isdigit():
+                fields[parts[0][:-1]] = int(parts[1])
+    return {
+        "rss_kb": fields.get("Rss", 0),
+        "pss_kb": fields.get("Pss", 0),
+        "uss_kb": fields.get("Private_Clean", 0) + fields.get("Private_Dirty", 0)
+    }
+
+
+def child_pids(parent_pid):
+    children = []
+    for entry in os.listdir("/proc"):
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f"/proc/{entry}/stat") as f:
+                # The command name is in parentheses and may contain spaces, so split after it.
+                ppid = int(f.read().rsplit(")", 1)[1].split()[1])
+        except (OSError, IndexError, ValueError):
+            continue
+        if ppid == parent_pid:
+            children.append(int(entry))
+    return sorted(children)
+
+
+def wait_until_ready(base_url, master_pid, workers, timeout=120):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            with urllib.request.urlopen(f"{base_url}/", timeout=5) as response:
+                if response.status == 200 and len(child_pids(master_pid)) >= workers:
+                    return
+        except OSError:
+            pass
+        time.sleep(0.5)
+    raise RuntimeError(f"Server did not become ready within {timeout}s")
+
+
+def run_load(base_url, clients, duration):
+    latencies = []
+    errors = [0]
+    lock = threading.Lock()
+    stop_at = time.time() + duration
+
+    def client(offset):
+        i = offset
+        while time.time() < stop_at:
+            body = json.dumps(REQUESTS[i % len(REQUESTS)]).encode()
+            request = urllib.request.Request(
+                f"{base_url}/_dash-update-component", data=body, headers={"Content-Type": "application/json"}
+            )
+            start = time.perf_counter()
+            try:
+                with urllib.request.urlopen(request, timeout=60) as response:
+                    response.read()
+                elapsed = time.perf_counter() - start
+                with lock:
+                    latencies.append(elapsed)
+            except OSError:
+                with lock:
+                    errors[0] += 1
+            i += 1
+
+    threads = [threading.Thread(target=client, args=(n,)) for n in range(clients)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    latencies.sort()
+
+    def percentile(p):
+        return latencies[min(len(latencies) - 1, int(p * len(latencies)))] * 1000 if latencies else None
+
+    return {
+        "requests": len(latencies),
+        "errors": errors[0],
+        "throughput_rps": len(latencies) / duration,
+        "latency_p50_ms": percentile(0.50),
+        "latency_p95_ms": percentile(0.95)
+    }
+
+
+def measure(workers, port, clients, duration, preload=True):
+    env = dict(
+        os.environ, WEB_CONCURRENCY=str(workers), PORT=str(port), GUNICORN_PRELOAD_APP="1" if preload else "0"
+    )
+    server = subprocess.Popen(
+        [sys.executable, "-m", "gunicorn", "-c", "gunicorn.conf.py", "wsgi:server"],
+        cwd=DASH_APP_DIR, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+    base_url = f"http://127.0.0.1:{port}"
+    try:
+        wait_until_ready(base_url, server.pid, workers)
+        worker_pids = child_pids(server.pid)
+        memory_after_boot = [read_memory_kb(pid) for pid in worker_pids]
+        load = run_load(base_url, clients, duration)
+        memory_after_load = [read_memory_kb(pid) for pid in worker_pids]
+        return {
+            "workers": workers,
+            "preload": preload,
+            "clients": clients,
+            "master": read_memory_kb(server.pid),
+            "worker_memory_after_boot": memory_after_boot,
+            "worker_memory_after_load": memory_after_load,
+            "mean_worker_uss_kb_after_load": sum(m["uss_kb"] for m in memory_after_load) / len(memory_after_load),
+            **load
+        }
+    finally:
+        server.send_signal(signal.SIGTERM)
+        server.wait(timeout=30)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4, 8])
+    parser.add_argument("--clients", type=int, default=16, help="concurrent clients sending requests")
+    parser.add_argument("--duration", type=float, default=20, help="seconds of load per worker count")
+    parser.add_argument("--port", type=int, default=8061)
+    parser.add_argument("--no-preload", action="store_true", help="don't load the app in the master before forking")
+    parser.add_argument("--output", help="write all results to this JSON file")
+    args = parser.parse_args()
+
+    results = []
+    print(f"{'workers':>7} {'req/s':>8} {'p50 ms':>8} {'p95 ms':>8} {'worker USS MB':>14} {'worker PSS MB':>14}")
+    for workers in args.workers:
+        result = measure(workers, args.port, args.clients, args.duration, preload=not args.no_preload)
+        results.append(result)
+        pss = sum(m["pss_kb"] for m in result["worker_memory_after_load"]) / len(result["worker_memory_after_load"])
+        print(
+            f"{workers:>7} {result['throughput_rps']:>8.1f} {result['latency_p50_ms'] or 0:>8.1f} "
+            f"{result['latency_p95_ms'] or 0:>8.1f} {result['mean_worker_uss_kb_after_load'] / 1024:>14.1f} {pss / 1024:>14.1f}"
+        )
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
@@ -0,0 +1,128 @@
+"""
+Report what the Dash app holds in memory (see dash_app/county_results_memory.py), and what grows per request.
+
+By default this loads the app in this process with tracemalloc on, then prints:
+ - the deep memory of each loaded data frame, per column
+ - the entries and bytes of each cache (county map figures, overall columns, ...) and other long-lived objects
+ - the top allocation sites since startup
+With --requests N, it also replays the scripted sessions of load_test.py once to fill the caches, takes a
+snapshot, replays them N more times, and lists the allocation sites that grew in between: memory that keeps
+growing with N is a leak rather than a cache filling up.
+
+With --url, it prints the /memory report of a running app instead (start it with COUNTY_RESULTS_TRACEMALLOC=10
+for the allocation sites; --snapshot / --diff keep a baseline there and diff against it).
+
+Run from the top-level of the repo, with data in data/final:
+    python benchmarks/memory_report.py --requests 20 --output memory_report.json
+    python benchmarks/memory_report.py --url http://127.0.0.1:8050 --diff
+"""
+import argparse
+import json
+import os
+import sys
+import urllib.request
+
+BENCHMARKS_DIR = os.path.dirname(os.path.abspath(__file__))
+DASH_APP_DIR = os.path.join(BENCHMARKS_DIR, "..", "dash_app")
+
+
+def local_report(requests, top, frames):
+    """Load the app in this process and build the report, replaying `requests` rounds of sessions for the diff."""
+    # Must be set before the app (and county_results_memory) is imported
+    os.environ.setdefault("COUNTY_RESULTS_TRACEMALLOC", str(frames))
+    os.chdir(DASH_APP_DIR)
+    sys.path.insert(0, DASH_APP_DIR)
+    sys.path.insert(0, BENCHMARKS_DIR)
+    from app import server
+    import county_results_data as cdata
+    import county_results_memory as cmemory
+
+    cdata.preload()
+    if not requests:
+        return cmemory.memory_report(top=top)
+
+    import load_test
+    sessions = [make() for make in load_test.SCRIPTED_SESSIONS]
+    client = server.test_client()
+
+    def replay():
+        count = 0
+        for session in sessions:
+            for step in session:
+                if step["kind"] == "page":
+                    client.get(step["page"])
+                else:
+                    client.post("/_dash-update-component", json=step["body"])
+                count += 1
+        return count
+
+    # One round first, so caches that fill on first use aren't reported as growth
+    replay()
+    cmemory.take_baseline_snapshot()
+    replayed = sum(replay() for _ in range(requests))
+    report = cmemory.memory_report(top=top, diff=True)
+    report["replayed_requests"] = replayed
+    return report
+
+
+def remote_report(url, top, snapshot, diff):
+    query = f"top={top}" + ("&snapshot=1" if snapshot else "") + ("&diff=1" if diff else "")
+    with urllib.request.urlopen(f"{url.rstrip('/')}/memory?{query}", timeout=60) as response:
+        return json.load(response)
+
+
+def mb(n):
+    return f"{n / 2**20:>10.2f}" if n is not None else f"{'-':>10}"
+
+
+def print_report(report, columns):
+    print(f"pid {report['pid']}, RSS {mb(report['rss_bytes']).strip()} MB")
+    for name, frame in report["frames"].items():
+        print(f"\nframe {name}: {frame['rows']:,} rows x {frame['columns']} columns, {mb(frame['total_bytes']).strip()} MB")
+        print(f"  {'column':<44} {'dtype':<12} {'MB':>10}")
+        for column, c in list(frame["column_bytes"].items())[:columns]:
+            print(f"  {column:<44} {c['dtype']:<12} {mb(c['bytes'])}")
+        if len(frame["column_bytes"]) > columns:
+            print(f"  ... {len(frame['column_bytes']) - columns} more columns")
+    print(f"\n{'cache':<28} {'entries':>8} {'maxsize':>8} {'hits':>8} {'misses':>8} {'MB':>10}")
+    for name, c in report["caches"].items():
+        print(f"{name:<28} {c['entries']:>8} {str(c['maxsize']):>8} {c['hits']:>8} {c['misses']:>8} {mb(c['bytes'])}")
+    print(f"\n{'object':<28} {'MB':>10}")
+    for name, size in report["objects"].items():
+        print(f"{name:<28} {mb(size)}")
+
+    traced = report.get("tracemalloc")
+    if not traced:
+        print("\ntracemalloc is off (set COUNTY_RESULTS_TRACEMALLOC to a number of frames)")
+        return
+    print(f"\ntracemalloc: {mb(traced['traced_bytes']).strip()} MB traced, peak {mb(traced['peak_bytes']).strip()} MB")
+    for stat in traced["top"]:
+        print(f"  {mb(stat['bytes'])} MB {stat['blocks']:>9} blocks  {stat['where']}")
+    if traced.get("diff") is not None:
+        replayed = report.get("replayed_requests")
+        print(f"\ngrowth since the snapshot{f' ({replayed} requests)' if replayed else ''}:")
+        for stat in traced["diff"]:
+            print(f"  {stat['bytes_diff'] / 1024:>+10.1f} KB {stat['blocks_diff']:>+9} blocks  {stat['where']}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=0, help="rounds of scripted sessions to replay between snapshots")
+    parser.add_argument("--top", type=int, default=15, help="allocation sites to list")
+    parser.add_argument("--columns", type=int, default=20, help="columns to list per frame")
+    parser.add_argument("--frames", type=int, default=10, help="traceback frames kept by tracemalloc")
+    parser.add_argument("--url", help="report on a running app instead")
+    parser.add_argument("--snapshot", action="store_true", help="with --url: keep a snapshot to diff against later")
+    parser.add_argument("--diff", action="store_true", help="with --url: list growth since the last --snapshot")
+    parser.add_argument("--output", help="write the report to this JSON file")
+    args = parser.parse_args()
+
+    if args.url:
+        report = remote_report(args.url, args.top, args.snapshot, args.diff)
+    else:
+        report = local_report(args.requests, args.top, args.frames)
+    print_report(report, args.columns)
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
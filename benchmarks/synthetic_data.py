@@ -0,0 +1,202 @@
+"""
+Generate synthetic county election data with the same schema as the pipeline's final tables:
+data/final/county_election_data_by_year.csv (one row per county per year) and
+data/final/county_election_data_overall.csv (one row per county, metric_YEAR columns).
+
+The real data has ~3,100 counties x 7 elections; --scale multiplies the number of counties
+(up to 50x), keeping the 51 states and 7 election years, so the hot paths can be timed on bigger inputs.
+Values are random but internally consistent (percentages add up, margins/swing follow from the votes).
+
+Run from the top-level of the repo:
+    python benchmarks/synthetic_data.py --scale 10 --output-dir /tmp/county_data_x10
+"""
+import argparse
+import os
+import sys
+import numpy as np
+import pandas as pd
+
+from county_results import bins as cbins
+
+YEARS = [2000, 2004, 2008, 2012, 2016, 2020, 2024]
+REAL_COUNTY_COUNT = 3100
+
+STATES = {
+    "Alabama": "AL", "Alaska": "AK", "Arizona": "AZ", "Arkansas": "AR", "California": "CA", "Colorado": "CO",
+    "Connecticut": "CT", "Delaware": "DE", "District of Columbia": "DC", "Florida": "FL", "Georgia": "GA",
+    "Hawaii": "HI", "Idaho": "ID", "Illinois": "IL", "Indiana": "IN", "Iowa": "IA", "Kansas": "KS",
+    "Kentucky": "KY", "Louisiana": "LA", "Maine": "ME", "Maryland": "MD", "Massachusetts": "MA",
+    "Michigan": "MI", "Minnesota": "MN", "Mississippi": "MS", "Missouri": "MO", "Montana": "MT",
+    "Nebraska": "NE", "Nevada": "NV", "New Hampshire": "NH", "New Jersey": "NJ", "New Mexico": "NM",
+    "New York": "NY", "North Carolina": "NC", "North Dakota": "ND", "Ohio": "OH", "Oklahoma": "OK",
+    "Oregon": "OR", "Pennsylvania": "PA", "Rhode Island": "RI", "South Carolina": "SC", "South Dakota": "SD",
+    "Tennessee": "TN", "Texas": "TX", "Utah": "UT", "Vermont": "VT", "Virginia": "VA", "Washington": "WA",
+    "West Virginia": "WV", "Wisconsin": "WI", "Wyoming": "WY"
+}
+
+RACE_GROUPS = ["white", "black", "am_ind", "asian", "pacific", "two_races_nh", "hispanic"]
+
+# Columns of the by-year table, in the pipeline's order.
+BY_YEAR_COLUMNS = (
+    ["county_fips", "county_name", "county_seat", "state_name", "state_abbr", "year", "population_total"]
+    + [f"population_{g}" for g in RACE_GROUPS]
+    + ["population_over_18_total"]
+    + [f"population_pct_{g}" for g in RACE_GROUPS]
+    + ["population_pct_over_18", "bachelor_degree_pct_of_adults",
+       "median_household_income_2010", "poverty_pct_overall_2010", "poverty_pct_under_18_2010",
+       "votes_democrat", "votes_republican", "votes_other", "votes_total",
+       "votes_pct_democrat", "votes_pct_republican", "votes_pct_other",
+       "votes_pct_two_party_democrat", "votes_pct_two_party_republican",
+       "winning_party", "winning_margin", "winning_two_party_margin",
+       "votes_pct_partisan_index", "votes_pct_swing_from_prev_election"]
+)
+# Columns of the overall table that are one value per county; every other by-year column becomes metric_YEAR.
+OVERALL_IDENTIFIER_COLUMNS = [
+    "county_fips", "county_name", "county_seat", "state_name", "state_abbr",
+    "median_household_income_2010", "poverty_pct_overall_2010", "poverty_pct_under_18_2010"
+]
+
+
+def generate_counties(scale=1, seed=0):
+    """One row per county with its identifiers and the columns that don't change by year."""
+    rng = np.random.default_rng(seed)
+    n = int(REAL_COUNTY_COUNT * scale)
+    state_names = list(STATES)
+    # Uneven states, like the real ones (Texas has 254 counties, Delaware 3)
+    state_weights = rng.lognormal(0, 0.8, len(state_names))
+    state_index = np.sort(rng.choice(len(state_names), size=n, p=state_weights / state_weights.sum()))
+    # FIPS = 2-digit state number + county number within the state, wide enough for the largest state
+    county_number = pd.Series(state_index).groupby(state_index).cumcount().to_numpy() * 2 + 1
+    width = max(3, len(str(county_number.max())))
+    fips = [f"{s + 1:02d}{c:0{width}d}" for s, c in zip(state_index, county_number)]
+    return pd.DataFrame({
+        "county_fips": fips,
+        "county_name": [f"County {c}" for c in county_number],
+        "county_seat": [f"Seat {c}" for c in county_number],
+        "state_name": [state_names[s] for s in state_index],
+        "state_abbr": [STATES[state_names[s]] for s in state_index],
+        "median_household_income_2010": rng.lognormal(10.8, 0.25, n).round(0),
+        "poverty_pct_overall_2010": rng.beta(4, 22, n).round(3),
+        "poverty_pct_under_18_2010": rng.beta(5, 18, n).round(3),
+    })
+
+
+def generate_county_data_by_year(scale=1, seed=0):
+    """
+    Synthetic by-year table, with the same columns (and column order) as county_election_data_by_year.csv.
+
+    Args:
+        scale: Multiple of the real number of counties (~3,100)
+        seed: Random seed, so a scale always produces the same data
+
+    Returns:
+        DataFrame with one row per county per year in YEARS
+    """
+    rng = np.random.default_rng(seed + 1)
+    counties = generate_counties(scale, seed)
+    n = len(counties)
+
+    population = rng.lognormal(10.2, 1.3, n)
+    race_shares = rng.dirichlet([12, 2, 0.3, 0.5, 0.1, 0.4, 2], n)
+    college = rng.beta(3, 9, n)
+    lean = rng.normal(-0.25, 0.35, n)  # county lean in two-party margin, Republican-leaning on average
+
+    frames = []
+    previous_margin = None
+    for i, year in enumerate(YEARS):
+        dfy = counties.copy()
+        dfy["year"] = year
+        growth = (1 + rng.normal(0.03, 0.02, n)) ** i
+        pop = np.maximum((population * growth).round(), 50)
+        dfy["population_total"] = pop
+        for g, share in zip(RACE_GROUPS, race_shares.T):
+            dfy[f"population_{g}"] = (pop * share).round()
+        dfy["population_over_18_total"] = (pop * rng.uniform(0.7, 0.8, n)).round()
+        for g in RACE_GROUPS:
+            dfy[f"population_pct_{g}"] = (dfy[f"population_{g}"] / pop).round(5)
+        dfy["population_pct_over_18"] = (dfy["population_over_18_total"] / pop).round(5)
+        dfy["bachelor_degree_pct_of_adults"] = np.clip(college + 0.01 * i, 0, 1).round(5)
+
+        # Votes: turnout of adults, split by the county lean plus a national and local swing per year
+        total = np.maximum((dfy["population_over_18_total"] * rng.uniform(0.5, 0.7, n)).round(), 10)
+        other_share = rng.uniform(0.005, 0.05, n)
+        margin = np.clip(lean + rng.normal(0, 0.05) + rng.normal(0, 0.04, n), -0.95, 0.95)
+        dem_two_party = (1 + margin) / 2
+        dem = (total * (1 - other_share) * dem_two_party).round()
+        rep = (total * (1 - other_share) * (1 - dem_two_party)).round()
+        other = total - dem - rep
+        dfy["votes_democrat"] = dem
+        dfy["votes_republican"] = rep
+        dfy["votes_other"] = other
+        dfy["votes_total"] = total
+        dfy["votes_pct_democrat"] = (dem / total).round(5)
+        dfy["votes_pct_republican"] = (rep / total).round(5)
+        dfy["votes_pct_other"] = (other / total).round(5)
+        dfy["votes_pct_two_party_democrat"] = (dem / (dem + rep)).round(5)
+        dfy["votes_pct_two_party_republican"] = (rep / (dem + rep)).round(5)
+        signed_margin = dfy["votes_pct_democrat"] - dfy["votes_pct_republican"]
+        dfy["winning_party"] = np.where(dem > rep, "DEMOCRAT", "REPUBLICAN")
+        dfy["winning_margin"] = signed_margin.abs().round(5)
+        dfy["winning_two_party_margin"] = signed_margin.round(5)
+        national_two_party = dem.sum() / (dem.sum() + rep.sum())
+        dfy["votes_pct_partisan_index"] = (dfy["votes_pct_two_party_democrat"] - national_two_party).round(5)
+        dfy["votes_pct_swing_from_prev_election"] = (
+            np.nan if previous_margin is None else (signed_margin - previous_margin).round(5)
+        )
+        previous_margin = signed_margin
+        frames.append(dfy)
+
+    df = pd.concat(frames, ignore_index=True)[BY_YEAR_COLUMNS]
+    counts = [c for c in BY_YEAR_COLUMNS if c.startswith(("population_", "votes_")) and "_pct_" not in c]
+    df[counts + ["median_household_income_2010"]] = df[counts + ["median_household_income_2010"]].astype("int64")
+    return df.sort_values(["county_fips", "year"], ignore_index=True)
+
+
+def county_data_overall(df_by_year):
+    """Wide table (one row per county, metric_YEAR columns) built from the by-year table, like the pipeline's."""
+    metrics = [c for c in BY_YEAR_COLUMNS if c not in OVERALL_IDENTIFIER_COLUMNS and c != "year"]
+    wide = df_by_year.pivot(index="county_fips", columns="year", values=metrics)
+    # Year-major column order: every metric for 2000, then every metric for 2004, ...
+    wide = wide[[(m, y) for y in YEARS for m in metrics]]
+    wide.columns = [f"{m}_{y}" for m, y in wide.columns]
+    # Like the pipeline, no swing column for the first year
+    wide = wide.drop(columns=f"votes_pct_swing_from_prev_election_{YEARS[0]}")
+    identifiers = df_by_year.drop_duplicates("county_fips").set_index("county_fips")[OVERALL_IDENTIFIER_COLUMNS[1:]]
+    return identifiers.join(wide).reset_index()
+
+
+def write_data_set(output_dir, scale=1, seed=0, arrow=True):
+    """
+    Write the by-year and overall csv files (and the Arrow snapshot, if pyarrow is installed) to output_dir,
+    laid out like data/final so the Dash app can read them (see COUNTY_RESULTS_DATA_DIR in county_results_data.py).
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    df = generate_county_data_by_year(scale, seed)
+    cbins.add_bin_codes(df)
+    df.to_csv(os.path.join(output_dir, "county_election_data_by_year.csv"), index=False)
+    if arrow:
+        try:
+            sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "pipeline"))
+            from save_datatables_to_csv import save_arrow_snapshot
+        except ImportError:
+            # No pyarrow: the app falls back to the csv
+            pass
+        else:
+            save_arrow_snapshot(df, os.path.join(output_dir, "county_election_data_by_year.arrow"))
+    by_year_columns = [c for c in df.columns if not c.endswith("_bin_code")]
+    county_data_overall(df[by_year_columns]).to_csv(
+        os.path.join(output_dir, "county_election_data_overall.csv"), index=False
+    )
+    return df
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--scale", type=float, default=1, help="multiple of the real ~3,100 counties (1 to 50)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output-dir", required=True)
+    parser.add_argument("--no-arrow", action="store_true", help="only write the csv files")
+    args = parser.parse_args()
+
+    df = write_data_set(args.output_dir, args.scale, args.seed, arrow=not args.no_arrow)
+    print(f"Wrote {df['county_fips'].nunique():,} counties x {len(YEARS)} years to {args.output_dir}")
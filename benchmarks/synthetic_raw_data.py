@@ -0,0 +1,317 @@
+"""
+Generate synthetic raw input files for the pipeline, with the columns the pipeline reads from the real ones:
+ - MIT Election Lab countypres 2000-2024 and the tonmcg 2024 county results
+ - Census Bureau cc-est2019 / cc-est2024 alldata and the NBER coest00 intercensal file (by age group)
+ - Census Bureau SAIPE est10all (income/poverty 2010)
+ - USDA ERS Education, Poverty and Unemployment (long format)
+ - HMDB county seats
+
+--scale multiplies the real number of counties (~3,100). Counties are spread evenly over the 51 states and
+numbered within each state, so FIPS codes keep their real 2+3 digit format; that caps the scale at ~16x.
+The files are written with the real file names, under <output-dir>/data/raw_data/, where
+pipeline/load_csvs_to_raw_data_tables.py expects them when run from <output-dir>.
+
+Run from the top-level of the repo:
+    python benchmarks/synthetic_raw_data.py --scale 2 --output-dir /tmp/pipeline_x2
+"""
+import argparse
+import math
+import os
+import sys
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from synthetic_data import STATES, REAL_COUNTY_COUNT
+
+ELECTION_YEARS = [2000, 2004, 2008, 2012, 2016, 2020, 2024]
+MAX_COUNTIES_PER_STATE = 999
+
+# Race/ethnicity column groups of the Census alldata files, each as <PREFIX>_MALE and <PREFIX>_FEMALE
+RACE_PREFIXES = [
+    "WA", "BA", "IA", "AA", "NA", "TOM",
+    "WAC", "BAC", "IAC", "AAC", "NAC",
+    "NH", "NHWA", "NHBA", "NHIA", "NHAA", "NHNA", "NHTOM",
+    "NHWAC", "NHBAC", "NHIAC", "NHAAC", "NHNAC",
+    "H", "HWA", "HBA", "HIA", "HAA", "HNA", "HTOM",
+    "HWAC", "HBAC", "HIAC", "HAAC", "HNAC",
+]
+# Non-Hispanic single-race groups plus Hispanic add up to the whole population; the other groups are drawn from these.
+EXCLUSIVE_GROUPS = ["NHWA", "NHBA", "NHIA", "NHAA", "NHNA", "NHTOM", "H"]
+
+RAW_FILES = {
+    "mit": "mit_election_labs__countypres_2000-2024.csv",
+    "tonmcg": "tonmcg__2024_US_County_Level_Presidential_Results.csv",
+    "cc_est2019": "us_census_bureau__cc-est2019-alldata.csv",
+    "cc_est2024": "us_census_bureau__cc-est2024-alldata.csv",
+    "est10": "us_census_bureau__est10all.csv",
+    "nber": "nber__coest00intalldata.csv",
+    "usda_poverty": "usda__Poverty2023.csv",
+    "usda_unemployment": "usda__Unemployment2023.csv",
+    "usda_education": "usda__Education2023.csv",
+    "hmdb": "hmdb__county_seats.csv",
+}
+
+
+def generate_counties(scale=1, seed=0):
+    """One row per county: state/county FIPS numbers, names, and the values that drive every file."""
+    rng = np.random.default_rng(seed)
+    n = int(REAL_COUNTY_COUNT * scale)
+    per_state = math.ceil(n / len(STATES))
+    if per_state > MAX_COUNTIES_PER_STATE:
+        raise ValueError(f"scale {scale} needs {per_state} counties per state, over the {MAX_COUNTIES_PER_STATE} a FIPS code allows")
+    state_names = list(STATES)
+    state_index = np.arange(n) % len(STATES)
+    county_code = np.arange(n) // len(STATES) + 1
+    order = np.lexsort((county_code, state_index))
+    state_index, county_code = state_index[order], county_code[order]
+    return pd.DataFrame({
+        "state_code": state_index + 1,
+        "county_code": county_code,
+        "county_fips": (state_index + 1) * 1000 + county_code,
+        "state_name": [state_names[s] for s in state_index],
+        "state_abbr": [STATES[state_names[s]] for s in state_index],
+        "name": [f"Synthetic {c}" for c in county_code],
+        "population": rng.lognormal(10.2, 1.3, n),
+        "lean": rng.normal(-0.25, 0.35, n),
+        "college": rng.beta(3, 9, n),
+        "poverty": rng.beta(4, 22, n),
+        "income": rng.lognormal(10.8, 0.25, n),
+    })
+
+
+def _split_sexes(values):
+    male = np.round(values * 0.49)
+    return male, values - male
+
+
+def demographic_rows(counties, year_codes, age_groups, total_age_group, seed=0):
+    """
+    Census alldata-style rows: one per county x year code x age group, with TOT_POP and every race column.
+    The row for total_age_group holds the sum of the other age groups, like the real files.
+    """
+    rng = np.random.default_rng(seed)
+    n, n_years, ages = len(counties), len(year_codes), [a for a in age_groups if a != total_age_group]
+    age_shares = rng.dirichlet(np.full(len(ages), 8.0))
+    growth = 1 + 0.01 * np.arange(n_years)
+    # (county, year, age) populations
+    pop = np.round(counties["population"].to_numpy()[:, None, None] * growth[None, :, None] * age_shares[None, None, :])
+    group_shares = rng.dirichlet([12, 2, 0.3, 0.5, 0.1, 0.4, 2], n)
+
+    columns = {}
+    exclusive = {}
+    for g, share in zip(EXCLUSIVE_GROUPS, group_shares.T):
+        exclusive[g] = np.round(pop * share[:, None, None])
+    derived = {
+        "NH": sum(exclusive[g] for g in EXCLUSIVE_GROUPS if g != "H"),
+        "WA": exclusive["NHWA"] + np.round(exclusive["H"] * 0.6),
+        "BA": exclusive["NHBA"] + np.round(exclusive["H"] * 0.05),
+        "IA": exclusive["NHIA"] + np.round(exclusive["H"] * 0.05),
+        "AA": exclusive["NHAA"] + np.round(exclusive["H"] * 0.01),
+        "NA": exclusive["NHNA"],
+        "TOM": exclusive["NHTOM"] + np.round(exclusive["H"] * 0.1),
+    }
+    for prefix in RACE_PREFIXES:
+        if prefix in exclusive:
+            values = exclusive[prefix]
+        elif prefix in derived:
+            values = derived[prefix]
+        elif prefix.endswith("C"):
+            # "alone or in combination" is at least the "alone" count
+            values = np.round(derived.get(prefix[:-1], exclusive.get(prefix[:-1], pop * 0)) * 1.05)
+        else:
+            # Hispanic by race
+            values = np.round(exclusive["H"] * rng.uniform(0.01, 0.6))
+        columns[prefix] = values
+
+    # Append the total age group (sum of the others)
+    def with_total(values):
+        total = values.sum(axis=2, keepdims=True)
+        return np.concatenate([total, values], axis=2) if total_age_group == min(age_groups) else np.concatenate([values, total], axis=2)
+
+    shape_age_groups = [total_age_group] + ages if total_age_group == min(age_groups) else ages + [total_age_group]
+    n_age = len(shape_age_groups)
+    data = {
+        "county_index": np.repeat(np.arange(n), n_years * n_age),
+        "YEAR": np.tile(np.repeat(year_codes, n_age), n),
+        "AGEGRP": np.tile(shape_age_groups, n * n_years),
+    }
+    tot = with_total(pop).ravel()
+    data["TOT_POP"] = tot
+    data["TOT_MALE"], data["TOT_FEMALE"] = _split_sexes(tot)
+    for prefix, values in columns.items():
+        data[f"{prefix}_MALE"], data[f"{prefix}_FEMALE"] = _split_sexes(with_total(values).ravel())
+    df = pd.DataFrame(data)
+    numeric = df.columns.drop(["county_index", "YEAR", "AGEGRP"])
+    df[numeric] = df[numeric].astype("int64")
+    return df
+
+
+def census_alldata(counties, year_codes, seed):
+    """cc-est2019 / cc-est2024 alldata: STATE and COUNTY codes, YEAR codes, AGEGRP 0 (total) to 18."""
+    rows = demographic_rows(counties, year_codes, list(range(19)), total_age_group=0, seed=seed)
+    c = counties.iloc[rows.pop("county_index")].reset_index(drop=True)
+    identifiers = pd.DataFrame({
+        "SUMLEV": 50,
+        "STATE": c["state_code"],
+        "COUNTY": c["county_code"],
+        "STNAME": c["state_name"],
+        "CTYNAME": c["name"] + " County",
+    })
+    return pd.concat([identifiers, rows], axis=1)
+
+
+def nber_coest00(counties, seed):
+    """
+    NBER coest00intalldata: full FIPS in `county`, `yearref` 1-12 (2000 census base, July 2000-2009, 2010 census)
+    next to the calendar `year`, and AGEGRP 0-18 plus 99 for the total.
+    """
+    rows = demographic_rows(counties, list(range(1, 13)), list(range(19)) + [99], total_age_group=99, seed=seed)
+    c = counties.iloc[rows.pop("county_index")].reset_index(drop=True)
+    yearref = rows.pop("YEAR")
+    identifiers = pd.DataFrame({
+        "SUMLEV": 50,
+        "county": c["county_fips"],
+        "STNAME": c["state_name"],
+        "CTYNAME": c["name"] + " County",
+        "year": np.select([yearref == 1, yearref == 12], [2000, 2010], yearref + 1998),
+        "yearref": yearref,
+    })
+    return pd.concat([identifiers, rows], axis=1)
+
+
+def election_results(counties, seed):
+    """MIT countypres (long, one row per candidate) for 2000-2024, and the tonmcg 2024 file (one row per county)."""
+    rng = np.random.default_rng(seed)
+    n = len(counties)
+    mit_frames = []
+    tonmcg = None
+    for i, year in enumerate(ELECTION_YEARS):
+        total = np.maximum(np.round(counties["population"].to_numpy() * (1 + 0.01 * i) * rng.uniform(0.35, 0.5, n)), 10)
+        margin = np.clip(counties["lean"].to_numpy() + rng.normal(0, 0.05) + rng.normal(0, 0.04, n), -0.95, 0.95)
+        other = np.round(total * rng.uniform(0.005, 0.05, n))
+        dem = np.round((total - other) * (1 + margin) / 2)
+        rep = total - other - dem
+        green = np.round(other * 0.4)
+        votes = {"DEMOCRAT": dem, "REPUBLICAN": rep, "GREEN": green, "OTHER": other - green}
+        candidates = {"DEMOCRAT": "DEM CANDIDATE", "REPUBLICAN": "REP CANDIDATE", "GREEN": "GREEN CANDIDATE", "OTHER": "OTHER"}
+        for party, candidate_votes in votes.items():
+            mit_frames.append(pd.DataFrame({
+                "year": year,
+                "state": counties["state_name"].str.upper(),
+                "state_po": counties["state_abbr"],
+                "county_name": counties["name"].str.upper(),
+                # Stored as a float in the real file, hence the '.0' handling in the staging SQL
+                "county_fips": counties["county_fips"].astype(float),
+                "office": "US PRESIDENT",
+                "candidate": candidates[party],
+                "party": party,
+                "candidatevotes": candidate_votes.astype("int64"),
+                "totalvotes": total.astype("int64"),
+                "version": 20250712,
+                "mode": "TOTAL",
+            }))
+        if year == 2024:
+            tonmcg = pd.DataFrame({
+                "state_name": counties["state_name"],
+                "county_fips": counties["county_fips"],
+                "county_name": counties["name"] + " County",
+                "votes_gop": rep.astype("int64"),
+                "votes_dem": dem.astype("int64"),
+                "total_votes": total.astype("int64"),
+                "diff": (rep - dem).astype("int64"),
+                "per_gop": rep / total,
+                "per_dem": dem / total,
+                "per_point_diff": (rep - dem) / total,
+            })
+    mit = pd.concat(mit_frames, ignore_index=True).sort_values(["year", "county_fips", "party"], ignore_index=True)
+    return mit, tonmcg
+
+
+def est10all(counties):
+    """SAIPE 2010 estimates, with income as text with thousands separators like the real file."""
+    return pd.DataFrame({
+        "State FIPS": counties["state_code"],
+        "County FIPS": counties["county_code"],
+        "Postal": counties["state_abbr"],
+        "Name": counties["name"] + " County",
+        "Poverty Estimate All Ages": np.round(counties["population"] * counties["poverty"]).astype("int64"),
+        "Poverty Percent All Ages": (counties["poverty"] * 100).round(1),
+        "Poverty Estimate Under Age 18": np.round(counties["population"] * counties["poverty"] * 0.3).astype("int64"),
+        "Poverty Percent Under Age 18": (counties["poverty"] * 130).clip(upper=99).round(1),
+        "Median Household Income": counties["income"].round(0).astype("int64").map("{:,}".format),
+    })
+
+
+def usda_long(counties, attributes, fips_column, state_column, name_column):
+    """USDA ERS files are long: one row per county per attribute."""
+    frames = []
+    for attribute, values in attributes.items():
+        frames.append(pd.DataFrame({
+            fips_column: counties["county_fips"],
+            state_column: counties["state_abbr"],
+            name_column: counties["name"] + " County",
+            "Attribute": attribute,
+            "Value": values,
+        }))
+    return pd.concat(frames, ignore_index=True).sort_values(fips_column, kind="stable", ignore_index=True)
+
+
+def write_raw_files(output_dir, scale=1, seed=0):
+    """
+    Write every raw file the pipeline loads to <output_dir>/data/raw_data.
+
+    Returns:
+        {file name: number of rows}
+    """
+    raw_dir = os.path.join(output_dir, "data", "raw_data")
+    os.makedirs(raw_dir, exist_ok=True)
+    counties = generate_counties(scale, seed)
+    college = counties["college"].to_numpy()
+    mit, tonmcg = election_results(counties, seed + 1)
+    frames = {
+        "mit": mit,
+        "tonmcg": tonmcg,
+        # 2010s: YEAR 1-12 (census, base, 2010-2019); 2020s: YEAR 1-6 (base, 2020-2024)
+        "cc_est2019": census_alldata(counties, list(range(1, 13)), seed + 2),
+        "cc_est2024": census_alldata(counties, list(range(1, 7)), seed + 3),
+        "nber": nber_coest00(counties, seed + 4),
+        "est10": est10all(counties),
+        "usda_education": usda_long(counties, {
+            "Percent of adults with a bachelor's degree or higher, 2000": (college * 90).round(1),
+            "Percent of adults with a bachelor's degree or higher, 2008-12": (college * 100).round(1),
+            "Percent of adults with a bachelor's degree or higher, 2019-23": (college * 110).clip(max=100).round(1),
+            "Percent of adults with less than a high school diploma, 2019-23": ((1 - college) * 15).round(1),
+        }, "FIPS Code", "State", "Area name"),
+        "usda_poverty": usda_long(counties, {
+            "PCTPOVALL_2023": (counties["poverty"] * 100).round(1),
+            "PCTPOV017_2023": (counties["poverty"] * 130).clip(upper=99).round(1),
+            "MEDHHINC_2023": counties["income"].round(0) * 1.3,
+        }, "FIPS_Code", "Stabr", "Area_Name"),
+        "usda_unemployment": usda_long(counties, {
+            f"Unemployment_rate_{year}": np.round(np.random.default_rng(seed + year).uniform(2, 9, len(counties)), 1)
+            for year in range(2000, 2024)
+        }, "FIPS_Code", "State", "Area_Name"),
+        "hmdb": pd.DataFrame({
+            "county_fips_code": counties["county_fips"],
+            "county": counties["name"] + " County",
+            "State": counties["state_name"],
+            "seat": "Seat of " + counties["name"],
+        }),
+    }
+    rows = {}
+    for key, df in frames.items():
+        df.to_csv(os.path.join(raw_dir, RAW_FILES[key]), index=False)
+        rows[RAW_FILES[key]] = len(df)
+    return rows
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--scale", type=float, default=1, help="multiple of the real ~3,100 counties (up to ~16)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output-dir", required=True)
+    args = parser.parse_args()
+
+    for name, count in write_raw_files(args.output_dir, args.scale, args.seed).items():
+        print(f"{count:>12,}  {name}")
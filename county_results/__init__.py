@@ -0,0 +1,5 @@
+# Code shared by the pipeline (pipeline/) and the Dash app (dash_app/): binning (bins), published dataset
+# versions (manifest), incremental results (ingest) and profiling (profiling).
+# It only needs numpy/pandas and the standard library. Installed from the top-level of the repo with
+#   pip install -e .
+# (part of requirements.txt and dash_app/requirements.txt), so both sides import it as county_results.
@@ -0,0 +1,160 @@
+import numpy as np
+import pandas as pd
+
+# Binning engine for the discrete map/heatmap colors.
+# Values are turned into small uint8 codes (an index into the label list) with np.searchsorted,
+# and colors are looked up by indexing a palette array with those codes.
+# This module only needs numpy/pandas, so the pipeline can import it too.
+
+# These two lists should line up in terms of number of elements.
+# They control the shading of counties based on the margin of victory.
+MARGIN_BINS = [
+    0, 0.20, 0.30, 0.40, 0.45, 0.475, 0.495,
+    0.500,
+    0.505, 0.525, 0.55, 0.60, 0.70, 0.85, 1.00
+]
+MARGIN_LABELS = [
+    "Rep > 60%", "Rep 40–60%", "Rep 20–40%", "Rep 10-20%", "Rep 5-10%", "Rep < 5%", "Rep < 1%",
+    "Dem < 1%", "Dem < 5%", "Dem 5–10%", "Dem 10–20%", "Dem 20-40%", "Dem 40-60%", "Dem > 60%"
+]
+MARGIN_RED_BLUE_COLOR_SCALE = {
+    "Rep > 60%": "rgb(128,0,0)",
+    "Rep 40–60%": "rgb(192,64,64)",
+    "Rep 20–40%": "rgb(192,96,96)",
+    "Rep 10-20%": "rgb(255,96,96)",
+    "Rep 5-10%": "rgb(255,128,128)",
+    "Rep < 5%": "rgb(255,192,192)",
+    "Rep < 1%": "rgb(255,226,226)",
+    "Dem < 1%": "rgb(226,226,255)",
+    "Dem < 5%": "rgb(192,192,255)",
+    "Dem 5–10%": "rgb(128,128,255)",
+    "Dem 10–20%": "rgb(96,96,255)",
+    "Dem 20-40%": "rgb(96,96,192)",
+    "Dem 40-60%": "rgb(64,64,192)",
+    "Dem > 60%": "rgb(0,0,128)"
+}
+# Control the shading of counties based on the swing from the prior election.
+SWING_BINS = [
+    -1, -0.20, -0.15, -0.10, -0.07, -0.04, -0.02,
+    0,
+    0.02, 0.04, 0.07, 0.10, 0.15, 0.20, 1
+]
+SWING_LABELS = [
+    "Rep > 20%", "Rep 15–20%", "Rep 10–15%", "Rep 7-10%", "Rep 4-7%", "Rep 2-4%", "Rep < 2%",
+    "Dem < 2%", "Dem 2-4%", "Dem 4–7%", "Dem 7–10%", "Dem 10-15%", "Dem 15-20%", "Dem > 20%"
+]
+SWING_RED_BLUE_COLOR_SCALE = {
+    "Rep > 20%": "rgb(128,0,0)",
+    "Rep 15–20%": "rgb(192,64,64)",
+    "Rep 10–15%": "rgb(192,96,96)",
+    "Rep 7-10%": "rgb(255,96,96)",
+    "Rep 4-7%": "rgb(255,128,128)",
+    "Rep 2-4%": "rgb(255,192,192)",
+    "Rep < 2%": "rgb(255,226,226)",
+    "Dem < 2%": "rgb(226,226,255)",
+    "Dem 2-4%": "rgb(192,192,255)",
+    "Dem 4–7%": "rgb(128,128,255)",
+    "Dem 7–10%": "rgb(96,96,255)",
+    "Dem 10-15%": "rgb(96,96,192)",
+    "Dem 15-20%": "rgb(64,64,192)",
+    "Dem > 20%": "rgb(0,0,128)"
+}
+# Control shading based on winning margin in votes.
+WINNING_MARGIN_VOTES_BINS = [
+    -999999999, -250000, -100000, -50000, -25000, -10000, -5000, -2000, -1000,
+    0,
+    1000, 2000, 5000, 10000, 25000, 50000, 100000, 250000, 999999999
+]
+WINNING_MARGIN_VOTES_LABELS = [
+    "Rep > 250k", "Rep 100-250k", "Rep 50-100k", "Rep 25-50k", "Rep 10-25k", "Rep 5-10k", "Rep 2-5k", "Rep 1-2k", "Rep < 1k",
+    "Dem < 1k", "Dem 1-2k", "Dem 2-5k", "Dem 5-10k", "Dem 10-25k", "Dem 25-50k", "Dem 50-100k", "Dem 100-250k", "Dem > 250k"
+] 
+WINNING_MARGIN_VOTES_RED_BLUE_COLOR_SCALE = {
+    "Rep > 250k": "rgb(128,0,0)",
+    "Rep 100-250k": "rgb(192,64,64)",
+    "Rep 50-100k": "rgb(192,96,96)",
+    "Rep 25-50k": "rgb(255,96,96)",
+    "Rep 10-25k": "rgb(255,128,128)",
+    "Rep 5-10k": "rgb(255,160,160)",
+    "Rep 2-5k": "rgb(255,192,192)",
+    "Rep 1-2k": "rgb(255,208,208)",
+    "Rep < 1k": "rgb(255,226,226)",
+    "Dem < 1k": "rgb(226,226,255)",
+    "Dem 1-2k": "rgb(208,208,255)",
+    "Dem 2-5k": "rgb(192,192,255)",
+    "Dem 5-10k": "rgb(160,160,255)",
+    "Dem 10-25k": "rgb(128,128,255)",
+    "Dem 25-50k": "rgb(96,96,255)",
+    "Dem 50-100k": "rgb(96,96,192)",
+    "Dem 100-250k": "rgb(64,64,192)",
+    "Dem > 250k": "rgb(0,0,128)"
+}
+
+# Code for values that fall in no bin (missing, or outside the bin edges).
+NO_BIN = 255
+MISSING_COLOR = "#cccccc"
+
+# Bin column: (bin edges, labels in order, label -> color)
+BIN_COLUMNS = {
+    "margin_bin": (MARGIN_BINS, MARGIN_LABELS, MARGIN_RED_BLUE_COLOR_SCALE),
+    "swing_bin": (SWING_BINS, SWING_LABELS, SWING_RED_BLUE_COLOR_SCALE),
+    "winning_margin_in_votes_bin": (
+        WINNING_MARGIN_VOTES_BINS, WINNING_MARGIN_VOTES_LABELS, WINNING_MARGIN_VOTES_RED_BLUE_COLOR_SCALE
+    ),
+}
+
+# Colors in code order, with MISSING_COLOR as the last entry for NO_BIN.
+PALETTES = {
+    bin_column: np.array([colors[label] for label in labels] + [MISSING_COLOR])
+    for bin_column, (bins, labels, colors) in BIN_COLUMNS.items()
+}
+
+
+def bin_codes(values, bins):
+    """
+    Assign each value the code of its bin, the same bins pd.cut(..., include_lowest=True) would pick.
+
+    Bins are right-closed, (edge[i], edge[i+1]], except the first which also includes its lower edge.
+
+    Args:
+        values: Array-like of numbers
+        bins: Sorted bin edges
+
+    Returns:
+        uint8 array of codes, NO_BIN where the value is missing or outside the edges
+    """
+    values = np.asarray(values, dtype=float)
+    bins = np.asarray(bins, dtype=float)
+    codes = np.searchsorted(bins, values, side="left") - 1
+    codes[values == bins[0]] = 0
+    in_range = (values >= bins[0]) & (values <= bins[-1])  # False for NaN
+    return np.where(in_range, codes, NO_BIN).astype(np.uint8)
+
+
+def labels_from_codes(bin_column, codes, index=None):
+    """Turn codes back into the ordered categorical of labels that pd.cut would have produced."""
+    labels = BIN_COLUMNS[bin_column][1]
+    codes = np.asarray(codes).astype(np.int16)
+    codes[codes == NO_BIN] = -1
+    return pd.Series(pd.Categorical.from_codes(codes, categories=labels, ordered=True), index=index)
+
+
+def colors_from_codes(bin_column, codes):
+    """Fill color for every code, as a single array gather."""
+    palette = PALETTES[bin_column]
+    return palette[np.minimum(np.asarray(codes), len(palette) - 1)]
+
+
+def add_bin_codes(df):
+    """
+    Add a uint8 <bin column>_code column for every bin column to the by-year data, in place.
+    Run once by the pipeline, so loading the data doesn't have to bin anything.
+    """
+    sources = {
+        "margin_bin": df["votes_pct_two_party_democrat"],
+        "swing_bin": df["votes_pct_swing_from_prev_election"],
+        "winning_margin_in_votes_bin": df["votes_democrat"] - df["votes_republican"],
+    }
+    for bin_column, (bins, labels, colors) in BIN_COLUMNS.items():
+        df[f"{bin_column}_code"] = bin_codes(sources[bin_column], bins)
+    return df
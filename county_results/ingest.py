@@ -0,0 +1,263 @@
+import numpy as np
+import pandas as pd
+from county_results import bins as cbins
+
+# Incremental county results, for election night.
+# Results arrive as csv files in a drop directory (a stand-in for a live feed), with each county's vote counts
+# so far: county_fips, year, votes_democrat, votes_republican and votes_other (or votes_total). The ingester
+# (pipeline/ingest_results.py) upserts them into the by-year table (ResultsTable.upsert), which recomputes the result
+# columns of the changed rows only, the same way transform_raw_data_to_staging.sql computes them for every row,
+# and publishes the changed rows as a small update file on top of the current dataset version
+# (see county_results/manifest.py). The Dash app applies those files to the data it already has loaded
+# (county_results_data.refresh), so an update costs in proportion to the counties that changed.
+# This module only needs numpy/pandas, like the bins module, so the pipeline and the app can both import it.
+
+KEY_COLUMNS = ["county_fips", "year"]
+VOTE_COLUMNS = ["votes_democrat", "votes_republican", "votes_other"]
+
+# Everything upsert() recomputes from the vote counts (plus the bin codes, see county_results/bins.py)
+RESULT_COLUMNS = VOTE_COLUMNS + [
+    "votes_total", "votes_pct_democrat", "votes_pct_republican", "votes_pct_other",
+    "votes_pct_two_party_democrat", "votes_pct_two_party_republican", "winning_party", "winning_margin",
+    "winning_two_party_margin", "votes_pct_partisan_index", "votes_pct_swing_from_prev_election",
+]
+
+# National vote shares (democrat, republican) per election, for the partisan index.
+# Same numbers as transform_raw_data_to_staging.sql; other years get no partisan index.
+NATIONAL_VOTE_PCT = {
+    2000: (0.48377, 0.47861),
+    2004: (0.48267, 0.50730),
+    2008: (0.52926, 0.45653),
+    2012: (0.51064, 0.47204),
+    2016: (0.48185, 0.46086),
+    2020: (0.51306, 0.46850),
+    2024: (0.48324, 0.49796),
+}
+
+
+def read_update_file(path):
+    """
+    Read one drop-directory file of county results.
+
+    Returns:
+        DataFrame with county_fips (5-digit text), year and the three vote columns
+    """
+    df = pd.read_csv(path, dtype={"county_fips": str})
+    # FIPS codes may have lost their leading zero or gained a ".0", like in the raw election data
+    df["county_fips"] = df["county_fips"].str.replace(r"\.0$", "", regex=True).str.zfill(5)
+    if "votes_other" not in df.columns:
+        df["votes_other"] = df["votes_total"] - df["votes_democrat"] - df["votes_republican"]
+    df["year"] = df["year"].astype(int)
+    for column in VOTE_COLUMNS:
+        df[column] = df[column].astype(np.int64)
+    return df[KEY_COLUMNS + VOTE_COLUMNS]
+
+
+def latest_updates(frames):
+    """Combine update files read in arrival order, keeping the last counts of every county and year."""
+    return pd.concat(frames, ignore_index=True).drop_duplicates(KEY_COLUMNS, keep="last").reset_index(drop=True)
+
+
+def compute_results(rows):
+    """
+    Result columns of some rows from their vote counts, like transform_raw_data_to_staging.sql.
+    The swing from the previous election needs the county's other years, see compute_swing().
+
+    Args:
+        rows: DataFrame with year and the three vote columns, modified in place
+
+    Returns:
+        rows
+    """
+    dem, rep, oth = (rows[c].to_numpy(dtype=float) for c in VOTE_COLUMNS)
+    total = dem + rep + oth
+    two_party = dem + rep
+    with np.errstate(invalid="ignore", divide="ignore"):
+        pct_dem = np.round(np.where(total > 0, dem / total, np.nan), 5)
+        pct_rep = np.round(np.where(total > 0, rep / total, np.nan), 5)
+        pct_oth = np.round(np.where(total > 0, oth / total, np.nan), 5)
+        rows["votes_pct_two_party_democrat"] = np.round(np.where(two_party > 0, dem / two_party, np.nan), 5)
+        rows["votes_pct_two_party_republican"] = np.round(np.where(two_party > 0, rep / two_party, np.nan), 5)
+    rows["votes_total"] = total.astype(np.int64)
+    rows["votes_pct_democrat"] = pct_dem
+    rows["votes_pct_republican"] = pct_rep
+    rows["votes_pct_other"] = pct_oth
+
+    # Same order of cases as the SQL, ties going to Dem > Rep > Oth
+    rows["winning_party"] = np.select(
+        [(dem >= rep) & (dem >= oth), (rep > dem) & (rep >= oth), (oth > dem) & (dem > rep)],
+        ["DEMOCRAT", "REPUBLICAN", "OTHER"],
+        default=None,
+    )
+    rows["winning_margin"] = np.round(np.select(
+        [
+            (dem >= rep) & (rep >= oth),  # D1 R2 O3
+            (dem >= oth) & (oth > rep),   # D1 R3 O2
+            (rep > dem) & (dem >= oth),   # D2 R1 O3
+            (rep >= oth) & (oth > dem),   # D3 R1 O2
+            (oth > dem) & (dem >= rep),   # D2 R3 O1
+            (oth > rep) & (rep > dem),    # D3 R2 O1
+        ],
+        [pct_dem - pct_rep, pct_dem - pct_oth, pct_rep - pct_dem, pct_rep - pct_oth, pct_oth - pct_dem, pct_oth - pct_rep],
+        default=np.nan,
+    ), 5)
+    other_won = ((oth > dem) & (dem >= rep)) | ((oth > rep) & (rep > dem))
+    rows["winning_two_party_margin"] = np.round(np.where(other_won, 0.0, pct_dem - pct_rep), 5)
+
+    national = rows["year"].map(NATIONAL_VOTE_PCT)
+    national_dem = national.map(lambda p: p[0], na_action="ignore").to_numpy(dtype=float)
+    national_rep = national.map(lambda p: p[1], na_action="ignore").to_numpy(dtype=float)
+    rows["votes_pct_partisan_index"] = np.round(((pct_dem - national_dem) - (pct_rep - national_rep)) / 2, 5)
+    return rows
+
+
+def compute_swing(rows):
+    """
+    votes_pct_swing_from_prev_election of every row, against the same county's previous year in `rows`.
+
+    Args:
+        rows: Every year of some counties, with county_fips, year and the vote percentages
+
+    Returns:
+        Series aligned to rows
+    """
+    ordered = rows.sort_values(KEY_COLUMNS)
+    previous = ordered.groupby("county_fips", sort=False)[["votes_pct_democrat", "votes_pct_republican"]].shift()
+    swing = (
+        (ordered["votes_pct_democrat"] - previous["votes_pct_democrat"])
+        - (ordered["votes_pct_republican"] - previous["votes_pct_republican"])
+    ).round(5)
+    return swing.reindex(rows.index)
+
+
+def key_index(df):
+    """(county_fips, year) of every row, as an index to look rows up with (see row_positions)."""
+    return pd.MultiIndex.from_arrays([df["county_fips"].to_numpy(dtype=object), df["year"].to_numpy()])
+
+
+def row_positions(index, rows):
+    """Position of each of `rows` (county_fips, year) in the frame `index` was built from, -1 where there is none."""
+    if index.is_unique:
+        return index.get_indexer(key_index(rows))
+    # A key the data has more than once resolves to its first row
+    first = np.flatnonzero(~index.duplicated())
+    positions = index[first].get_indexer(key_index(rows))
+    return np.where(positions >= 0, first[positions], -1)
+
+
+def apply_rows(df, rows, index=None):
+    """
+    Write the rows of an update file into a by-year frame, matched on (county_fips, year), without modifying it.
+
+    Columns the rows have are copied and overwritten; the others are shared with `df`, so readers of the old
+    frame are unaffected. Rows for a county and year `df` doesn't have are appended.
+
+    Args:
+        df: By-year frame with a default RangeIndex
+        rows: Rows with county_fips, year and any of df's columns
+        index: key_index(df), if already built
+
+    Returns:
+        (frame, positions, appended): the new frame, the position of every row in it, and whether rows were appended
+    """
+    rows = rows[[c for c in df.columns if c in rows.columns]].reset_index(drop=True)
+    positions = row_positions(index if index is not None else key_index(df), rows)
+    existing = positions >= 0
+    new = df.copy(deep=False)
+    for column in rows.columns:
+        values = rows[column]
+        current = new[column]
+        if isinstance(current.dtype, pd.CategoricalDtype):
+            extra = pd.Index(values.dropna().unique()).difference(current.cat.categories)
+            current = current.cat.add_categories(extra) if len(extra) else current.copy()
+            values = values.astype(object)
+        else:
+            current = current.copy()
+        current.iloc[positions[existing]] = values[existing].to_numpy()
+        new[column] = current
+    if existing.all():
+        return new, positions, False
+    appended = rows[~existing].copy()
+    for column in appended.columns:
+        if isinstance(new[column].dtype, pd.CategoricalDtype):
+            appended[column] = pd.Categorical(appended[column].astype(object), categories=new[column].cat.categories)
+    positions[~existing] = np.arange(len(new), len(new) + len(appended))
+    return pd.concat([new, appended], ignore_index=True), positions, True
+
+
+class ResultsTable:
+    """
+    The by-year table, with the lookups upsert() needs: (county_fips, year) -> row, and county -> its rows.
+    Building them reads every row once; an upsert then costs in proportion to the counties it changes.
+    """
+
+    def __init__(self, df):
+        self.df = df.reset_index(drop=True)
+        if isinstance(self.df["winning_party"].dtype, pd.CategoricalDtype):
+            self.df["winning_party"] = self.df["winning_party"].astype(object)
+        self._build_lookups()
+
+    def _build_lookups(self):
+        self.keys = key_index(self.df)
+        fips = self.df["county_fips"].to_numpy(dtype=object)
+        self.county_rows = pd.Series(np.arange(len(fips))).groupby(fips, sort=False).indices
+
+    def rows_of_counties(self, counties):
+        """Positions of every row of these counties, in ascending order."""
+        found = [self.county_rows[c] for c in counties if c in self.county_rows]
+        return np.sort(np.concatenate(found)) if found else np.empty(0, dtype=np.int64)
+
+    def upsert(self, updates):
+        """
+        Apply the latest vote counts, recomputing the result columns of the rows they change.
+
+        Only the updated rows, and the other years of the same counties (whose swing depends on them), are
+        recomputed. A county and year without a row yet (the first results of a new election) gets a new row,
+        with the county's other columns (name, state, demographics) copied from its latest year.
+
+        Args:
+            updates: DataFrame from read_update_file() / latest_updates()
+
+        Returns:
+            (changed, unknown): the rows that changed, with every column, and the updates for counties the table
+            doesn't have at all (skipped)
+        """
+        positions = row_positions(self.keys, updates)
+        missing = updates[positions < 0]
+        known_county = missing["county_fips"].map(lambda c: c in self.county_rows).astype(bool)
+        unknown, new = missing[~known_county], missing[known_county]
+        inserted = np.empty(0, dtype=np.int64)
+        if len(new):
+            # Every other column from the county's latest year
+            years = self.df["year"].to_numpy()
+            latest = [rows[np.argmax(years[rows])] for rows in (self.county_rows[c] for c in new["county_fips"])]
+            new_rows = self.df.iloc[latest].reset_index(drop=True)
+            new_rows["year"] = new["year"].to_numpy()
+            inserted = np.arange(len(self.df), len(self.df) + len(new_rows))
+            self.df = pd.concat([self.df, new_rows], ignore_index=True)
+            self._build_lookups()
+            positions = row_positions(self.keys, updates)
+
+        known = positions >= 0
+        positions = positions[known]
+        rows = compute_results(updates[known].reset_index(drop=True))
+
+        # Every year of the updated counties: their swing is redone, and only rows that differ are reported
+        df = self.df
+        counties = self.rows_of_counties(rows["county_fips"].unique())
+        before = df.iloc[counties][RESULT_COLUMNS]
+        for column in RESULT_COLUMNS:
+            if column in rows.columns:
+                df.iloc[positions, df.columns.get_loc(column)] = rows[column].to_numpy()
+        swing = compute_swing(df.iloc[counties])
+        df.iloc[counties, df.columns.get_loc("votes_pct_swing_from_prev_election")] = swing.to_numpy()
+
+        after = df.iloc[counties][RESULT_COLUMNS]
+        same = ((after == before) | (after.isna() & before.isna())).all(axis=1).to_numpy()
+        changed_positions = np.union1d(counties[~same], inserted)
+        changed = cbins.add_bin_codes(df.iloc[changed_positions].copy())
+        for bin_column in cbins.BIN_COLUMNS:
+            column = f"{bin_column}_code"
+            if column in df.columns:
+                df.iloc[changed_positions, df.columns.get_loc(column)] = changed[column].to_numpy()
+        return changed, unknown
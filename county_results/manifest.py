@@ -0,0 +1,110 @@
+import json
+import os
+import shutil
+import time
+
+# Published dataset versions, shared by the pipeline (which writes them) and the Dash app (which reads them).
+# Each pipeline run writes its data files into a new directory, data/final/versions/<version>/, and only then
+# publishes it by replacing data/final/manifest.json, written to a temporary file and renamed over the old one.
+# A reader therefore sees either the previous version or the new one, never a half-written one, and a new
+# version's files never overwrite those a running worker has memory-mapped. The last KEEP_VERSIONS versions
+# are kept, plus any the published version still refers to; older ones are deleted, which is safe on Linux even
+# while a process still maps them.
+# A version may also list update files: small files of changed rows (election night results, see
+# county_results/ingest.py) applied in order on top of its data files, which can come from an older version.
+# This module only needs the standard library, so the pipeline can import it too.
+
+MANIFEST_NAME = "manifest.json"
+VERSIONS_DIR = "versions"
+KEEP_VERSIONS = 3
+
+
+def new_version():
+    """A version name that sorts in publication order, e.g. "20261019T123456.123456"."""
+    now = time.time()
+    return f"{time.strftime('%Y%m%dT%H%M%S', time.gmtime(now))}.{int(now * 1e6) % 1000000:06d}"
+
+
+def version_dir(data_dir, version):
+    """Directory for the files of one version (created if needed)."""
+    path = os.path.join(data_dir, VERSIONS_DIR, version)
+    os.makedirs(path, exist_ok=True)
+    return path
+
+
+def read_manifest(data_dir):
+    """
+    The published version of a data directory.
+
+    Returns:
+        Dictionary with "version", "published_at", "files" (data set name -> path relative to data_dir) and
+        "updates" (paths of update files, oldest first), or None when nothing was published there
+        (e.g. the sample data, or synthetic data for benchmarks).
+    """
+    try:
+        with open(os.path.join(data_dir, MANIFEST_NAME)) as f:
+            manifest = json.load(f)
+    except FileNotFoundError:
+        return None
+    manifest.setdefault("updates", [])
+    return manifest
+
+
+def file_path(data_dir, manifest, name):
+    """Absolute path of one data set of a published version, or None if the version doesn't have it."""
+    relative = manifest["files"].get(name)
+    return os.path.join(data_dir, relative) if relative else None
+
+
+def update_paths(data_dir, manifest):
+    """Absolute paths of a version's update files, oldest first."""
+    return [os.path.join(data_dir, relative) for relative in manifest["updates"]]
+
+
+def publish(data_dir, version, files, updates=()):
+    """
+    Make a version the one served, atomically, then delete the versions older than the last KEEP_VERSIONS.
+
+    Args:
+        data_dir: Directory holding the manifest (data/final)
+        version: Name from new_version(), whose files are complete
+        files: Data set name -> path of its file, inside data_dir
+        updates: Paths of update files to apply on top of the files, oldest first
+
+    Returns:
+        The manifest written
+    """
+    manifest = {
+        "version": version,
+        "published_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        "files": {name: os.path.relpath(path, data_dir) for name, path in files.items()},
+        "updates": [os.path.relpath(path, data_dir) for path in updates],
+    }
+    path = os.path.join(data_dir, MANIFEST_NAME)
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(manifest, f, indent=2)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+    prune_versions(data_dir, keep=KEEP_VERSIONS, manifest=manifest)
+    return manifest
+
+
+def prune_versions(data_dir, keep=KEEP_VERSIONS, manifest=None):
+    """Delete all but the newest `keep` version directories, and those `manifest` refers to."""
+    root = os.path.join(data_dir, VERSIONS_DIR)
+    if not os.path.isdir(root):
+        return []
+    in_use = set()
+    if manifest is not None:
+        in_use.add(manifest["version"])
+        for relative in list(manifest["files"].values()) + list(manifest["updates"]):
+            parts = os.path.normpath(relative).split(os.sep)
+            if len(parts) > 2 and parts[0] == VERSIONS_DIR:
+                in_use.add(parts[1])
+    versions = sorted(os.listdir(root))
+    removed = [v for v in versions[:max(len(versions) - keep, 0)] if v not in in_use]
+    for version in removed:
+        shutil.rmtree(os.path.join(root, version), ignore_errors=True)
+    return removed
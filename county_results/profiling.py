@@ -0,0 +1,185 @@
+import cProfile
+import collections
+import contextlib
+import functools
+import os
+import random
+import sys
+import threading
+import time
+from urllib.parse import parse_qs, urlparse
+
+# On-demand profiling for the heavy callbacks and the pipeline stages.
+# Off unless COUNTY_RESULTS_PROFILE_DIR is set. Then:
+#  - every call of a @profile'd callback is profiled with probability COUNTY_RESULTS_PROFILE_RATE
+#  - a callback is always profiled when the page was opened with ?profile=1 (e.g. /county-map?profile=1),
+#    which the browser passes along in the Referer header of the callback requests
+# and at most COUNTY_RESULTS_PROFILE_MAX_PER_MINUTE callback profiles are written per process, whatever the
+# rate or flags. profiled() also profiles a block of code every time, for the pipeline stages, which run once.
+#
+# COUNTY_RESULTS_PROFILER picks the profiler:
+#  - "sampling" (default): a thread samples the profiled thread's stack every COUNTY_RESULTS_PROFILE_INTERVAL
+#    seconds. The cost is bounded by the interval, not by how many Python calls the code makes, so it can
+#    stay on in production. Written as <name>-<time>-<pid>.folded, one "frame;frame;frame count" line per
+#    stack, which flamegraph.pl, speedscope and inferno read directly.
+#  - "cprofile": deterministic, every call is counted (several times slower for call-heavy code).
+#    Written as <name>-<time>-<pid>.prof for pstats, snakeviz or flameprof.
+# Background callbacks run in a job process without the browser's request, so there only the rate applies.
+# The pipeline's SQL stages run inside sqlite, where no Python profiler sees them: write_timings() writes
+# the wall time of each statement instead, as a .folded file too (see pipeline/run_sql_file.py).
+
+PROFILE_DIR = os.environ.get("COUNTY_RESULTS_PROFILE_DIR")
+PROFILER = os.environ.get("COUNTY_RESULTS_PROFILER", "sampling")
+RATE = float(os.environ.get("COUNTY_RESULTS_PROFILE_RATE", "0.01"))
+INTERVAL = float(os.environ.get("COUNTY_RESULTS_PROFILE_INTERVAL", "0.005"))
+MAX_PER_MINUTE = int(os.environ.get("COUNTY_RESULTS_PROFILE_MAX_PER_MINUTE", "6"))
+
+_lock = threading.Lock()
+# Start times of the profiles written in the last minute
+_recent = collections.deque()
+
+
+def _take_slot():
+    """True if another profile may be written this minute (and counts it)."""
+    now = time.monotonic()
+    with _lock:
+        while _recent and now - _recent[0] > 60:
+            _recent.popleft()
+        if len(_recent) >= MAX_PER_MINUTE:
+            return False
+        _recent.append(now)
+        return True
+
+
+def _requested():
+    """True inside a callback request from a page opened with ?profile=1."""
+    try:
+        from flask import has_request_context, request
+    except ImportError:
+        # Pipeline scripts don't need Flask
+        return False
+    if not has_request_context() or not request.referrer:
+        return False
+    return parse_qs(urlparse(request.referrer).query).get("profile") == ["1"]
+
+
+def _output_path(name, extension):
+    os.makedirs(PROFILE_DIR, exist_ok=True)
+    now = time.time()
+    stamp = f"{time.strftime('%Y%m%d-%H%M%S', time.localtime(now))}.{int(now * 1000) % 1000:03d}"
+    return os.path.join(PROFILE_DIR, f"{name}-{stamp}-{os.getpid()}.{extension}")
+
+
+def _frame_name(code):
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+
+class StackSampler:
+    """Counts the stacks of one thread, sampled every `interval` seconds from a helper thread."""
+
+    def __init__(self, thread_id, interval=INTERVAL):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.counts = collections.Counter()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+            while frame is not None:
+                stack.append(_frame_name(frame.f_code))
+                frame = frame.f_back
+            if stack:
+                self.counts[";".join(reversed(stack))] += 1
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+    def write_folded(self, path):
+        with open(path, "w") as f:
+            for stack, count in self.counts.most_common():
+                f.write(f"{stack} {count}\n")
+
+
+@contextlib.contextmanager
+def _profiling(name):
+    if PROFILER == "cprofile":
+        profiler = cProfile.Profile()
+        profiler.enable()
+        try:
+            yield
+        finally:
+            profiler.disable()
+            profiler.dump_stats(_output_path(name, "prof"))
+    else:
+        sampler = StackSampler(threading.get_ident())
+        sampler.start()
+        try:
+            yield
+        finally:
+            sampler.stop()
+            sampler.write_folded(_output_path(name, "folded"))
+
+
+def profiled(name, force=True):
+    """
+    Context manager that profiles its block, when profiling is on (COUNTY_RESULTS_PROFILE_DIR).
+
+    Args:
+        name: Prefix of the profile file name
+        force: Profile every time (the default, for pipeline stages); otherwise only at the sampling rate
+            or when requested with ?profile=1, and within the per-minute limit
+
+    Returns:
+        A context manager (a no-op when this run isn't profiled)
+    """
+    if not PROFILE_DIR:
+        return contextlib.nullcontext()
+    if not force and not ((_requested() or random.random() < RATE) and _take_slot()):
+        return contextlib.nullcontext()
+    return _profiling(name)
+
+
+def profile(func):
+    """
+    Decorator for a heavy page callback, placed directly under @cmetrics.instrument.
+    Profiles a sample of the calls (see the top of this module); otherwise adds one check per call.
+    """
+    if not PROFILE_DIR:
+        return func
+    name = f"{func.__module__.rsplit('.', 1)[-1]}.{func.__name__}"
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        with profiled(name, force=False):
+            return func(*args, **kwargs)
+    return wrapper
+
+
+def write_timings(name, timings):
+    """
+    Write the wall times of steps that run outside Python (e.g. SQL statements) as a .folded profile, when
+    profiling is on (COUNTY_RESULTS_PROFILE_DIR). Each step is one "<name>;<step> <milliseconds>" line,
+    so the same flame graph tools show which steps took the time.
+
+    Args:
+        name: Prefix of the profile file name, and the root frame of every line
+        timings: (step name, seconds) pairs
+
+    Returns:
+        Path of the file written, or None when profiling is off
+    """
+    if not PROFILE_DIR:
+        return None
+    path = _output_path(name, "folded")
+    with open(path, "w") as f:
+        for step, seconds in timings:
+            # ";" separates frames in the folded format
+            f.write(f"{name};{step.replace(';', ',')} {max(round(seconds * 1000), 1)}\n")
+    return path
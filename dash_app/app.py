@@ -1,5 +1,12 @@
+# First, so the startup timeline (served on /startup) can tell the imports apart from the data loading
+import county_results_startup as cstartup
 import dash
 from dash import html, dcc
+# Imported before the pages load their data, so tracemalloc (if on) sees those allocations
+import county_results_memory as cmemory
+import county_results_metrics as cmetrics
+import county_results_recorder as crecorder
+import county_results_data as cdata
 
 app = dash.Dash(
     __name__,
@@ -18,8 +25,26 @@ app.layout = html.Div([
 
     dash.page_container            # this is where the active page renders
 ])
+cstartup.mark("pages registered")
+# Everything else the pages would otherwise build on their first requests (state summaries, ...)
+cstartup.prepare("shared data", cdata.preload)
 
 server = app.server
+# Per-callback timings and response sizes, served on /metrics
+cmetrics.init_app(server)
+# Records user sessions for load tests, only when COUNTY_RESULTS_RECORD_SESSIONS is set
+crecorder.init_app(server)
+# Memory held by the data sets and caches, served on /memory
+cmemory.init_app(server)
+# Startup timeline, served on /startup
+cstartup.init_app(server)
+# Requests see one dataset version from start to finish; the active version is served on /dataset
+cdata.init_app(server)
+cstartup.mark("app ready")
 
 if __name__ == "__main__":
+    # With cfg.LAZY_STARTUP, build the page data in the background while the server already answers
+    cstartup.start_warm_up()
+    # Swap in new dataset versions as the pipeline publishes them
+    cdata.start_watcher()
     app.run(debug=True)
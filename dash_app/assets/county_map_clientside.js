@@ -0,0 +1,139 @@
+// Client-side rendering for the county map page.
+// The server sends every year and color column once (see build_client_map_data in pages/nationwide_map.py),
+// and these functions redraw the choropleth in the browser when the year, state, or color changes.
+window.dash_clientside = Object.assign({}, window.dash_clientside, {
+    county_map: {
+        render: function(data, year, state, colorBy, filter) {
+            if (!data || year === null || year === undefined || !colorBy) {
+                return window.dash_clientside.no_update;
+            }
+            const rows = data.years[String(year)];
+            if (!rows) {
+                return {};
+            }
+            const counties = data.counties;
+            state = state || "All";
+
+            // Pick the rows to draw, honouring the state filter and the counties the filter expression matched
+            // (positions into data.counties for this year, computed on the server, see update_client_filter).
+            const allowed = filter && filter[String(year)] ? new Set(filter[String(year)]) : null;
+            const picked = [];
+            for (let i = 0; i < rows.county.length; i++) {
+                if ((state === "All" || counties.state_name[rows.county[i]] === state)
+                        && (allowed === null || allowed.has(rows.county[i]))) {
+                    picked.push(i);
+                }
+            }
+
+            const marginText = function(x) {
+                if (x === null) {
+                    return "";
+                }
+                const votes = Math.abs(x).toLocaleString("en-US", {maximumFractionDigits: 0});
+                return (x > 0 ? "D +" : "R +") + votes;
+            };
+            // One hover row per picked county, in the order of data.hover_fields.
+            const hoverRow = function(i) {
+                const c = rows.county[i];
+                return data.hover_fields.map(function(field) {
+                    if (field === "margin_text") {
+                        return marginText(rows.margin_in_votes[i]);
+                    }
+                    if (field in counties) {
+                        return counties[field][c];
+                    }
+                    return rows[field][i];
+                });
+            };
+            const fips = function(i) {
+                return counties.county_fips[rows.county[i]];
+            };
+
+            const traces = [];
+            const layout = {
+                title: {x: 0.5},
+                margin: {r: 0, t: 40, l: 0, b: 0}
+            };
+            const bins = data.bins[colorBy];
+            if (bins) {
+                // One trace per bin, in legend order, like plotly express does for discrete colors.
+                const groups = bins.labels.map(function() { return []; });
+                picked.forEach(function(i) {
+                    const code = rows[colorBy][i];
+                    if (code !== null) {
+                        groups[code].push(i);
+                    }
+                });
+                groups.forEach(function(group, code) {
+                    if (group.length === 0) {
+                        return;
+                    }
+                    const color = bins.colors[code];
+                    traces.push({
+                        type: "choropleth",
+                        geojson: data.geojson,
+                        locations: group.map(fips),
+                        z: group.map(function() { return 1; }),
+                        colorscale: [[0, color], [1, color]],
+                        showscale: false,
+                        name: bins.labels[code],
+                        legendgroup: bins.labels[code],
+                        showlegend: true,
+                        customdata: group.map(hoverRow),
+                        hovertemplate: data.hover_template
+                    });
+                });
+                layout.legend = {title: {text: bins.title}, tracegroupgap: 0};
+            } else {
+                const continuous = data.continuous[colorBy] || {label: colorBy, range: [0, 1]};
+                traces.push({
+                    type: "choropleth",
+                    geojson: data.geojson,
+                    locations: picked.map(fips),
+                    z: picked.map(function(i) { return rows[colorBy][i]; }),
+                    coloraxis: "coloraxis",
+                    customdata: picked.map(hoverRow),
+                    hovertemplate: data.hover_template
+                });
+                layout.coloraxis = {
+                    colorscale: data.colorscale,
+                    cmin: continuous.range[0],
+                    cmax: continuous.range[1],
+                    colorbar: {title: {text: continuous.label}}
+                };
+            }
+
+            // Same zoom rules as create_map on the server.
+            const params = data.state_map_params[state] || data.state_map_params["All"];
+            if (state !== "All") {
+                const projection = params.projection_type || "albers usa";
+                layout.title.text = year + " Election – " + state;
+                layout.geo = {
+                    center: params.center,
+                    projection: {type: projection, scale: params.projection_scale},
+                    visible: false
+                };
+                // Only apply scope if projection is albers usa
+                if (projection === "albers usa") {
+                    layout.geo.scope = "usa";
+                }
+            } else {
+                layout.title.text = year + " U.S. Presidential Election by County";
+                layout.geo = {
+                    scope: params.scope,
+                    center: params.center,
+                    projection: {scale: params.projection_scale},
+                    visible: false
+                };
+            }
+            return {data: traces, layout: layout};
+        },
+        // The right map is hidden in single mode, so it is only drawn in dual mode.
+        render_if_dual: function(data, year, state, colorBy, mode, filter) {
+            if (mode !== "dual") {
+                return window.dash_clientside.no_update;
+            }
+            return window.dash_clientside.county_map.render(data, year, state, colorBy, filter);
+        }
+    }
+});
@@ -0,0 +1,42 @@
+import contextlib
+import county_results_config as cfg
+
+# Background execution for the heavy renders (county map, heatmap, scatterplot).
+# With cfg.BACKGROUND_CALLBACKS on, those callbacks run as Dash background callbacks: each job runs in a
+# separate process managed by a diskcache-backed DiskcacheManager, and the web worker only queues the job
+# and polls for the result, so it stays free to answer other users.
+# A job that is superseded (the same callback fires again before it finished, e.g. a user flicking
+# through a dropdown) is terminated by Dash, which sends the old job id along with the new request.
+# diskcache (and Dash's background extras) are only needed when this is turned on: pip install "dash[diskcache]"
+
+if cfg.BACKGROUND_CALLBACKS:
+    try:
+        import diskcache
+    except ImportError as e:
+        # No silent fallback to rendering in the web workers: the setting asks for job processes
+        raise ImportError('cfg.BACKGROUND_CALLBACKS needs diskcache: pip install "dash[diskcache]"') from e
+    from dash import DiskcacheManager
+
+    cache = diskcache.Cache(cfg.BACKGROUND_CACHE_DIR)
+    manager = DiskcacheManager(cache, expire=cfg.BACKGROUND_RESULT_EXPIRE_SECONDS)
+    # Keyword arguments for @dash.callback on a heavy render
+    HEAVY_CALLBACK_OPTIONS = {"background": True, "manager": manager}
+else:
+    cache = None
+    manager = None
+    HEAVY_CALLBACK_OPTIONS = {}
+
+
+def render_slot():
+    """
+    Context manager that holds one of cfg.BACKGROUND_MAX_CONCURRENT_RENDERS render slots.
+    The slots are shared by every job process through the diskcache, so at most that many heavy renders
+    run at once on the machine, whatever the number of web workers; other jobs wait their turn.
+    Does nothing when background callbacks are off (the web workers already bound concurrency).
+    """
+    if cache is None:
+        return contextlib.nullcontext()
+    import diskcache
+    return diskcache.BoundedSemaphore(
+        cache, "render-slots", value=cfg.BACKGROUND_MAX_CONCURRENT_RENDERS, expire=cfg.BACKGROUND_SLOT_EXPIRE_SECONDS
+    )
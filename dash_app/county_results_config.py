@@ -13,89 +13,13 @@ CUSTOM_RED_BLUE_COLOR_SCALE=[
 ]
 """
 
-# These two lists should line up in terms of number of elements.
-# They control the shading of counties based on the margin of victory.
-MARGIN_BINS = [
-    0, 0.20, 0.30, 0.40, 0.45, 0.475, 0.495,
-    0.500,
-    0.505, 0.525, 0.55, 0.60, 0.70, 0.85, 1.00
-]
-MARGIN_LABELS = [
-    "Rep > 60%", "Rep 40–60%", "Rep 20–40%", "Rep 10-20%", "Rep 5-10%", "Rep < 5%", "Rep < 1%",
-    "Dem < 1%", "Dem < 5%", "Dem 5–10%", "Dem 10–20%", "Dem 20-40%", "Dem 40-60%", "Dem > 60%"
-]
-MARGIN_RED_BLUE_COLOR_SCALE = {
-    "Rep > 60%": "rgb(128,0,0)",
-    "Rep 40–60%": "rgb(192,64,64)",
-    "Rep 20–40%": "rgb(192,96,96)",
-    "Rep 10-20%": "rgb(255,96,96)",
-    "Rep 5-10%": "rgb(255,128,128)",
-    "Rep < 5%": "rgb(255,192,192)",
-    "Rep < 1%": "rgb(255,226,226)",
-    "Dem < 1%": "rgb(226,226,255)",
-    "Dem < 5%": "rgb(192,192,255)",
-    "Dem 5–10%": "rgb(128,128,255)",
-    "Dem 10–20%": "rgb(96,96,255)",
-    "Dem 20-40%": "rgb(96,96,192)",
-    "Dem 40-60%": "rgb(64,64,192)",
-    "Dem > 60%": "rgb(0,0,128)"
-}
-# Control the shading of counties based on the swing from the prior election.
-SWING_BINS = [
-    -1, -0.20, -0.15, -0.10, -0.07, -0.04, -0.02,
-    0,
-    0.02, 0.04, 0.07, 0.10, 0.15, 0.20, 1
-]
-SWING_LABELS = [
-    "Rep > 20%", "Rep 15–20%", "Rep 10–15%", "Rep 7-10%", "Rep 4-7%", "Rep 2-4%", "Rep < 2%",
-    "Dem < 2%", "Dem 2-4%", "Dem 4–7%", "Dem 7–10%", "Dem 10-15%", "Dem 15-20%", "Dem > 20%"
-]
-SWING_RED_BLUE_COLOR_SCALE = {
-    "Rep > 20%": "rgb(128,0,0)",
-    "Rep 15–20%": "rgb(192,64,64)",
-    "Rep 10–15%": "rgb(192,96,96)",
-    "Rep 7-10%": "rgb(255,96,96)",
-    "Rep 4-7%": "rgb(255,128,128)",
-    "Rep 2-4%": "rgb(255,192,192)",
-    "Rep < 2%": "rgb(255,226,226)",
-    "Dem < 2%": "rgb(226,226,255)",
-    "Dem 2-4%": "rgb(192,192,255)",
-    "Dem 4–7%": "rgb(128,128,255)",
-    "Dem 7–10%": "rgb(96,96,255)",
-    "Dem 10-15%": "rgb(96,96,192)",
-    "Dem 15-20%": "rgb(64,64,192)",
-    "Dem > 20%": "rgb(0,0,128)"
-}
-# Control shading based on winning margin in votes.
-WINNING_MARGIN_VOTES_BINS = [
-    -999999999, -250000, -100000, -50000, -25000, -10000, -5000, -2000, -1000,
-    0,
-    1000, 2000, 5000, 10000, 25000, 50000, 100000, 250000, 999999999
-]
-WINNING_MARGIN_VOTES_LABELS = [
-    "Rep > 250k", "Rep 100-250k", "Rep 50-100k", "Rep 25-50k", "Rep 10-25k", "Rep 5-10k", "Rep 2-5k", "Rep 1-2k", "Rep < 1k",
-    "Dem < 1k", "Dem 1-2k", "Dem 2-5k", "Dem 5-10k", "Dem 10-25k", "Dem 25-50k", "Dem 50-100k", "Dem 100-250k", "Dem > 250k"
-] 
-WINNING_MARGIN_VOTES_RED_BLUE_COLOR_SCALE = {
-    "Rep > 250k": "rgb(128,0,0)",
-    "Rep 100-250k": "rgb(192,64,64)",
-    "Rep 50-100k": "rgb(192,96,96)",
-    "Rep 25-50k": "rgb(255,96,96)",
-    "Rep 10-25k": "rgb(255,128,128)",
-    "Rep 5-10k": "rgb(255,160,160)",
-    "Rep 2-5k": "rgb(255,192,192)",
-    "Rep 1-2k": "rgb(255,208,208)",
-    "Rep < 1k": "rgb(255,226,226)",
-    "Dem < 1k": "rgb(226,226,255)",
-    "Dem 1-2k": "rgb(208,208,255)",
-    "Dem 2-5k": "rgb(192,192,255)",
-    "Dem 5-10k": "rgb(160,160,255)",
-    "Dem 10-25k": "rgb(128,128,255)",
-    "Dem 25-50k": "rgb(96,96,255)",
-    "Dem 50-100k": "rgb(96,96,192)",
-    "Dem 100-250k": "rgb(64,64,192)",
-    "Dem > 250k": "rgb(0,0,128)"
-}
+# The bins of the discrete map/heatmap colors, their labels and colors are defined with the binning code
+# (county_results/bins.py), which the pipeline shares to bin the published data the same way.
+from county_results.bins import (  # noqa: E402
+    MARGIN_BINS, MARGIN_LABELS, MARGIN_RED_BLUE_COLOR_SCALE,
+    SWING_BINS, SWING_LABELS, SWING_RED_BLUE_COLOR_SCALE,
+    WINNING_MARGIN_VOTES_BINS, WINNING_MARGIN_VOTES_LABELS, WINNING_MARGIN_VOTES_RED_BLUE_COLOR_SCALE,
+)
 
 
 # This will help the map zoom in nicely on each state, by default.
@@ -450,3 +374,89 @@ COLOR_RANGE_MAP_BY_YEAR = {
     # default fallback
     "default": (0, 1)
 }
+
+# How the county map page draws its figures.
+# "server" rebuilds the whole choropleth in Python on every dropdown change.
+# "clientside" sends every year and color column to the browser once, then recolors/switches years there.
+COUNTY_MAP_RENDER_MODE = "server"
+
+# In "server" mode, picking a state while the map shows the whole country can instead only move the existing map
+# (title, center, projection), sent as a small dash.Patch instead of a whole new figure. The patched figure still
+# holds every county of the country, so the browser keeps drawing all of them around the selected state.
+# Off by default: a state's own figure (only its counties) is drawn instead, which is much lighter to render.
+COUNTY_MAP_PATCH_STATE_ZOOM = False
+
+# Rendered county map figures kept per worker, by (year, state, color, filter), shared by both panes and by
+# concurrent requests. A figure of every county is about 0.45 MB in memory, a state's well under 0.1 MB, so the
+# cache holds at most ~7 MB per worker (its current size is on /memory, under county_map_figures).
+COUNTY_MAP_FIGURE_CACHE_SIZE = 16
+
+# Run the heavy renders (county map, heatmap, scatterplot) as Dash background callbacks in separate
+# processes, so a slow render doesn't block a web worker. Needs diskcache: pip install "dash[diskcache]"
+# See county_results_background.py.
+BACKGROUND_CALLBACKS = False
+BACKGROUND_CACHE_DIR = "./.background-callback-cache"
+BACKGROUND_MAX_CONCURRENT_RENDERS = 4  # heavy renders running at once, across all workers
+BACKGROUND_RESULT_EXPIRE_SECONDS = 600  # how long finished results wait to be picked up
+BACKGROUND_SLOT_EXPIRE_SECONDS = 120  # a render slot held longer than this (e.g. by a killed job) is released
+
+# Lazy startup, for hosts that scale to zero and boot on the first request. Pages register without loading
+# any data; each page's data (and plotly.express, plotly.graph_objects, squarify) load on its first request, or earlier from a background
+# warm-up thread (WARM_UP_IN_BACKGROUND). Leave off with gunicorn's preload_app: there, loading everything
+# in the master before forking is what lets the workers share it. See county_results_startup.py.
+# This only defers the data: the first response still waits for the libraries every module imports
+# (pandas with numpy and pyarrow, dash), about 1.2-1.6s after the process starts, not under a second.
+LAZY_STARTUP = False
+WARM_UP_IN_BACKGROUND = True
+
+# Dataset versions published by the pipeline (see county_results/manifest.py). Every worker checks the
+# manifest this often, loads a new version in the background and swaps it in without a restart.
+# 0 turns the watcher off: the version found at startup is served until the workers restart.
+DATASET_POLL_SECONDS = 5
+
+# Where the pages read the county data from (COUNTY_RESULTS_DATA_BACKEND overrides it).
+# "memory" loads the whole by-year data set into every worker (see county_results_data.py).
+# "sqlite" queries the pipeline's database for the slice each callback needs instead, through read-only
+# per-thread connections and a cache of the last SQLITE_CACHE_SIZE results (see county_results_sql.py), so
+# memory stays flat as years and metrics are added. Callbacks pay for a query on a cache miss.
+DATA_BACKEND = "memory"
+SQLITE_DATABASE = "../us_county_election_results.db"  # COUNTY_RESULTS_DATABASE overrides it
+SQLITE_CACHE_SIZE = 64
+
+# Density mode for the scatterplot: the X/Y plane is cut into a fixed grid of cells,
+# and only the grid (plus a capped number of counties in near-empty cells) is sent to the browser.
+SCATTER_DENSITY_BINS = 60
+SCATTER_DENSITY_OUTLIER_CELL_COUNT = 2  # counties in cells with at most this many counties are drawn individually
+SCATTER_DENSITY_MAX_OUTLIERS = 250
+
+# Filter expressions on the scatterplot and county map (see county_results_filters.py), e.g.
+#   population_pct_hispanic_2024 > 0.3 and votes_total_2024 > 50000 and region = Southwest
+# A region names a group of states. These are the Census Bureau's regions and divisions, plus a few informal ones.
+REGION_DIVISIONS = {
+    "New England": ["Connecticut", "Maine", "Massachusetts", "New Hampshire", "Rhode Island", "Vermont"],
+    "Mid-Atlantic": ["New Jersey", "New York", "Pennsylvania"],
+    "East North Central": ["Illinois", "Indiana", "Michigan", "Ohio", "Wisconsin"],
+    "West North Central": ["Iowa", "Kansas", "Minnesota", "Missouri", "Nebraska", "North Dakota", "South Dakota"],
+    "South Atlantic": [
+        "Delaware", "District of Columbia", "Florida", "Georgia", "Maryland", "North Carolina", "South Carolina",
+        "Virginia", "West Virginia"
+    ],
+    "East South Central": ["Alabama", "Kentucky", "Mississippi", "Tennessee"],
+    "West South Central": ["Arkansas", "Louisiana", "Oklahoma", "Texas"],
+    "Mountain": ["Arizona", "Colorado", "Idaho", "Montana", "Nevada", "New Mexico", "Utah", "Wyoming"],
+    "Pacific": ["Alaska", "California", "Hawaii", "Oregon", "Washington"],
+}
+REGIONS = {
+    **REGION_DIVISIONS,
+    "Northeast": REGION_DIVISIONS["New England"] + REGION_DIVISIONS["Mid-Atlantic"],
+    "Midwest": REGION_DIVISIONS["East North Central"] + REGION_DIVISIONS["West North Central"],
+    "South": REGION_DIVISIONS["South Atlantic"] + REGION_DIVISIONS["East South Central"] + REGION_DIVISIONS["West South Central"],
+    "West": REGION_DIVISIONS["Mountain"] + REGION_DIVISIONS["Pacific"],
+    "Southwest": ["Arizona", "Nevada", "New Mexico", "Oklahoma", "Texas"],
+    "Southeast": [
+        "Alabama", "Arkansas", "Florida", "Georgia", "Kentucky", "Louisiana", "Mississippi", "North Carolina",
+        "South Carolina", "Tennessee", "Virginia", "West Virginia"
+    ],
+    "Rust Belt": ["Illinois", "Indiana", "Michigan", "New York", "Ohio", "Pennsylvania", "West Virginia", "Wisconsin"],
+}
+FILTER_MASK_CACHE_SIZE = 256  # county masks of recently used filters and their parts
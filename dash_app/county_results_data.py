@@ -0,0 +1,503 @@
+import collections
+import contextlib
+import itertools
+import logging
+import os
+import threading
+import time
+import numpy as np
+import pandas as pd
+import county_results_config as cfg
+import county_results_utils as cutils
+from county_results import bins as cbins
+from county_results import ingest as cingest
+from county_results import manifest as cmanifest
+import county_results_memory as cmemory
+import county_results_sql as csql
+import county_results_startup as cstartup
+
+try:
+    import pyarrow as pa
+except ImportError:
+    # Optional: without pyarrow the csv is read instead of the Arrow snapshot.
+    pa = None
+
+# Every page reads the same final data sets, so they are loaded (and derived columns added) once, here.
+# COUNTY_RESULTS_DATA_DIR points the app at another copy of data/final (e.g. synthetic data for benchmarks).
+DATA_DIR = os.environ.get("COUNTY_RESULTS_DATA_DIR", "../data/final")
+# "memory", or "sqlite" to query the pipeline's database for each slice instead (see county_results_sql).
+# With "sqlite", the functions below that serve slices (county_rows, get_state_summary, get_county_data_overall,
+# load_available_years, ...) query it, and the whole data set (load_county_data_by_year) is never loaded.
+BACKEND = os.environ.get("COUNTY_RESULTS_DATA_BACKEND", cfg.DATA_BACKEND)
+
+# ---- Dataset versions ----
+# The loaded data is a Snapshot of one published dataset version (see county_results/manifest.py).
+# A watcher thread in each worker (start_watcher) polls the manifest; when the pipeline publishes a new version,
+# it loads it next to the one being served and builds its derived tables and page data, then swaps it in with
+# a single assignment (double buffering). Each request is pinned to the snapshot that was active when it
+# started (see init_app), so in-flight callbacks finish against the old data. Everything cached from the data
+# is keyed by the snapshot's generation (cutils.single_flight_cache(generation=generation)), so results
+# computed from the old data are never served for the new one, and are dropped after the next swap.
+# Data directories without a manifest (the sample data, synthetic benchmark data) are served as they are.
+#
+# A version published by the election-night ingester (pipeline/ingest_results.py) only adds update files, of
+# changed rows, on top of the active version. refresh() then applies just the new files to the loaded data:
+# the changed columns are copied and overwritten, the others shared with the active snapshot. The derived
+# tables and page data that the change leaves valid are carried over to the new generation, updated for
+# the changed rows where a page registered how (register_incremental), rather than rebuilt from all rows.
+
+logger = logging.getLogger("county_results.data")
+
+DATA_SET = "county_election_data_by_year"
+
+# One loaded dataset version. generation counts the versions loaded by this process, from 1.
+# base and updates are the manifest's data file and update files it was loaded from.
+Snapshot = collections.namedtuple("Snapshot", ["generation", "version", "df", "base", "updates"])
+
+# What an incremental update changed: (state_name, year) pairs, years and row positions, and the changed rows
+# before (old_rows) and after (new_rows) it. Passed to the functions given to register_incremental.
+Changes = collections.namedtuple("Changes", ["keys", "years", "positions", "old_rows", "new_rows"])
+
+_generations = itertools.count(1)
+_active = None
+_load_lock = threading.Lock()
+_refresh_lock = threading.Lock()
+_pinned = threading.local()
+_watcher_pid = None
+# (cached function, update) of everything carried over to the next generation by an incremental update
+_incremental = []
+
+# Columns of the wide "overall" table that do not vary by year, one value per county.
+OVERALL_IDENTIFIER_COLUMNS = [
+    "county_fips", "county_name", "county_seat", "state_name", "state_abbr",
+    "median_household_income_2010", "poverty_pct_overall_2010", "poverty_pct_under_18_2010"
+]
+
+
+def _published_manifest():
+    # Versions are published as Arrow snapshots, so without pyarrow the csv is served as it is.
+    return cmanifest.read_manifest(DATA_DIR) if pa is not None else None
+
+
+def _read_county_data_by_year(manifest):
+    snapshot = f"{DATA_DIR}/{DATA_SET}.arrow"
+    if manifest is not None:
+        snapshot = cmanifest.file_path(DATA_DIR, manifest, DATA_SET)
+    if pa is not None and os.path.exists(snapshot):
+        # Memory-map the Arrow snapshot written by the pipeline. Fixed-width columns without nulls
+        # become zero-copy views of the mapped file, so every worker process reads the same physical pages.
+        # Text columns that were dictionary-encoded come back as pandas categoricals.
+        table = pa.ipc.open_file(pa.memory_map(snapshot, "r")).read_all()
+        return table.to_pandas(split_blocks=True)
+    return pd.read_csv(
+        f"{DATA_DIR}/{DATA_SET}.csv",
+        dtype={"county_fips": str, "code": str}
+    )
+
+
+def load_snapshot(manifest):
+    """
+    Load a dataset version (the long-format county data, one row per county per year) and add the derived
+    columns the pages use, without serving it yet.
+
+    Args:
+        manifest: The version's manifest (cmanifest.read_manifest), or None for the unversioned files
+
+    Returns:
+        Snapshot with the next generation number
+    """
+    df = _read_county_data_by_year(manifest)
+    updates = tuple(manifest["updates"]) if manifest else ()
+    if updates:
+        df, _, _ = cingest.apply_rows(df, _read_updates(manifest, updates))
+    _add_derived_columns(df)
+    return Snapshot(
+        next(_generations), manifest["version"] if manifest else None, df,
+        manifest["files"].get(DATA_SET) if manifest else None, updates
+    )
+
+
+def _read_updates(manifest, updates):
+    # The rows of some update files of a version, the latest of each county and year
+    frames = [pd.read_feather(path) for path in cmanifest.update_paths(DATA_DIR, dict(manifest, updates=updates))]
+    return pd.concat(frames, ignore_index=True).drop_duplicates(cingest.KEY_COLUMNS, keep="last")
+
+
+def _add_derived_columns(df):
+    # Calculate margin in votes (positive = Democrat won, negative = Republican won)
+    df["margin_in_votes"] = df["votes_democrat"] - df["votes_republican"]
+    df["winning_margin_in_votes_abs"] = df["margin_in_votes"].abs()
+    # The pipeline stores uint8 bin codes with the data; older files without them get binned here.
+    if not all(f"{col}_code" in df.columns for col in cbins.BIN_COLUMNS):
+        cbins.add_bin_codes(df)
+    for col in cbins.BIN_COLUMNS:
+        df[f"{col}_code"] = df[f"{col}_code"].astype(np.uint8)
+        df[col] = cbins.labels_from_codes(col, df[f"{col}_code"], index=df.index)
+
+
+def _update_derived_columns(df, positions):
+    # _add_derived_columns() for some rows only, writing copies of the columns (the old frame shares the originals)
+    rows = df.iloc[positions]
+    margin = rows["votes_democrat"] - rows["votes_republican"]
+    derived = {"margin_in_votes": margin, "winning_margin_in_votes_abs": margin.abs()}
+    for col in cbins.BIN_COLUMNS:
+        derived[col] = cbins.labels_from_codes(col, rows[f"{col}_code"].astype(np.uint8), index=rows.index)
+    for column, values in derived.items():
+        current = df[column].copy()
+        current.iloc[positions] = values.to_numpy()
+        df[column] = current
+
+
+def snapshot():
+    """The dataset the caller sees: the one its request is pinned to, otherwise the active one (loaded on first use)."""
+    global _active
+    pinned = getattr(_pinned, "snapshot", None)
+    if pinned is not None:
+        return pinned
+    if _active is None:
+        with _load_lock:
+            if _active is None:
+                _active = load_snapshot(_published_manifest())
+    return _active
+
+
+def generation():
+    """Generation of the caller's snapshot (of the database with the sqlite backend), the extra cache key of everything derived from the data."""
+    if BACKEND == "sqlite":
+        return csql.generation()
+    return snapshot().generation
+
+
+@contextlib.contextmanager
+def using(pinned):
+    """Context manager pinning this thread to a snapshot, e.g. to build its derived tables before it is swapped in."""
+    previous = getattr(_pinned, "snapshot", None)
+    _pinned.snapshot = pinned
+    try:
+        yield pinned
+    finally:
+        _pinned.snapshot = previous
+
+
+def load_county_data_by_year():
+    """
+    The long-format county data (one row per county per year) with the derived columns the pages use.
+
+    Returns:
+        DataFrame of the caller's snapshot, shared by every page. Treat it as read-only, copy before modifying.
+    """
+    return snapshot().df
+
+
+def county_rows(year, state_name=None):
+    """
+    The counties of one year, or of one state and year, with every column of the by-year data.
+
+    Returns:
+        DataFrame, which may be shared with other callers: copy before modifying
+    """
+    if BACKEND == "sqlite":
+        return csql.county_rows(year) if state_name is None else csql.county_rows(year, state_name)
+    df = load_county_data_by_year()
+    mask = df["year"] == year
+    if state_name is not None:
+        mask &= df["state_name"] == state_name
+    return df[mask]
+
+
+@cutils.single_flight_cache(maxsize=None, generation=generation)
+def load_states():
+    """Names of the states with data, sorted."""
+    if BACKEND == "sqlite":
+        return csql.states()
+    return tuple(sorted(load_county_data_by_year()["state_name"].dropna().unique()))
+
+
+@cutils.single_flight_cache(maxsize=None, generation=generation)
+def load_state_summaries():
+    """State x year (and national) vote totals, built once from the by-year data."""
+    return cutils.build_state_summaries(load_county_data_by_year())
+
+
+def get_state_summary(state_name, year):
+    """
+    Look up the precomputed summary for one state and year.
+
+    Returns:
+        Dictionary like calculate_state_summary() returns, or None if there is no data.
+    """
+    if BACKEND == "sqlite":
+        return csql.state_summary(state_name, year)
+    return load_state_summaries().get((state_name, year))
+
+
+# ---- Wide "overall" columns, derived on demand ----
+# The overall table is a pivot of the by-year data: one row per county, one metric_YEAR column per metric and year.
+# Rather than loading a second file, each metric_YEAR column is built from the long data the first time it is asked for.
+
+@cutils.single_flight_cache(maxsize=None, generation=generation)
+def load_county_identifiers():
+    """One row per county with the columns that do not vary by year."""
+    if BACKEND == "sqlite":
+        return csql.county_identifiers(tuple(OVERALL_IDENTIFIER_COLUMNS))
+    df = load_county_data_by_year()
+    return (
+        df.dropna(subset=["county_fips"])
+        .drop_duplicates("county_fips")[OVERALL_IDENTIFIER_COLUMNS]
+        .reset_index(drop=True)
+    )
+
+
+@cutils.single_flight_cache(maxsize=None, generation=generation)
+def _year_positions(year):
+    # Row position in the by-year data of each county for one year, -1 where the county has no row.
+    df = load_county_data_by_year()
+    year_rows = df[df["year"] == year].drop_duplicates("county_fips")
+    positions = pd.Series(df.index.get_indexer(year_rows.index), index=year_rows["county_fips"])
+    return positions.reindex(load_county_identifiers()["county_fips"]).fillna(-1).to_numpy(dtype=np.int64)
+
+
+def split_overall_column(column):
+    """
+    Split a wide column name like "votes_total_2024" into ("votes_total", 2024).
+
+    Returns:
+        (metric, year), or None if the column is not a by-year metric for an available year.
+    """
+    metric, _, year = column.rpartition("_")
+    columns = csql.columns() if BACKEND == "sqlite" else load_county_data_by_year().columns
+    if not year.isdigit() or metric not in columns:
+        return None
+    if int(year) not in load_available_years():
+        return None
+    return metric, int(year)
+
+
+@cutils.single_flight_cache(maxsize=None, generation=generation)
+def load_available_years():
+    if BACKEND == "sqlite":
+        return csql.available_years()
+    return tuple(sorted(int(y) for y in load_county_data_by_year()["year"].unique()))
+
+
+def is_overall_column(column):
+    """Whether a column of the wide table can be served (identifier or any metric/year pair)."""
+    return column in OVERALL_IDENTIFIER_COLUMNS or split_overall_column(column) is not None
+
+
+@cutils.single_flight_cache(maxsize=256, generation=generation)
+def _overall_column(column):
+    # Materialize one metric_YEAR column, aligned to load_county_identifiers().
+    metric, year = split_overall_column(column)
+    if BACKEND == "sqlite":
+        values = csql.metric_by_county(metric, year)
+        return values.reindex(load_county_identifiers()["county_fips"]).reset_index(drop=True)
+    positions = _year_positions(year)
+    values = load_county_data_by_year()[metric].iloc[np.maximum(positions, 0)].reset_index(drop=True)
+    return values.where(positions >= 0)
+
+
+def get_county_data_overall(columns):
+    """
+    Build the wide (one row per county) table with only the requested columns.
+
+    Args:
+        columns: Column names, either identifiers or metric_YEAR pairs such as "votes_pct_democrat_2024"
+
+    Returns:
+        New DataFrame with one row per county, safe to modify
+    """
+    identifiers = load_county_identifiers()
+    data = {}
+    for column in dict.fromkeys(columns):
+        if column in OVERALL_IDENTIFIER_COLUMNS:
+            data[column] = identifiers[column]
+        elif is_overall_column(column):
+            data[column] = _overall_column(column)
+        else:
+            raise KeyError(column)
+    return pd.DataFrame(data)
+
+
+def preload():
+    """
+    Load every data set and derived table up front.
+
+    Called when the app is imported (see county_results_startup), in the gunicorn master before workers are
+    forked, so every worker shares these pages copy-on-write instead of building its own copy.
+    With the sqlite backend, only the years and counties are queried.
+    """
+    if BACKEND == "sqlite":
+        load_available_years()
+        load_county_identifiers()
+        return None
+    df = load_county_data_by_year()
+    load_state_summaries()
+    load_available_years()
+    for year in load_available_years():
+        _year_positions(year)
+    return df
+
+
+@cutils.single_flight_cache(maxsize=None, generation=generation)
+def _key_index():
+    # (county_fips, year) of every row, to find the rows of update files
+    return cingest.key_index(load_county_data_by_year())
+
+
+def register_incremental(cached_function, update=None):
+    """
+    Carry a page's cached data over to the next generation when only some rows changed (an update file).
+
+    Args:
+        cached_function: Function decorated with cutils.single_flight_cache(generation=generation)
+        update: Optional function (args, result, changes) returning the result for the new data, or None to
+            leave it to be recomputed. It runs pinned to the new snapshot. Without it, results are kept as they are.
+    """
+    _incremental.append((cached_function, update))
+
+
+def _apply_updates(active, manifest):
+    # The new version as the active one plus its new update files, with what changed; None if it needs a full load
+    base, updates = manifest["files"].get(DATA_SET), tuple(manifest["updates"])
+    if base != active.base or updates[:len(active.updates)] != active.updates or pa is None:
+        return None, None
+    with using(active):
+        index = _key_index()
+    rows = _read_updates(manifest, updates[len(active.updates):])
+    df, positions, appended = cingest.apply_rows(active.df, rows, index=index)
+    new = Snapshot(next(_generations), manifest["version"], df, base, updates)
+    if appended:
+        # The first rows of a new election year: the years, identifiers and positions all change
+        _add_derived_columns(df)
+        return new, None
+    _update_derived_columns(df, positions)
+    new_rows = df.iloc[positions]
+    changes = Changes(
+        keys=set(zip(new_rows["state_name"].astype(object), new_rows["year"].astype(int))),
+        years=set(new_rows["year"].astype(int)),
+        positions=positions,
+        old_rows=active.df.iloc[positions],
+        new_rows=new_rows,
+    )
+    return new, changes
+
+
+def _carry_over(old, new, changes):
+    # Derived tables the changed rows leave valid (or that can be updated for them) move to the new generation
+    load_county_identifiers.carry_over(old.generation, new.generation)
+    load_available_years.carry_over(old.generation, new.generation)
+    _year_positions.carry_over(old.generation, new.generation)
+    _key_index.carry_over(old.generation, new.generation)
+    _overall_column.carry_over(
+        old.generation, new.generation,
+        lambda args, column: None if split_overall_column(args[0])[1] in changes.years else column
+    )
+    load_state_summaries.carry_over(
+        old.generation, new.generation,
+        lambda args, summaries: cutils.update_state_summaries(summaries, changes.old_rows, changes.new_rows)
+    )
+    for cached_function, update in _incremental:
+        cached_function.carry_over(
+            old.generation, new.generation,
+            None if update is None else lambda args, result, update=update: update(args, result, changes)
+        )
+
+
+def refresh():
+    """
+    Swap in the published dataset version if it isn't the active one.
+    The new version is loaded, and its derived tables and page data built, while the old one is still served.
+    A version that only adds update files to the active one is applied to it incrementally.
+
+    Returns:
+        The new Snapshot, or None if there was nothing to swap in
+    """
+    global _active
+    with _refresh_lock:
+        manifest = _published_manifest()
+        if manifest is None or _active is None or manifest["version"] == _active.version:
+            return None
+        start = time.perf_counter()
+        new, changes = _apply_updates(_active, manifest)
+        if new is None:
+            new = load_snapshot(manifest)
+        with using(new):
+            if changes is not None:
+                _carry_over(_active, new, changes)
+            preload()
+            for name, builder in cstartup.builders():
+                builder()
+        old, _active = _active, new
+    how = f"{len(changes.positions)} rows updated" if changes is not None else "loaded"
+    logger.info(
+        f"swapped in dataset version {new.version} (generation {new.generation}, {how} in "
+        f"{time.perf_counter() - start:.3f}s), was {old.version}"
+    )
+    return new
+
+
+def start_watcher():
+    """Check for a new dataset version every cfg.DATASET_POLL_SECONDS in a daemon thread, once per process."""
+    global _watcher_pid
+    # The sqlite backend sees new data through the database file (csql.generation) instead
+    if not cfg.DATASET_POLL_SECONDS or BACKEND == "sqlite":
+        return
+    with _refresh_lock:
+        # Once per process: a forked gunicorn worker doesn't inherit its parent's thread
+        if _watcher_pid == os.getpid():
+            return
+        _watcher_pid = os.getpid()
+
+    def watch():
+        while True:
+            time.sleep(cfg.DATASET_POLL_SECONDS)
+            try:
+                refresh()
+            except Exception:
+                # Keep serving the active version; the next poll tries again
+                logger.exception("loading a new dataset version failed")
+
+    threading.Thread(target=watch, name="county-results-dataset-watcher", daemon=True).start()
+
+
+def init_app(server):
+    """Pin every request to the active snapshot, and serve the active version on /dataset."""
+    from flask import jsonify
+
+    if not logger.handlers:
+        logger.addHandler(logging.StreamHandler())
+        logger.setLevel(logging.INFO)
+
+    @server.before_request
+    def pin_snapshot():
+        # Requests before the data is loaded (lazy startup) load it through snapshot() when they need it
+        _pinned.snapshot = _active
+
+    @server.teardown_request
+    def unpin_snapshot(exc):
+        _pinned.snapshot = None
+
+    @server.route("/dataset")
+    def dataset():
+        active = _active
+        return jsonify({
+            "backend": BACKEND,
+            "version": active.version if active else None,
+            "generation": csql.generation() if BACKEND == "sqlite" else active.generation if active else None,
+            "rows": len(active.df) if active else None,
+            "published": _published_manifest(),
+        })
+
+
+# ---- Memory accounting (see county_results_memory) ----
+def _if_loaded(loader):
+    # Report a loaded data set without loading it just to measure it
+    return lambda: loader() if _active is not None and loader.cache_info().currsize else None
+
+
+cmemory.register_frame("county_data_by_year", lambda: _active.df if _active is not None else None)
+cmemory.register_frame("county_identifiers", _if_loaded(load_county_identifiers))
+cmemory.register_object("state_summaries", _if_loaded(load_state_summaries))
+cmemory.register_cache("overall_columns", _overall_column)
+cmemory.register_cache("year_positions", _year_positions)
@@ -0,0 +1,395 @@
+import collections
+import re
+import numpy as np
+import pandas as pd
+import county_results_config as cfg
+import county_results_utils as cutils
+import county_results_data as cdata
+import county_results_memory as cmemory
+
+# Filter expressions, for picking counties on the scatterplot and the county map, e.g.
+#     population_pct_hispanic_2024 > 0.3 and votes_total_2024 > 50000 and region = Southwest
+# An expression is parsed once (parse) into a tree of tuples, its column names are resolved against the wide
+# "overall" columns (bind), and every node of the tree is evaluated into a boolean numpy mask over the counties
+# of cdata.load_county_identifiers(). Masks are cached per node (cfg.FILTER_MASK_CACHE_SIZE, keyed by the data's
+# generation), so "A and B" followed by "A and C" only computes C, and changing the year, state or color of a view
+# only costs indexing a cached mask instead of filtering DataFrames again.
+#
+# Grammar (keywords are case-insensitive):
+#     expression := term ("or" term)*
+#     term       := factor ("and" factor)*
+#     factor     := "not" factor | "(" expression ")" | condition
+#     condition  := column (">" | ">=" | "<" | "<=" | "=" | "==" | "!=") value
+#                 | column ["not"] "in" "(" value ("," value)* ")"
+#                 | column ["not"] "between" value "and" value
+#     value      := number (30% is 0.3) | "quoted text" | 'quoted text' | word
+# A column is a column of the wide table (votes_total_2024, state_name, ...), "region" (see cfg.REGIONS), or,
+# on the county map, a by-year metric without its year (votes_total), which means the year on display.
+# Text comparisons ignore case; a number compared with a text column is compared as typed (county_fips = 01001).
+# Counties without a value for a column never match a condition on it, negated or not: "not", "not in" and
+# "not between" only match counties that have a value for every column they read.
+
+ALIASES = {"state": "state_name", "county": "county_name", "fips": "county_fips"}
+COMPARISONS = {">": np.greater, ">=": np.greater_equal, "<": np.less, "<=": np.less_equal, "==": np.equal, "!=": np.not_equal}
+KEYWORDS = {"and", "or", "not", "in", "between"}
+
+_TOKEN = re.compile(r"""
+    \s*(?:
+        (?P<number>-?(?:\d+\.?\d*|\.\d+)(?:e[-+]?\d+)?%?)
+      | (?P<text>"[^"]*"|'[^']*')
+      | (?P<symbol>>=|<=|!=|==|=|>|<|\(|\)|,)
+      | (?P<word>[a-z_][a-z0-9_\-]*)
+    )""", re.VERBOSE | re.IGNORECASE)
+
+
+# A number of an expression, with its text as typed, for comparisons with text columns
+Number = collections.namedtuple("Number", ["value", "text"])
+
+
+class FilterError(ValueError):
+    """A filter expression that can't be parsed or evaluated; the message is meant for the user."""
+
+
+def tokenize(text):
+    """
+    Split a filter expression into tokens.
+
+    Returns:
+        List of (kind, value) tuples: kind is "number" (a Number), "text", "symbol", "keyword" or "word"
+    """
+    tokens = []
+    position, end = 0, len(text.rstrip())
+    while position < end:
+        match = _TOKEN.match(text, position)
+        if match is None or match.end() == position:
+            raise FilterError(f"Unexpected {text[position:].strip()[:20]!r}")
+        kind = match.lastgroup
+        value = match.group(kind)
+        if kind == "number":
+            value = Number(float(value[:-1]) / 100 if value.endswith("%") else float(value), value)
+        elif kind == "text":
+            value = value[1:-1]
+        elif kind == "word" and value.lower() in KEYWORDS:
+            kind, value = "keyword", value.lower()
+        tokens.append((kind, value))
+        position = match.end()
+    return tokens
+
+
+class _Parser:
+    # Recursive descent over the grammar above, building nested tuples:
+    # ("or", node, ...), ("and", node, ...), ("not", node), ("compare", column, op, value),
+    # ("in" or "not in", column, values), ("between" or "not between", column, low, high)
+
+    def __init__(self, tokens):
+        self.tokens = tokens
+        self.position = 0
+
+    def peek(self, kind, value=None):
+        if self.position < len(self.tokens):
+            token_kind, token_value = self.tokens[self.position]
+            return token_kind == kind and (value is None or token_value == value)
+        return False
+
+    def accept(self, kind, value=None):
+        if self.peek(kind, value):
+            self.position += 1
+            return True
+        return False
+
+    def expect(self, kind, value, what):
+        if not self.accept(kind, value):
+            raise FilterError(f"Expected {what} {self.where()}")
+
+    def where(self):
+        if self.position >= len(self.tokens):
+            return "at the end"
+        return f"before {_text(self.tokens[self.position][1])!r}"
+
+    def expression(self):
+        terms = [self.term()]
+        while self.accept("keyword", "or"):
+            terms.append(self.term())
+        return terms[0] if len(terms) == 1 else ("or", *terms)
+
+    def term(self):
+        factors = [self.factor()]
+        while self.accept("keyword", "and"):
+            factors.append(self.factor())
+        return factors[0] if len(factors) == 1 else ("and", *factors)
+
+    def factor(self):
+        if self.accept("keyword", "not"):
+            return ("not", self.factor())
+        if self.accept("symbol", "("):
+            node = self.expression()
+            self.expect("symbol", ")", "')'")
+            return node
+        return self.condition()
+
+    def condition(self):
+        if not self.peek("word"):
+            raise FilterError(f"Expected a column name {self.where()}")
+        column = self.tokens[self.position][1].lower()
+        self.position += 1
+        negated = self.accept("keyword", "not")
+        if self.accept("keyword", "in"):
+            self.expect("symbol", "(", "'(' after 'in'")
+            values = [self.value()]
+            while self.accept("symbol", ","):
+                values.append(self.value())
+            self.expect("symbol", ")", "')'")
+            node = ("not in" if negated else "in", column, tuple(values))
+        elif self.accept("keyword", "between"):
+            low = self.value()
+            self.expect("keyword", "and", "'and' in 'between'")
+            node = ("not between" if negated else "between", column, low, self.value())
+        elif negated:
+            raise FilterError(f"Expected 'in' or 'between' after 'not' {self.where()}")
+        elif self.peek("symbol") and self.tokens[self.position][1] in {"=", "==", "!=", ">", ">=", "<", "<="}:
+            op = self.tokens[self.position][1]
+            self.position += 1
+            node = ("compare", column, "==" if op == "=" else op, self.value())
+        else:
+            raise FilterError(f"Expected a comparison after {column!r} {self.where()}")
+        return node
+
+    def value(self):
+        if self.peek("number") or self.peek("text") or self.peek("word"):
+            self.position += 1
+            return self.tokens[self.position - 1][1]
+        raise FilterError(f"Expected a value {self.where()}")
+
+
+@cutils.single_flight_cache(maxsize=cfg.FILTER_MASK_CACHE_SIZE)
+def parse(text):
+    """
+    Parse a filter expression (see the grammar above).
+
+    Returns:
+        The expression as a tree of tuples, or None for an empty expression
+    """
+    tokens = tokenize(text)
+    if not tokens:
+        return None
+    parser = _Parser(tokens)
+    node = parser.expression()
+    if parser.position < len(tokens):
+        raise FilterError(f"Unexpected {_text(tokens[parser.position][1])!r}")
+    return node
+
+
+def _valid_columns():
+    # What a condition can name, for error messages
+    metrics = sorted({split[0] for split in map(cdata.split_overall_column, cfg.COLUMN_MAP_OVERALL) if split})
+    latest = max(cdata.load_available_years())
+    return (
+        f"Use region, a county column ({', '.join(cdata.OVERALL_IDENTIFIER_COLUMNS)}) or a metric and year "
+        f"like votes_total_{latest}, with metrics: {', '.join(metrics)}"
+    )
+
+
+def _resolve(column, year):
+    # The wide column a name refers to: itself, an alias, or a by-year metric at the year on display
+    column = ALIASES.get(column, column)
+    if column == "year":
+        # The filter picks counties: a year only makes sense as part of a metric's name
+        latest = max(cdata.load_available_years())
+        raise FilterError(
+            f"'year' isn't a county column: put the year in the metric's name, like votes_total_{latest}"
+            + (", or leave it out for the map's year" if year is not None else "")
+        )
+    if cdata.is_overall_column(column):
+        return column
+    if year is not None and cdata.is_overall_column(f"{column}_{year}"):
+        return f"{column}_{year}"
+    if cdata.split_overall_column(f"{column}_{max(cdata.load_available_years())}"):
+        raise FilterError(f"{column!r} needs a year, like {column}_{max(cdata.load_available_years())}")
+    raise FilterError(f"Unknown column {column!r}. {_valid_columns()}")
+
+
+def _text(value):
+    return value.text if isinstance(value, Number) else value
+
+
+def _region_states(values):
+    regions = {name.lower(): states for name, states in cfg.REGIONS.items()}
+    states = []
+    for value in map(_text, values):
+        if value.lower() not in regions:
+            raise FilterError(f"Unknown region {value!r}, pick one of: {', '.join(cfg.REGIONS)}")
+        states.extend(regions[value.lower()])
+    return tuple(sorted(set(states)))
+
+
+def _column(column):
+    # One wide column, aligned to cdata.load_county_identifiers(), and whether it holds numbers
+    series = cdata.get_county_data_overall([column])[column]
+    numeric = pd.api.types.is_numeric_dtype(series.dtype) and not pd.api.types.is_bool_dtype(series.dtype)
+    return series, numeric
+
+
+def _literal(column, numeric, value):
+    # A value of the expression as the column's type: numbers for numeric columns, text as typed for the others
+    if not numeric:
+        return _text(value)
+    if not isinstance(value, Number):
+        raise FilterError(f"{column} is a number, compare it with numbers")
+    return value.value
+
+
+def bind(node, year=None):
+    """
+    Resolve the column names of a parsed expression, so that equal filters share their cached masks.
+    Conditions on "region" become conditions on state_name.
+
+    Args:
+        node: Tree from parse()
+        year: Year of metrics given without one (the year on display), or None to require years
+
+    Returns:
+        Tree of the same shape, with wide column names, and values of the columns' types (float or text)
+    """
+    kind = node[0]
+    if kind in ("or", "and", "not"):
+        return (kind, *(bind(child, year) for child in node[1:]))
+    if node[1] == "region":
+        if kind in ("in", "not in"):
+            return (kind, "state_name", _region_states(node[2]))
+        if kind == "compare" and node[2] in ("==", "!="):
+            return ("in" if node[2] == "==" else "not in", "state_name", _region_states([node[3]]))
+        raise FilterError("Regions can only be compared with =, != or in (...)")
+    column = _resolve(node[1], year)
+    _, numeric = _column(column)
+    if not numeric and (kind in ("between", "not between") or (kind == "compare" and node[2] not in ("==", "!="))):
+        raise FilterError(f"{column} is text, it can only be compared with =, != or in (...)")
+    if kind == "compare":
+        return (kind, column, node[2], _literal(column, numeric, node[3]))
+    if kind in ("in", "not in"):
+        return (kind, column, tuple(_literal(column, numeric, value) for value in node[2]))
+    return (kind, column, *(_literal(column, numeric, value) for value in node[2:]))
+
+
+@cutils.single_flight_cache(maxsize=cfg.FILTER_MASK_CACHE_SIZE, generation=cdata.generation)
+def _present(column):
+    # Counties with a value for one wide column. Shared: read-only.
+    present = _column(column)[0].notna().to_numpy()
+    present.flags.writeable = False
+    return present
+
+
+def _node_present(node):
+    # Counties with a value for every column a bound node reads: the only ones its negation can match
+    if node[0] in ("or", "and", "not"):
+        return np.logical_and.reduce([_node_present(child) for child in node[1:]])
+    return _present(node[1])
+
+
+def _condition_mask(node):
+    # One bound condition over every county, negated ones included, with missing values never matching
+    kind, column = node[0], node[1]
+    series, numeric = _column(column)
+    if numeric:
+        values = series.to_numpy(dtype=float, na_value=np.nan)
+        with np.errstate(invalid="ignore"):
+            if kind == "compare":
+                mask = COMPARISONS[node[2]](values, node[3])
+            elif kind in ("in", "not in"):
+                mask = np.isin(values, node[2])
+            else:
+                mask = (values >= node[2]) & (values <= node[3])
+    else:
+        values = series.astype(object).where(series.notna(), "").astype(str).str.casefold().to_numpy()
+        if kind == "compare":
+            mask = values == node[3].casefold()
+            if node[2] == "!=":
+                mask = ~mask
+        else:
+            mask = np.isin(values, [value.casefold() for value in node[2]])
+    if kind in ("not in", "not between"):
+        mask = ~mask
+    return mask & _present(column)
+
+
+@cutils.single_flight_cache(maxsize=cfg.FILTER_MASK_CACHE_SIZE, generation=cdata.generation)
+def _mask(node):
+    # Mask of one bound node, aligned to cdata.load_county_identifiers(). Shared: read-only.
+    kind = node[0]
+    if kind == "or":
+        mask = np.logical_or.reduce([_mask(child) for child in node[1:]])
+    elif kind == "and":
+        mask = np.logical_and.reduce([_mask(child) for child in node[1:]])
+    elif kind == "not":
+        mask = ~_mask(node[1]) & _node_present(node[1])
+    else:
+        mask = _condition_mask(node)
+    mask.flags.writeable = False
+    return mask
+
+
+def _node_years(node):
+    # Years of the by-year columns a bound node reads
+    if node[0] in ("or", "and", "not"):
+        return set().union(*(_node_years(child) for child in node[1:]))
+    split = cdata.split_overall_column(node[1])
+    return {split[1]} if split else set()
+
+
+def county_mask(text, year=None):
+    """
+    Which counties match a filter expression.
+
+    Args:
+        text: Filter expression, see the grammar above
+        year: Year of metrics given without one (the map's year), or None to require years (the scatterplot)
+
+    Returns:
+        Read-only boolean array aligned to cdata.load_county_identifiers(), or None if the expression is empty
+
+    Raises:
+        FilterError: If the expression is invalid
+    """
+    node = parse((text or "").strip())
+    return None if node is None else _mask(bind(node, year))
+
+
+@cutils.single_flight_cache(maxsize=None, generation=cdata.generation)
+def _county_index():
+    return pd.Index(cdata.load_county_identifiers()["county_fips"])
+
+
+def row_mask(text, county_fips, year=None):
+    """
+    county_mask() for rows of the by-year data, e.g. one year of counties for the map.
+
+    Args:
+        county_fips: The rows' county_fips values (unpadded, as in the data)
+
+    Returns:
+        Boolean array, one value per row (rows of unknown counties never match), or None if the expression is empty
+    """
+    mask = county_mask(text, year)
+    if mask is None:
+        return None
+    positions = _county_index().get_indexer(county_fips)
+    return np.where(positions >= 0, mask[np.maximum(positions, 0)], False)
+
+
+def describe(text, year=None):
+    """A short message about a filter for the page: how many counties match it, or what is wrong with it."""
+    try:
+        mask = county_mask(text, year)
+    except FilterError as error:
+        return f"Filter not applied: {error}"
+    if mask is None:
+        return ""
+    return f"{int(mask.sum()):,} of {len(mask):,} counties match"
+
+
+# Masks on by-year columns of the years an update changed are computed again, the others stay valid
+cdata.register_incremental(_mask, lambda args, mask, changes: None if _node_years(args[0]) & changes.years else mask)
+cdata.register_incremental(
+    _present, lambda args, present, changes: None if _node_years(("compare", args[0])) & changes.years else present
+)
+cmemory.register_cache("filter_masks", _mask)
+cmemory.register_cache("filter_presence", _present)
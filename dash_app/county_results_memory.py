@@ -0,0 +1,191 @@
+import gc
+import os
+import sys
+import threading
+import tracemalloc
+import types
+import numpy as np
+import pandas as pd
+
+# Memory accounting for the Dash app: what the loaded data sets, caches and precomputed layouts hold.
+# Modules register what they keep in memory (register_frame / register_cache / register_object), and
+# memory_report() measures it: per-column deep memory of each loaded frame, entries and bytes of each cache,
+# and deep size of other long-lived objects. Served as JSON on /memory (see init_app) and printed by
+# benchmarks/memory_report.py. Sizes are per process; memory-mapped Arrow columns count their full size
+# here even though worker processes share those pages.
+#
+# With COUNTY_RESULTS_TRACEMALLOC set to a number of frames (e.g. 10), tracemalloc starts when this module
+# is imported (app.py imports it before the pages load their data), so the report also lists the top
+# allocation sites since startup. /memory?snapshot=1 keeps a snapshot, and later /memory?diff=1 lists what
+# grew since then, to find memory that grows with every request. tracemalloc slows allocations down, so only
+# turn it on to investigate.
+
+TRACEMALLOC_FRAMES = int(os.environ.get("COUNTY_RESULTS_TRACEMALLOC", "0"))
+if TRACEMALLOC_FRAMES and not tracemalloc.is_tracing():
+    tracemalloc.start(TRACEMALLOC_FRAMES)
+
+# name -> function returning the frame, or None while it isn't loaded
+_frames = {}
+# name -> cached function (cutils.single_flight_cache lists its values; other caches only report entries)
+_caches = {}
+# name -> function returning the object
+_objects = {}
+
+_snapshot_lock = threading.Lock()
+_baseline_snapshot = None
+
+
+def register_frame(name, get_frame):
+    _frames[name] = get_frame
+
+
+def register_cache(name, cached_function):
+    _caches[name] = cached_function
+
+
+def register_object(name, get_object):
+    _objects[name] = get_object
+
+
+def deep_sizeof(obj):
+    """
+    Approximate bytes held by an object and everything it references, each object counted once.
+    pandas objects count their deep memory_usage, numpy arrays their data, Plotly figures their JSON-like dict.
+    """
+    seen = set()
+    stack = [obj]
+    total = 0
+    while stack:
+        o = stack.pop()
+        if id(o) in seen or isinstance(o, (type, types.ModuleType, types.FunctionType)):
+            continue
+        seen.add(id(o))
+        if isinstance(o, pd.DataFrame):
+            total += int(o.memory_usage(deep=True, index=True).sum())
+        elif isinstance(o, (pd.Series, pd.Index)):
+            total += int(o.memory_usage(deep=True))
+        elif isinstance(o, np.ndarray):
+            total += sys.getsizeof(o) if o.base is None else o.nbytes
+        elif hasattr(o, "to_plotly_json") and hasattr(o, "data") and hasattr(o, "layout"):
+            # A Plotly figure: its data and layout (a copy of them, same size)
+            stack.append(o.to_dict())
+        else:
+            total += sys.getsizeof(o)
+            stack.extend(gc.get_referents(o))
+    return total
+
+
+def frame_memory(df):
+    """Deep memory of a frame, per column (largest first) and in total."""
+    usage = df.memory_usage(deep=True, index=True)
+    columns = {
+        column: {"dtype": str(df[column].dtype), "bytes": int(usage[column])}
+        for column in usage.drop("Index").sort_values(ascending=False).index
+    }
+    return {
+        "rows": len(df),
+        "columns": len(df.columns),
+        "total_bytes": int(usage.sum()),
+        "index_bytes": int(usage["Index"]),
+        "column_bytes": columns,
+    }
+
+
+def cache_memory(cached_function):
+    info = cached_function.cache_info()
+    report = {"entries": info.currsize, "maxsize": info.maxsize, "hits": info.hits, "misses": info.misses, "bytes": None}
+    if hasattr(cached_function, "cache_values"):
+        report["bytes"] = sum(deep_sizeof(value) for value in cached_function.cache_values())
+    return report
+
+
+def _snapshot():
+    snapshot = tracemalloc.take_snapshot()
+    # Leave out tracemalloc's own bookkeeping
+    return snapshot.filter_traces([tracemalloc.Filter(False, tracemalloc.__file__)])
+
+
+def _statistic(stat):
+    return {"where": str(stat.traceback), "bytes": stat.size, "blocks": stat.count}
+
+
+def top_allocations(limit=25):
+    """Allocation sites holding the most memory now, among those allocated since tracemalloc started."""
+    if not tracemalloc.is_tracing():
+        return None
+    return [_statistic(stat) for stat in _snapshot().statistics("lineno")[:limit]]
+
+
+def take_baseline_snapshot():
+    """Keep a tracemalloc snapshot to diff later ones against."""
+    global _baseline_snapshot
+    if not tracemalloc.is_tracing():
+        return False
+    with _snapshot_lock:
+        _baseline_snapshot = _snapshot()
+    return True
+
+
+def diff_since_baseline(limit=25):
+    """Allocation sites that grew the most since take_baseline_snapshot(), or None without a baseline."""
+    with _snapshot_lock:
+        baseline = _baseline_snapshot
+    if baseline is None or not tracemalloc.is_tracing():
+        return None
+    return [
+        dict(_statistic(stat), bytes_diff=stat.size_diff, blocks_diff=stat.count_diff)
+        for stat in _snapshot().compare_to(baseline, "lineno")[:limit]
+    ]
+
+
+def process_rss_bytes():
+    """Resident memory of this process (Linux), or None."""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+def memory_report(top=25, diff=False):
+    """
+    Everything registered, measured.
+
+    Args:
+        top: Number of tracemalloc allocation sites to list
+        diff: Also list what grew since the baseline snapshot
+
+    Returns:
+        JSON-serializable dictionary
+    """
+    frames = {}
+    for name, get_frame in _frames.items():
+        df = get_frame()
+        if df is not None:
+            frames[name] = frame_memory(df)
+    report = {
+        "pid": os.getpid(),
+        "rss_bytes": process_rss_bytes(),
+        "frames": frames,
+        "caches": {name: cache_memory(func) for name, func in _caches.items()},
+        "objects": {name: deep_sizeof(get_object()) for name, get_object in _objects.items()},
+        "tracemalloc": None,
+    }
+    if tracemalloc.is_tracing():
+        current, peak = tracemalloc.get_traced_memory()
+        report["tracemalloc"] = {"traced_bytes": current, "peak_bytes": peak, "top": top_allocations(top)}
+        if diff:
+            report["tracemalloc"]["diff"] = diff_since_baseline(top)
+    return report
+
+
+def init_app(server):
+    """Serve memory_report() on /memory. ?top=N, ?diff=1 and ?snapshot=1 (taken after the report) are optional."""
+    from flask import jsonify, request
+
+    @server.route("/memory")
+    def memory():
+        report = memory_report(top=request.args.get("top", 25, type=int), diff=request.args.get("diff") == "1")
+        if request.args.get("snapshot") == "1":
+            report["snapshot_taken"] = take_baseline_snapshot()
+        return jsonify(report)
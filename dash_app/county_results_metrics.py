@@ -0,0 +1,135 @@
+import functools
+import json
+import logging
+import os
+import threading
+import time
+from flask import Response, g, request
+
+# Instrumentation for the page callbacks.
+# @instrument (placed under @dash.callback) times the callback itself, i.e. the figure/table construction.
+# init_app hooks the Flask server so every /_dash-update-component request also records the total request
+# time, the time after the callback returned (mostly Dash serializing the response to JSON), the response
+# size and the input values. These are kept as histograms per callback, served in the Prometheus text format
+# on /metrics, and every request also writes one JSON log line to the "county_results.metrics" logger.
+# Metrics are per process: with several gunicorn workers, /metrics shows the worker that answered (see the
+# "pid" label). Callbacks that run as background jobs are timed in the job process and are not recorded.
+
+logger = logging.getLogger("county_results.metrics")
+
+# Histogram bucket upper bounds
+SECONDS_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+BYTES_BUCKETS = (1_000, 10_000, 100_000, 250_000, 500_000, 1_000_000, 2_500_000, 5_000_000, 10_000_000)
+
+# Metric name -> (help text, buckets)
+METRICS = {
+    "callback_request_seconds": ("Total time of a callback request", SECONDS_BUCKETS),
+    "callback_compute_seconds": ("Time spent in the callback function building figures/tables", SECONDS_BUCKETS),
+    "callback_serialize_seconds": ("Time after the callback returned, mostly JSON serialization", SECONDS_BUCKETS),
+    "callback_response_bytes": ("Size of the callback response body", BYTES_BUCKETS),
+}
+
+_lock = threading.Lock()
+# (metric, callback) -> {"buckets": [count per bucket], "sum": float, "count": int}
+_histograms = {}
+
+
+def observe(metric, callback, value):
+    """Add one observation to the histogram of a metric for a callback."""
+    buckets = METRICS[metric][1]
+    with _lock:
+        histogram = _histograms.get((metric, callback))
+        if histogram is None:
+            histogram = _histograms[(metric, callback)] = {"buckets": [0] * len(buckets), "sum": 0.0, "count": 0}
+        for i, bound in enumerate(buckets):
+            if value <= bound:
+                histogram["buckets"][i] += 1
+        histogram["sum"] += value
+        histogram["count"] += 1
+
+
+def render_metrics():
+    """All histograms in the Prometheus text exposition format."""
+    pid = os.getpid()
+    with _lock:
+        snapshot = {key: dict(h, buckets=list(h["buckets"])) for key, h in _histograms.items()}
+    lines = []
+    for metric, (help_text, buckets) in METRICS.items():
+        lines.append(f"# HELP {metric} {help_text}")
+        lines.append(f"# TYPE {metric} histogram")
+        for (name, callback), histogram in sorted(snapshot.items()):
+            if name != metric:
+                continue
+            labels = f'callback="{callback}",pid="{pid}"'
+            for bound, count in zip(buckets, histogram["buckets"]):
+                lines.append(f'{metric}_bucket{{{labels},le="{bound}"}} {count}')
+            lines.append(f'{metric}_bucket{{{labels},le="+Inf"}} {histogram["count"]}')
+            lines.append(f"{metric}_sum{{{labels}}} {histogram['sum']}")
+            lines.append(f"{metric}_count{{{labels}}} {histogram['count']}")
+    return "\n".join(lines) + "\n"
+
+
+def instrument(func):
+    """
+    Decorator for a page callback, placed directly under @dash.callback.
+    Records how long the function itself takes; the request hooks in init_app do the rest.
+    """
+    name = f"{func.__module__.rsplit('.', 1)[-1]}.{func.__name__}"
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            elapsed = time.perf_counter() - start
+            try:
+                g.callback_name = name
+                g.callback_compute_seconds = elapsed
+            except RuntimeError:
+                # Not inside a Flask request (e.g. a background job or a direct call)
+                pass
+    return wrapper
+
+
+def init_app(server):
+    """Add the timing hooks and the /metrics endpoint to the Flask server."""
+    # One log line per callback request on stderr, unless logging was already set up for this logger
+    if not logger.handlers:
+        logger.addHandler(logging.StreamHandler())
+        logger.setLevel(logging.INFO)
+
+    @server.before_request
+    def start_timer():
+        g.request_start = time.perf_counter()
+
+    @server.after_request
+    def record_callback(response):
+        if not request.path.endswith("/_dash-update-component") or "callback_name" not in g:
+            return response
+        total = time.perf_counter() - g.request_start
+        compute = g.callback_compute_seconds
+        size = response.calculate_content_length() or 0
+        callback = g.callback_name
+        observe("callback_request_seconds", callback, total)
+        observe("callback_compute_seconds", callback, compute)
+        observe("callback_serialize_seconds", callback, max(total - compute, 0.0))
+        observe("callback_response_bytes", callback, size)
+
+        body = request.get_json(silent=True) or {}
+        logger.info(json.dumps({
+            "event": "callback",
+            "callback": callback,
+            "status": response.status_code,
+            "request_ms": round(total * 1000, 2),
+            "compute_ms": round(compute * 1000, 2),
+            "serialize_ms": round(max(total - compute, 0.0) * 1000, 2),
+            "response_bytes": size,
+            "inputs": {f"{i['id']}.{i['property']}": i.get("value") for i in body.get("inputs", []) if isinstance(i, dict)},
+            "pid": os.getpid(),
+        }, default=str))
+        return response
+
+    @server.route("/metrics")
+    def metrics():
+        return Response(render_metrics(), mimetype="text/plain; version=0.0.4")
@@ -0,0 +1,54 @@
+import json
+import os
+import threading
+import time
+import uuid
+from urllib.parse import urlparse
+import dash
+from flask import g, request
+
+# Session recording for load tests (see benchmarks/load_test.py).
+# With COUNTY_RESULTS_RECORD_SESSIONS set to a file path, every page load and every /_dash-update-component
+# POST is appended to that file as one JSON line: the browser session (a cookie set on the first response),
+# the time, the page, and for callbacks the exact request body. Replaying a session's lines in order, with
+# the same gaps, reproduces what that user did. Off (no hooks at all) when the variable is not set.
+
+RECORD_PATH = os.environ.get("COUNTY_RESULTS_RECORD_SESSIONS")
+SESSION_COOKIE = "county_results_session"
+
+_lock = threading.Lock()
+
+
+def _write(event):
+    # One write per line, in append mode, so lines from several gunicorn workers don't interleave.
+    line = json.dumps(event, default=str) + "\n"
+    with _lock:
+        with open(RECORD_PATH, "a") as f:
+            f.write(line)
+
+
+def init_app(server):
+    """Add the recording hooks to the Flask server, if COUNTY_RESULTS_RECORD_SESSIONS is set."""
+    if not RECORD_PATH:
+        return
+
+    @server.before_request
+    def identify_session():
+        g.record_session = request.cookies.get(SESSION_COOKIE) or uuid.uuid4().hex
+
+    @server.after_request
+    def record_request(response):
+        page_paths = {page["path"] for page in dash.page_registry.values()}
+        if request.method == "GET" and request.path in page_paths:
+            event = {"kind": "page", "page": request.path}
+        elif request.method == "POST" and request.path.endswith("/_dash-update-component"):
+            # The page the callback came from, from the browser's Referer header
+            page = urlparse(request.referrer).path if request.referrer else None
+            event = {"kind": "callback", "page": page, "body": request.get_json(silent=True)}
+        else:
+            return response
+        event.update(session=g.record_session, time=time.time(), status=response.status_code)
+        _write(event)
+        if SESSION_COOKIE not in request.cookies:
+            response.set_cookie(SESSION_COOKIE, g.record_session, httponly=True, samesite="Lax")
+        return response
@@ -0,0 +1,163 @@
+import os
+import sqlite3
+import threading
+import urllib.request
+import pandas as pd
+import county_results_config as cfg
+import county_results_utils as cutils
+from county_results import bins as cbins
+import county_results_memory as cmemory
+
+# Read-only SQLite backend (cfg.DATA_BACKEND = "sqlite", see county_results_data).
+# Instead of loading the whole by-year data set into every worker, each callback queries the pipeline's
+# database for the slice it needs: one year (and state) of counties for the map and heatmap, one metric of one
+# year for each scatterplot column, and the vote totals of one state and year for the summary tables.
+# The queries filter on final__county_election_data_by_year (year, state_name), which the pipeline indexes
+# (transform_staging_to_final.sql). Every thread opens its own read-only connection on first use and keeps it
+# (a connection per gunicorn worker thread); sqlite3 keeps each connection's compiled statements, so the
+# parameterized queries below are only prepared once per thread. Results are cached (cfg.SQLITE_CACHE_SIZE
+# per kind of slice), keyed by generation(), which changes whenever the database file does: after a pipeline
+# run or an ingester upsert, the next query sees the new data.
+
+DATABASE = os.environ.get("COUNTY_RESULTS_DATABASE", cfg.SQLITE_DATABASE)
+TABLE = "final__county_election_data_by_year"
+
+# Columns the pages use that the database doesn't store, computed in the query (the bins are added after it)
+DERIVED_COLUMNS = {
+    "margin_in_votes": "votes_democrat - votes_republican",
+    "winning_margin_in_votes_abs": "abs(votes_democrat - votes_republican)",
+}
+
+_local = threading.local()
+_generation_lock = threading.Lock()
+_file_stamp = None
+_generation = 0
+
+
+def connection():
+    """This thread's read-only connection to the database, opened on first use."""
+    con = getattr(_local, "connection", None)
+    # A connection must not cross a fork (gunicorn workers forked from a master that queried)
+    if con is None or _local.pid != os.getpid():
+        uri = f"file:{urllib.request.pathname2url(os.path.abspath(DATABASE))}?mode=ro"
+        con = sqlite3.connect(uri, uri=True, cached_statements=256)
+        con.execute("pragma query_only = 1")
+        _local.connection, _local.pid = con, os.getpid()
+    return con
+
+
+def generation():
+    """
+    Number of the database state this process has seen, from 1. It grows whenever the database file
+    changes, the extra cache key of every result read from it.
+    """
+    global _file_stamp, _generation
+    stat = os.stat(DATABASE)
+    stamp = (stat.st_mtime_ns, stat.st_size)
+    if stamp != _file_stamp:
+        with _generation_lock:
+            if stamp != _file_stamp:
+                _file_stamp = stamp
+                _generation += 1
+    return _generation
+
+
+def query(sql, params=()):
+    """
+    Run a read-only query on this thread's connection.
+
+    Args:
+        sql: Statement with ? placeholders; keep it constant, so the compiled statement is reused
+        params: Tuple of values for the placeholders
+
+    Returns:
+        DataFrame of the rows
+    """
+    cursor = connection().execute(sql, params)
+    return pd.DataFrame.from_records(cursor.fetchall(), columns=[d[0] for d in cursor.description])
+
+
+def _expression(column):
+    # A column of the table, or a derived one, quoted for a query. Only ever called with names from columns().
+    return f'{DERIVED_COLUMNS[column]} as "{column}"' if column in DERIVED_COLUMNS else f'"{column}"'
+
+
+@cutils.single_flight_cache(maxsize=None, generation=generation)
+def columns():
+    """Columns of the by-year table, plus the derived ones."""
+    return tuple(row[1] for row in connection().execute(f"pragma table_info({TABLE})")) + tuple(DERIVED_COLUMNS)
+
+
+@cutils.single_flight_cache(maxsize=None, generation=generation)
+def available_years():
+    return tuple(int(year) for (year,) in connection().execute(f"select distinct year from {TABLE} order by year"))
+
+
+@cutils.single_flight_cache(maxsize=None, generation=generation)
+def states():
+    return tuple(
+        state for (state,) in
+        connection().execute(f"select distinct state_name from {TABLE} where state_name is not null order by state_name")
+    )
+
+
+@cutils.single_flight_cache(maxsize=None, generation=generation)
+def county_identifiers(identifier_columns):
+    """The identifier columns of every county, from its first row (like the in-memory data's drop_duplicates)."""
+    return query(
+        f"select {', '.join(_expression(c) for c in identifier_columns)} from {TABLE} "
+        f"where rowid in (select min(rowid) from {TABLE} where county_fips is not null group by county_fips) "
+        f"order by rowid"
+    )
+
+
+@cutils.single_flight_cache(maxsize=cfg.SQLITE_CACHE_SIZE, generation=generation)
+def county_rows(year, state_name=None):
+    """
+    Every column of one year's counties (optionally of one state), with the derived columns and bins the
+    pages use, like the in-memory by-year data has them.
+
+    Returns:
+        DataFrame shared by every caller: treat it as read-only, copy before modifying
+    """
+    select = f"select {', '.join(_expression(c) for c in columns())} from {TABLE} where year = ?"
+    if state_name is None:
+        df = query(f"{select} order by rowid", (int(year),))
+    else:
+        df = query(f"{select} and state_name = ? order by rowid", (int(year), state_name))
+    cbins.add_bin_codes(df)
+    for col in cbins.BIN_COLUMNS:
+        df[col] = cbins.labels_from_codes(col, df[f"{col}_code"], index=df.index)
+    return df
+
+
+def metric_by_county(metric, year):
+    """
+    One metric of one year: Series indexed by county_fips (a county's first row, if it has several).
+    Not cached here: county_results_data caches the columns it builds from it.
+    """
+    df = query(f"select county_fips, {_expression(metric)} from {TABLE} where year = ? order by rowid", (int(year),))
+    return df.drop_duplicates("county_fips").set_index("county_fips")[metric]
+
+
+@cutils.single_flight_cache(maxsize=cfg.SQLITE_CACHE_SIZE, generation=generation)
+def state_summary(state_name, year):
+    """
+    Vote totals of one state and year, like cutils.calculate_state_summary() ("All": the whole country).
+
+    Returns:
+        Dictionary, or None if there is no data
+    """
+    select = f"select count(*), sum(votes_democrat), sum(votes_republican), sum(votes_other) from {TABLE} where year = ?"
+    if state_name == "All":
+        rows, dem, rep, other = connection().execute(select, (int(year),)).fetchone()
+    else:
+        rows, dem, rep, other = connection().execute(f"{select} and state_name = ?", (int(year), state_name)).fetchone()
+    if not rows:
+        return None
+    name = "United States" if state_name == "All" else state_name
+    return cutils.summary_from_votes(name, int(year), dem or 0, rep or 0, other or 0)
+
+
+cmemory.register_cache("sql_county_rows", county_rows)
+cmemory.register_cache("sql_state_summaries", state_summary)
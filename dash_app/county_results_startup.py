@@ -0,0 +1,119 @@
+import logging
+import os
+import threading
+import time
+import county_results_config as cfg
+
+# Startup timeline, and what each page builds from the data before it can serve.
+# Pages hand their builders to prepare(): by default they run right away, at import (in the gunicorn master
+# with preload_app, so every worker shares the result). With cfg.LAZY_STARTUP they are left to the page's
+# first request, and a background warm-up thread (start_warm_up) runs them in the meantime, so a freshly
+# booted process answers its first request without waiting for the data.
+# mark() records when each step finished, in seconds since the process started; the timeline is logged on
+# the "county_results.startup" logger and served as JSON on /startup.
+
+logger = logging.getLogger("county_results.startup")
+
+_IMPORTED_AT = time.perf_counter()
+_lock = threading.Lock()
+_timeline = []
+# (name, builder) of every page, in the order the pages were imported
+_builders = []
+_warm_up_pid = None
+
+
+def _process_start_offset():
+    # Seconds between the process start and this module's import (Linux), so the timeline includes
+    # interpreter startup and the imports before this one. 0 elsewhere.
+    try:
+        with open("/proc/self/stat") as f:
+            # The command name is in parentheses and may contain spaces, so split after it.
+            start_ticks = int(f.read().rsplit(")", 1)[1].split()[19])
+        with open("/proc/uptime") as f:
+            uptime = float(f.read().split()[0])
+        age = uptime - start_ticks / os.sysconf("SC_CLK_TCK")
+        return max(age - (time.perf_counter() - _IMPORTED_AT), 0.0)
+    except (OSError, ValueError, IndexError):
+        return 0.0
+
+
+_START_OFFSET = _process_start_offset()
+
+
+def seconds_since_start():
+    return _START_OFFSET + time.perf_counter() - _IMPORTED_AT
+
+
+def mark(event):
+    """Add a step to the startup timeline."""
+    entry = {"event": event, "seconds": round(seconds_since_start(), 4), "pid": os.getpid()}
+    with _lock:
+        _timeline.append(entry)
+    logger.info(f"{entry['seconds']:8.3f}s  {event}")
+
+
+def timeline():
+    with _lock:
+        return list(_timeline)
+
+
+def prepare(name, builder):
+    """
+    Run a page's builder now, or (with cfg.LAZY_STARTUP) leave it to the warm-up thread and the page's
+    first request. The builder must be cached (e.g. cutils.single_flight_cache), so later calls are free.
+    """
+    _builders.append((name, builder))
+    if cfg.LAZY_STARTUP:
+        return
+    builder()
+    mark(f"built {name}")
+
+
+def builders():
+    """(name, builder) of every page, e.g. to build a new dataset version's page data before swapping it in."""
+    return list(_builders)
+
+
+def start_warm_up():
+    """Run the deferred builders in a daemon thread, once per process. Does nothing unless lazy."""
+    global _warm_up_pid
+    if not (cfg.LAZY_STARTUP and cfg.WARM_UP_IN_BACKGROUND):
+        return
+    with _lock:
+        # Once per process: a forked gunicorn worker doesn't inherit its parent's thread
+        if _warm_up_pid == os.getpid():
+            return
+        _warm_up_pid = os.getpid()
+
+    def warm_up():
+        for name, builder in _builders:
+            try:
+                builder()
+            except Exception:
+                # The page's first request will try again and report the error
+                logger.exception(f"warm-up of {name} failed")
+                continue
+            mark(f"warmed up {name}")
+        mark("warm-up done")
+
+    threading.Thread(target=warm_up, name="county-results-warm-up", daemon=True).start()
+
+
+def init_app(server):
+    """Mark the first request, and serve the timeline on /startup."""
+    from flask import jsonify
+
+    if not logger.handlers:
+        logger.addHandler(logging.StreamHandler())
+        logger.setLevel(logging.INFO)
+    first_request = threading.Event()
+
+    @server.before_request
+    def mark_first_request():
+        if not first_request.is_set():
+            first_request.set()
+            mark("first request")
+
+    @server.route("/startup")
+    def startup():
+        return jsonify({"lazy": cfg.LAZY_STARTUP, "timeline": timeline()})
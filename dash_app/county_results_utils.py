@@ -1,28 +1,291 @@
+import collections
+import functools
+import threading
 from dash import html
+import numpy as np
 import pandas as pd
 import county_results_config as cfg
+from county_results import bins as cbins
 
 def bin_counties_by_margin(votes_pct_two_party_democrat):
     # This returns a margin label tied to a color
-    margin_bin = pd.cut(
-        votes_pct_two_party_democrat, bins=cfg.MARGIN_BINS, labels=cfg.MARGIN_LABELS, include_lowest=True
-    )
-    return margin_bin
+    codes = cbins.bin_codes(votes_pct_two_party_democrat, cfg.MARGIN_BINS)
+    return cbins.labels_from_codes("margin_bin", codes, index=votes_pct_two_party_democrat.index)
 
 def bin_counties_by_margin_in_votes(winning_margin_in_votes):
     # This returns a margin label tied to a color
-    winning_margin_in_votes_bin = pd.cut(
-        winning_margin_in_votes, bins=cfg.WINNING_MARGIN_VOTES_BINS, labels=cfg.WINNING_MARGIN_VOTES_LABELS, include_lowest=True
-    )
-    return winning_margin_in_votes_bin
+    codes = cbins.bin_codes(winning_margin_in_votes, cfg.WINNING_MARGIN_VOTES_BINS)
+    return cbins.labels_from_codes("winning_margin_in_votes_bin", codes, index=winning_margin_in_votes.index)
 
 
 def bin_counties_by_swing(votes_pct_swing_from_prev_election):
     # This returns a margin label tied to a color
-    swing_bin = pd.cut(
-        votes_pct_swing_from_prev_election, bins=cfg.SWING_BINS, labels=cfg.SWING_LABELS, include_lowest=True
-    )
-    return swing_bin
+    codes = cbins.bin_codes(votes_pct_swing_from_prev_election, cfg.SWING_BINS)
+    return cbins.labels_from_codes("swing_bin", codes, index=votes_pct_swing_from_prev_election.index)
+
+# Fields shown in the hover-box of the map and heatmap, in the order HOVER_TEMPLATE refers to them.
+HOVER_FIELDS = [
+    "county_name", "state_abbr", "county_seat",
+    "votes_total", "votes_pct_democrat", "votes_pct_republican", "margin_text",
+    "population_pct_white", "population_pct_black", "population_pct_hispanic",
+    "median_household_income_2010", "poverty_pct_overall_2010", "bachelor_degree_pct_of_adults"
+]
+HOVER_TEMPLATE = (
+    "<b>County:</b> %{customdata[0]}, %{customdata[1]}<br>" +
+    "<b>County Seat:</b> %{customdata[2]}<br><br>" +
+    "<b>Total Votes:</b> %{customdata[3]:,}<br>" +
+    "<b>Vote % (Democrat):</b> %{customdata[4]:.1%}<br>" +
+    "<b>Vote % (Republican):</b> %{customdata[5]:.1%}<br>" +
+    "<b>Raw Vote Margin:</b> %{customdata[6]}<br><br>" +
+    "<b>% of Population (White):</b> %{customdata[7]:.1%}<br>" +
+    "<b>% of Population (Black):</b> %{customdata[8]:.1%}<br>" +
+    "<b>% of Population (Hispanic):</b> %{customdata[9]:.1%}<br><br>" +
+    "<b>Income (Median Household, 2010):</b> $%{customdata[10]:,}<br>" +
+    "<b>Poverty Rate (Overall, 2010):</b> %{customdata[11]:.1%}<br>" +
+    "<b>Bachelor's Degree (% of Adults):</b> %{customdata[12]:.1%}" +
+    "<extra></extra>"
+)
+
+
+def format_margin_text(margin_in_votes):
+    """
+    Format vote margins (Democrat minus Republican) as "D +1,234" / "R +1,234".
+
+    Uses vectorized string operations instead of formatting one row at a time.
+    Missing margins become an empty string.
+    """
+    votes = margin_in_votes.abs().round().astype("Int64").astype(str)
+    # Insert thousands separators
+    votes = votes.str.replace(r"\B(?=(\d{3})+(?!\d))", ",", regex=True)
+    prefix = pd.Series(np.where(margin_in_votes > 0, "D +", "R +"), index=margin_in_votes.index)
+    return (prefix + votes).where(margin_in_votes.notna(), "")
+
+
+def build_hover_customdata(ix, fips):
+    """
+    Build the hover customdata array for counties in any order.
+
+    Args:
+        ix: DataFrame indexed by county_fips, with every column in HOVER_FIELDS
+        fips: Sequence of county FIPS, in the order the trace draws them
+
+    Returns:
+        2-D array with one row per FIPS and one column per hover field, NaN for a FIPS ix doesn't have
+    """
+    # By position rather than reindex(), which refuses an index with duplicates
+    index = ix.index
+    if index.is_unique:
+        positions = index.get_indexer(fips)
+    else:
+        # A FIPS the rows have more than once (like a county listed twice in the raw data) shows its first row
+        first = np.flatnonzero(~index.duplicated())
+        positions = index[first].get_indexer(fips)
+        positions = np.where(positions >= 0, first[np.maximum(positions, 0)], -1)
+    values = ix[HOVER_FIELDS].to_numpy(dtype=object)
+    if not len(values):
+        return np.full((len(positions), len(HOVER_FIELDS)), np.nan, dtype=object)
+    customdata = values[np.maximum(positions, 0)]
+    customdata[positions < 0] = np.nan
+    return customdata
+
+
+def build_hover_customdata_by_trace(ix, fips_by_trace):
+    """
+    Build aligned hover customdata for several traces with a single lookup.
+
+    Args:
+        ix: DataFrame indexed by county_fips, with every column in HOVER_FIELDS
+        fips_by_trace: List with the FIPS sequence of each trace
+
+    Returns:
+        List of 2-D arrays, one per trace, aligned to that trace's FIPS order
+    """
+    sizes = [len(fips) for fips in fips_by_trace]
+    all_fips = [f for fips in fips_by_trace for f in fips]
+    customdata = build_hover_customdata(ix, all_fips)
+    return np.split(customdata, np.cumsum(sizes)[:-1]) if sizes else []
+
+
+def bin_points_2d(x, y, bins, x_range=None, y_range=None, weights=None):
+    """
+    Count points (optionally weighted) on a regular 2-D grid, fully vectorized.
+
+    Args:
+        x, y: Arrays of point coordinates, NaN values are ignored
+        bins: Number of cells along each axis
+        x_range, y_range: (min, max) of the grid; a missing bound falls back to the data
+        weights: Optional array of weights, e.g. total votes per county
+
+    Returns:
+        Dictionary with:
+            counts: (bins, bins) array of points per cell, indexed [x_cell, y_cell]
+            weighted: (bins, bins) array of summed weights per cell, or None without weights
+            x_edges, y_edges: cell edges along each axis
+            cell: flat cell index of every point, -1 for points off the grid
+    """
+    x = np.asarray(x, dtype=float)
+    y = np.asarray(y, dtype=float)
+    inside = np.isfinite(x) & np.isfinite(y)
+
+    def edges(values, value_range):
+        lo, hi = value_range if value_range is not None else (None, None)
+        if lo is None:
+            lo = values[inside].min() if inside.any() else 0.0
+        if hi is None:
+            hi = values[inside].max() if inside.any() else 1.0
+        if hi <= lo:
+            hi = lo + 1
+        return np.linspace(lo, hi, bins + 1)
+
+    def cells(values, value_edges):
+        # Values exactly on the upper edge belong to the last cell.
+        position = (np.where(inside, values, value_edges[0]) - value_edges[0]) / (value_edges[-1] - value_edges[0])
+        return np.clip((position * bins).astype(int), 0, bins - 1)
+
+    x_edges = edges(x, x_range)
+    y_edges = edges(y, y_range)
+    inside &= (x >= x_edges[0]) & (x <= x_edges[-1]) & (y >= y_edges[0]) & (y <= y_edges[-1])
+    x_cell = cells(x, x_edges)
+    y_cell = cells(y, y_edges)
+    cell = np.where(inside, x_cell * bins + y_cell, -1)
+
+    counts = np.bincount(cell[inside], minlength=bins * bins).reshape(bins, bins)
+    weighted = None
+    if weights is not None:
+        weights = np.asarray(weights, dtype=float)
+        weighted = np.bincount(cell[inside], weights=weights[inside], minlength=bins * bins).reshape(bins, bins)
+    return {"counts": counts, "weighted": weighted, "x_edges": x_edges, "y_edges": y_edges, "cell": cell}
+
+
+def overall_column_meta(column):
+    """
+    Label, min/max and group for a column of the wide (metric_YEAR) table.
+
+    Uses COLUMN_MAP_OVERALL when the column is listed there, otherwise derives it
+    from the metric's COLUMN_MAP_BY_YEAR entry, so any metric/year pair gets a readable label.
+    """
+    if column in cfg.COLUMN_MAP_OVERALL:
+        return cfg.COLUMN_MAP_OVERALL[column]
+    metric, _, year = column.rpartition("_")
+    if year.isdigit() and metric in cfg.COLUMN_MAP_BY_YEAR:
+        meta = cfg.COLUMN_MAP_BY_YEAR[metric]
+        return {**meta, "label": f"{meta['label']} ({year})"}
+    return cfg.COLUMN_MAP_BY_YEAR.get(column, {})
+
+
+# Same fields as functools.lru_cache's cache_info()
+CacheInfo = collections.namedtuple("CacheInfo", ["hits", "misses", "maxsize", "currsize"])
+
+
+def single_flight_cache(maxsize=32, generation=None):
+    """
+    Decorator like functools.lru_cache, except that concurrent calls with the same arguments
+    don't all compute the result: the first one does, and the others wait for it and share it.
+    Unlike lru_cache, the cached results can be listed (cache_values), so their memory can be accounted for.
+
+    Args:
+        maxsize: Number of results kept, or None for no limit
+        generation: Optional function returning the generation of the data the caller sees, an int that grows
+            with every dataset swapped in (county_results_data.generation). Results are then keyed by it too:
+            those of the two newest generations are kept (the one being served and the one being swapped in
+            or out), older ones are dropped and no longer cached.
+
+    Returns:
+        Decorator for a function with hashable positional arguments
+    """
+    def decorator(func):
+        cache = collections.OrderedDict()
+        guard = threading.Lock()
+        in_flight = {}
+        stats = {"hits": 0, "misses": 0}
+        newest = [None]
+
+        def store(key, result):
+            # Called with guard held
+            if generation is not None:
+                if newest[0] is None or key[0] > newest[0]:
+                    newest[0] = key[0]
+                    for old in [k for k in cache if k[0] < newest[0] - 1]:
+                        del cache[old]
+                elif key[0] < newest[0] - 1:
+                    return
+            cache[key] = result
+            if maxsize is not None and len(cache) > maxsize:
+                cache.popitem(last=False)
+
+        @functools.wraps(func)
+        def wrapper(*args):
+            key = args if generation is None else (generation(),) + args
+            with guard:
+                if key in cache:
+                    cache.move_to_end(key)
+                    stats["hits"] += 1
+                    return cache[key]
+                lock = in_flight.setdefault(key, threading.Lock())
+            try:
+                with lock:
+                    with guard:
+                        # Another caller may have computed it while this one waited for the lock
+                        found = key in cache
+                        if found:
+                            stats["hits"] += 1
+                            result = cache[key]
+                    if not found:
+                        result = func(*args)
+                        with guard:
+                            stats["misses"] += 1
+                            store(key, result)
+            finally:
+                with guard:
+                    # Later callers find the result in the cache and no longer need the lock; after an
+                    # exception (nothing cached), the next caller computes it again with a new lock
+                    if in_flight.get(key) is lock:
+                        del in_flight[key]
+            return result
+
+        def cache_info():
+            with guard:
+                return CacheInfo(stats["hits"], stats["misses"], maxsize, len(cache))
+
+        def cache_clear():
+            with guard:
+                cache.clear()
+                stats.update(hits=0, misses=0)
+
+        def cache_values():
+            with guard:
+                return list(cache.values())
+
+        def cache_in_flight():
+            # Number of calls being computed right now, one per distinct arguments
+            with guard:
+                return len(in_flight)
+
+        def carry_over(old, new, update=None):
+            """
+            Cache the results of generation `old` for generation `new` too, e.g. those a small change to the data
+            leaves valid. update(args, result) returns the result for `new`, or None to leave it to be recomputed.
+            """
+            with guard:
+                entries = [(key[1:], result) for key, result in cache.items() if key[0] == old]
+            for args, result in entries:
+                if update is not None:
+                    result = update(args, result)
+                    if result is None:
+                        continue
+                with guard:
+                    if (new,) + args not in cache:
+                        store((new,) + args, result)
+
+        wrapper.cache_info = cache_info
+        wrapper.cache_clear = cache_clear
+        wrapper.cache_values = cache_values
+        wrapper.cache_in_flight = cache_in_flight
+        if generation is not None:
+            wrapper.carry_over = carry_over
+        return wrapper
+    return decorator
+
 
 # Utils to create a results table for a given state at the bottom of a map.
 def calculate_state_summary(df, state_name, year):
@@ -45,9 +308,19 @@ def calculate_state_summary(df, state_name, year):
         return None
     
     # Sum up votes across all counties
-    total_dem = state_data["votes_democrat"].sum()
-    total_rep = state_data["votes_republican"].sum()
-    total_other = state_data["votes_other"].sum()
+    return summary_from_votes(
+        state_name, year,
+        state_data["votes_democrat"].sum(), state_data["votes_republican"].sum(), state_data["votes_other"].sum()
+    )
+
+
+def summary_from_votes(state_name, year, total_dem, total_rep, total_other):
+    """
+    The summary calculate_state_summary() returns, from the vote totals of a state and year.
+
+    Returns:
+        Dictionary with vote totals, percentages, winner, and margin
+    """
     total_votes = total_dem + total_rep + total_other
     
     # Calculate percentages
@@ -78,6 +351,86 @@ def calculate_state_summary(df, state_name, year):
     }
 
 
+SUMMARY_VOTE_COLUMNS = ["votes_democrat", "votes_republican", "votes_other"]
+
+
+def build_state_summaries(df):
+    """
+    Precompute state-level vote totals for every state and year, plus national rows.
+
+    Args:
+        df: DataFrame with county-level election data
+
+    Returns:
+        Dictionary keyed by (state_name, year), with the same values calculate_state_summary() returns.
+        National totals are keyed by ("All", year).
+    """
+    by_state = df.groupby(["state_name", "year"], observed=True)[SUMMARY_VOTE_COLUMNS].sum()
+    national = df.groupby("year")[SUMMARY_VOTE_COLUMNS].sum()
+    national.index = pd.MultiIndex.from_product([["All"], national.index], names=["state_name", "year"])
+    return _summaries_from_totals(pd.concat([by_state, national]))
+
+
+def update_state_summaries(summaries, old_rows, new_rows):
+    """
+    State summaries after some county rows changed, from the vote differences of those rows only.
+
+    Args:
+        summaries: Dictionary from build_state_summaries(), not modified
+        old_rows: The changed rows before the change (without rows that are new)
+        new_rows: The same rows after it, plus the new ones
+
+    Returns:
+        New dictionary like build_state_summaries() returns
+    """
+    columns = ["state_name", "year"] + SUMMARY_VOTE_COLUMNS
+    removed = old_rows[columns].astype({"state_name": object})
+    removed[SUMMARY_VOTE_COLUMNS] = -removed[SUMMARY_VOTE_COLUMNS]
+    changes = pd.concat([new_rows[columns].astype({"state_name": object}), removed], ignore_index=True)
+    by_state = changes.groupby(["state_name", "year"])[SUMMARY_VOTE_COLUMNS].sum()
+    national = changes.groupby("year")[SUMMARY_VOTE_COLUMNS].sum()
+    national.index = pd.MultiIndex.from_product([["All"], national.index], names=["state_name", "year"])
+    totals = pd.concat([by_state, national])
+
+    # Add the differences to the totals of the states (and years) they belong to
+    keys = [(state_name, int(year)) for state_name, year in totals.index]
+    for column in SUMMARY_VOTE_COLUMNS:
+        totals[column] += [summaries[key][column] if key in summaries else 0 for key in keys]
+    updated = dict(summaries)
+    updated.update(_summaries_from_totals(totals))
+    return updated
+
+
+def _summaries_from_totals(totals):
+    # Percentages, winner and margin of each (state_name, year) row of vote totals, as calculate_state_summary() has them
+    totals["votes_total"] = totals[SUMMARY_VOTE_COLUMNS].sum(axis=1)
+    has_votes = totals["votes_total"] > 0
+    for party in ["democrat", "republican", "other"]:
+        totals[f"pct_{party}"] = (totals[f"votes_{party}"] / totals["votes_total"] * 100).where(has_votes, 0)
+
+    # Determine winner
+    dem_won = totals["votes_democrat"] > totals["votes_republican"]
+    totals["winner"] = np.where(dem_won, "Democrat", "Republican")
+    totals["margin"] = (totals["pct_democrat"] - totals["pct_republican"]).where(dem_won, totals["pct_republican"] - totals["pct_democrat"])
+
+    summaries = {}
+    for (state_name, year), row in zip(totals.index, totals.to_dict("records")):
+        summaries[(state_name, int(year))] = {
+            "state": "United States" if state_name == "All" else state_name,
+            "year": int(year),
+            "votes_democrat": int(row["votes_democrat"]),
+            "votes_republican": int(row["votes_republican"]),
+            "votes_other": int(row["votes_other"]),
+            "votes_total": int(row["votes_total"]),
+            "pct_democrat": row["pct_democrat"],
+            "pct_republican": row["pct_republican"],
+            "pct_other": row["pct_other"],
+            "winner": row["winner"],
+            "margin": row["margin"]
+        }
+    return summaries
+
+
 def create_state_summary_table(summary_data):
     """
     Create an HTML table from state summary data.
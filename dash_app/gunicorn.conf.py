@@ -0,0 +1,32 @@
+# gunicorn settings for the production Dash server, see wsgi.py.
+import gc
+import multiprocessing
+import os
+
+bind = f"0.0.0.0:{os.environ.get('PORT', '8050')}"
+workers = int(os.environ.get("WEB_CONCURRENCY", multiprocessing.cpu_count() * 2 + 1))
+threads = int(os.environ.get("GUNICORN_THREADS", 1))
+timeout = int(os.environ.get("GUNICORN_TIMEOUT", 60))
+
+# Import the app (and load all data) once in the master, then fork.
+# Workers share the loaded pages copy-on-write instead of each parsing the CSVs.
+# With cfg.LAZY_STARTUP the master only imports the code, and each worker loads its own copy of the data
+# in the background after the fork (see post_worker_init), trading memory for a faster first response.
+# GUNICORN_PRELOAD_APP=0 turns it off, e.g. to measure what preloading saves (benchmarks/measure_workers.py).
+preload_app = os.environ.get("GUNICORN_PRELOAD_APP", "1") != "0"
+
+
+def when_ready(server):
+    # Move everything loaded so far out of the garbage collector's reach,
+    # so collections in the workers don't touch (and copy) the shared pages.
+    gc.collect()
+    gc.freeze()
+
+
+def post_worker_init(worker):
+    # Start building the page data in this worker (only with cfg.LAZY_STARTUP, see county_results_startup)
+    import county_results_startup
+    county_results_startup.start_warm_up()
+    # Watch for new dataset versions published by the pipeline (see county_results_data)
+    import county_results_data
+    county_results_data.start_watcher()
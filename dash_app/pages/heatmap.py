@@ -1,29 +1,19 @@
 import dash
 from dash import html, dcc, Input, Output
-import pandas as pd
 import numpy as np
-import plotly.graph_objects as go
-import squarify
 import county_results_utils as cutils
+import county_results_data as cdata
 import county_results_config as cfg  # bring in your custom color scale
+from county_results import bins as cbins
+import county_results_background as cbg
+import county_results_memory as cmemory
+import county_results_metrics as cmetrics
+from county_results import profiling as cprofiling
+import county_results_startup as cstartup
 
 dash.register_page(__name__, name="County Heatmap", path="/heatmap", order=3)
 
-# ---- Load data ----
-df = pd.read_csv(
-    "../data/final/county_election_data_by_year.csv",
-    dtype={"county_fips": str, "code": str}
-)
-df["margin_bin"] = cutils.bin_counties_by_margin(df["votes_pct_two_party_democrat"])
-df["swing_bin"] = cutils.bin_counties_by_swing(df["votes_pct_swing_from_prev_election"])
-df["winning_margin_in_votes_bin"] = cutils.bin_counties_by_margin_in_votes(
-    df["votes_democrat"] - df["votes_republican"]
-)
-df["winning_margin_in_votes_abs"] = abs(df["votes_democrat"] - df["votes_republican"])
-
-# Extract options for color dropdown
-available_years = sorted(df["year"].unique())
-available_states = ["All"] + sorted(df["state_name"].unique())
+# ---- Color options ----
 # Only give 3 options for coloring the heatmap.
 # Heatmap does not handle continuous spectrums as well for whatever reason.
 # Could probably debug, but for a v1 let's use these 3 which are the most important.
@@ -33,83 +23,194 @@ available_colors = [
     {"label": "Margin of Victory (in Votes)", "value": "winning_margin_in_votes_bin"}
 ]
 
+
+# ---- Treemap layouts ----
+# Rectangles only depend on the state, year and sizing column, never on the color dimension.
+# They are computed once (see page_data), so a callback only has to look them up and swap fill colors.
+TREEMAP_WIDTH, TREEMAP_HEIGHT = 100, 100
+TREEMAP_SIZE_DIMS = ["winning_margin_in_votes_abs"]
+EMPTY_TREEMAP_LAYOUT = (np.empty(0, dtype=np.int32), np.empty((0, 4), dtype=np.float32))
+
+
+def build_treemap_layouts(df, rows=None):
+    """
+    Precompute squarify layouts for every state and year.
+
+    Args:
+        df: By-year data
+        rows: Optional row positions: only the states and years of these rows are laid out, all of their rows
+            must be included
+
+    Returns:
+        Dictionary keyed by (state, year, size_dim). Each value is a tuple of
+        (row positions into df in drawing order as int32, rectangles as an (n, 4) float32 array of x, y, dx, dy).
+    """
+    import squarify
+    layouts = {}
+    subset = df if rows is None else df.iloc[rows]
+    for size_dim in TREEMAP_SIZE_DIMS:
+        sized = subset[subset[size_dim].notna()]
+        for (state, year), group in sized.groupby(["state_name", "year"], observed=True):
+            # Sort by margin_in_votes: largest Democrat wins first (most positive),
+            # down to largest Republican wins last (most negative)
+            # This makes them meet in the middle
+            group = group.sort_values("margin_in_votes", ascending=False)
+
+            # --- squarify expects sizes that sum to width*height ---
+            sizes = group[size_dim].astype(float).clip(lower=1e-9).to_list()
+            normed = squarify.normalize_sizes(sizes, TREEMAP_WIDTH, TREEMAP_HEIGHT)
+            rects = squarify.squarify(normed, 0, 0, TREEMAP_WIDTH, TREEMAP_HEIGHT)
+            rects = np.array([[r["x"], r["y"], r["dx"], r["dy"]] for r in rects], dtype=np.float32).reshape(-1, 4)
+
+            positions = df.index.get_indexer(group.index).astype(np.int32)
+            layouts[(state, int(year), size_dim)] = (positions, rects)
+    return layouts
+
+
+@cutils.single_flight_cache(maxsize=None, generation=cdata.generation)
+def page_data():
+    """
+    What the layout and callback need from the data, built once: at import, or on first use with cfg.LAZY_STARTUP.
+    With the sqlite backend, each treemap is laid out when it is first drawn instead (see treemap_layout).
+    """
+    return {
+        "states": list(cdata.load_states()),
+        "years": list(cdata.load_available_years()),
+        "treemap_layouts": build_treemap_layouts(cdata.load_county_data_by_year()) if cdata.BACKEND == "memory" else None,
+    }
+
+
+@cutils.single_flight_cache(maxsize=cfg.SQLITE_CACHE_SIZE, generation=cdata.generation)
+def _queried_treemap_layout(state, year, size_dim):
+    rows = cdata.county_rows(year, state)
+    positions, rects = build_treemap_layouts(rows).get((state, year, size_dim), EMPTY_TREEMAP_LAYOUT)
+    return rows.iloc[positions], rects
+
+
+def treemap_layout(state, year, size_dim):
+    """
+    The counties of one treemap in drawing order, and their rectangles.
+
+    Returns:
+        (DataFrame of the counties, which may be shared: copy before modifying, (n, 4) float32 array of x, y, dx, dy)
+    """
+    if cdata.BACKEND == "sqlite":
+        return _queried_treemap_layout(state, year, size_dim)
+    positions, rects = page_data()["treemap_layouts"].get((state, year, size_dim), EMPTY_TREEMAP_LAYOUT)
+    return cdata.load_county_data_by_year().iloc[positions], rects
+
+
+def update_page_data(args, data, changes):
+    """page_data after an update of some counties (see cdata.register_incremental): only their treemaps are laid out again."""
+    layouts = data["treemap_layouts"]
+    rows = [changes.positions] + [
+        layouts[key][0] for key in ((state, year, size_dim) for state, year in changes.keys for size_dim in TREEMAP_SIZE_DIMS)
+        if key in layouts
+    ]
+    layouts = {**layouts, **build_treemap_layouts(cdata.load_county_data_by_year(), np.unique(np.concatenate(rows)))}
+    return dict(data, treemap_layouts=layouts)
+
+
+cstartup.prepare("heatmap", page_data)
+cdata.register_incremental(page_data, update_page_data)
+cmemory.register_cache("heatmap_page_data", page_data)
+cmemory.register_cache("heatmap_queried_treemaps", _queried_treemap_layout)
+
 # ---- Defaults ----
 default_color = "winning_margin_in_votes_bin"
 default_size = "votes_total"
 
-layout = html.Div([
-    html.H3("County Heatmap (Categorical Discrete Colors)", style={"text-align": "center"}),
+def layout(**kwargs):
+    # A function, so the data is only needed once the page is visited (see page_data)
+    data = page_data()
+    return html.Div([
+        html.H3("County Heatmap (Categorical Discrete Colors)", style={"text-align": "center"}),
 
-    html.Div([
         html.Div([
-            html.Label("State"),
-            dcc.Dropdown(
-                id="state-dropdown",
-                options=([{"label": s, "value": s} for s in sorted(df["state_name"].unique())]),
-                value="Alabama",
-                clearable=False
-            )
-        ], style={"width": "30%", "display": "inline-block", "margin-left": "1%", "margin-right": "1%"}),
+            html.Div([
+                html.Label("State"),
+                dcc.Dropdown(
+                    id="state-dropdown",
+                    options=([{"label": s, "value": s} for s in data["states"]]),
+                    value="Alabama",
+                    clearable=False
+                )
+            ], style={"width": "30%", "display": "inline-block", "margin-left": "1%", "margin-right": "1%"}),
 
-        html.Div([
-            html.Label("Year"),
-            dcc.Dropdown(
-                id="year-dropdown",
-                options=[{"label": str(y), "value": y} for y in sorted(df["year"].unique())],
-                value=2024,
-                clearable=False
-            )
-        ], style={"width": "30%", "display": "inline-block", "margin-right": "1%"}),
+            html.Div([
+                html.Label("Year"),
+                dcc.Dropdown(
+                    id="year-dropdown",
+                    options=[{"label": str(y), "value": y} for y in data["years"]],
+                    value=2024,
+                    clearable=False
+                )
+            ], style={"width": "30%", "display": "inline-block", "margin-right": "1%"}),
 
-        html.Div([
-            html.Label("Color by"),
-            dcc.Dropdown(
-                id="color-dim",
-                options=[{"label": c["label"], "value": c["value"]} for c in available_colors],
-                value=default_color,
-                clearable=False
-            )
-        ], style={"width": "30%", "display": "inline-block", "margin-right": "1%"}),
-    ], style={"marginBottom": "20px"}),
-
-    dcc.Graph(id="heatmap-squarify"),
+            html.Div([
+                html.Label("Color by"),
+                dcc.Dropdown(
+                    id="color-dim",
+                    options=[{"label": c["label"], "value": c["value"]} for c in available_colors],
+                    value=default_color,
+                    clearable=False
+                )
+            ], style={"width": "30%", "display": "inline-block", "margin-right": "1%"}),
+        ], style={"marginBottom": "20px"}),
+
+        dcc.Graph(id="heatmap-squarify"),
     
-    # Summary table
-    html.Div(id="heatmap-summary-table", style={"margin-top": "30px"})
-])
+        # Summary table
+        html.Div(id="heatmap-summary-table", style={"margin-top": "30px"})
+    ])
+
+
+def rect_outline_paths(rects):
+    """
+    Turn treemap rectangles into one closed outline path each, for a single filled Scatter trace.
+
+    Args:
+        rects: Array of shape (n, 4) with x, y, dx, dy per rectangle
+
+    Returns:
+        x and y arrays, five corners per rectangle separated by NaN gaps
+    """
+    x0, y0, dx, dy = rects.T
+    x1, y1 = x0 + dx, y0 + dy
+    gap = np.full_like(x0, np.nan)
+    xs = np.column_stack([x0, x1, x1, x0, x0, gap]).ravel()
+    ys = np.column_stack([y0, y0, y1, y1, y0, gap]).ravel()
+    return xs, ys
 
 
 @dash.callback(
     Output("heatmap-squarify", "figure"),
     [Input("state-dropdown", "value"),
      Input("year-dropdown", "value"),
-     Input("color-dim", "value")]
+     Input("color-dim", "value")],
+    **cbg.HEAVY_CALLBACK_OPTIONS
 )
+@cmetrics.instrument
+@cprofiling.profile
 def update_heatmap(state, year, selected_color_by):
-    dff = df[df["year"] == year].copy()
-    if state != "ALL":
-        dff = dff[dff["state_name"] == state]
+    with cbg.render_slot():
+        return create_heatmap(state, year, selected_color_by)
 
-    # Calculate margin in votes (positive = Democrat won, negative = Republican won)
-    dff["margin_in_votes"] = dff["votes_democrat"] - dff["votes_republican"]
-    
+
+def create_heatmap(state, year, selected_color_by):
+    import plotly.graph_objects as go
     # Size by absolute margin in votes
     size_dim = "winning_margin_in_votes_abs"
-    
-    dff = dff.dropna(subset=[selected_color_by, size_dim])
-    
-    # Sort by margin_in_votes: largest Democrat wins first (most positive), 
-    # down to largest Republican wins last (most negative)
-    # This makes them meet in the middle
-    dff = dff.sort_values("margin_in_votes", ascending=False).head(200)
-
-    # --- squarify expects sizes that sum to width*height ---
-    W, H = 100, 100
-    sizes = dff[size_dim].astype(float).clip(lower=1e-9).to_list()
-    normed = squarify.normalize_sizes(sizes, W, H)
-    rects = squarify.squarify(normed, 0, 0, W, H)  # list of dicts with x,y,dx,dy
-
-    color_values = dff[selected_color_by].astype(str)
+
+    # Rectangles come from the precomputed layouts, already sorted Dem -> Rep.
+    dff, rects = treemap_layout(state, year, size_dim)
+    W, H = TREEMAP_WIDTH, TREEMAP_HEIGHT
+    dff = dff.copy()
+
+    # Hover data for every rectangle, built in one pass instead of per rectangle.
+    # The rows are already in drawing order, so no lookup by FIPS is needed.
+    dff["margin_text"] = cutils.format_margin_text(dff["margin_in_votes"])
+    customdata = dff[cutils.HOVER_FIELDS].to_numpy(dtype=object)
     
     # Based on the variable entered, create a color scheme
     if selected_color_by == "margin_bin":
@@ -128,75 +229,48 @@ def update_heatmap(state, year, selected_color_by):
     fig = go.Figure()
 
     # --- draw non-overlapping rectangles ---
-    for i, r in enumerate(rects):
-        name = dff["county_name"].iloc[i] if "county_name" in dff.columns else dff["county_fips"].iloc[i]
-        cat = color_values.iloc[i]
-        fill_color = discrete_map.get(cat, "#cccccc")
-
-        fig.add_shape(
-            type="rect",
-            xref="x", yref="y",
-            x0=r["x"], y0=r["y"],
-            x1=r["x"] + r["dx"], y1=r["y"] + r["dy"],
-            line=dict(width=1, color="white"),
-            fillcolor=fill_color,
-            layer="above"
-        )
-
-        # Generate the hover text for each rectangle.
-        county_name = dff["county_name"].iloc[i]
-        state_abbr = dff["state_abbr"].iloc[i]
-        county_seat = dff["county_seat"].iloc[i] if "county_seat" in dff.columns else "—"
-        votes_total = dff["votes_total"].iloc[i]
-        votes_pct_democrat = dff["votes_pct_democrat"].iloc[i]
-        votes_pct_republican = dff["votes_pct_republican"].iloc[i]
-        margin_in_votes = dff["margin_in_votes"].iloc[i]
-        population_pct_white = dff["population_pct_white"].iloc[i]
-        population_pct_black = dff["population_pct_black"].iloc[i]
-        population_pct_hispanic = dff["population_pct_hispanic"].iloc[i]
-        median_household_income_2010 = dff["median_household_income_2010"].iloc[i]
-        poverty_pct_overall_2010 = dff["poverty_pct_overall_2010"].iloc[i]
-        bachelor_degree_pct_of_adults = dff["bachelor_degree_pct_of_adults"].iloc[i]
-        
-        # Format the margin nicely
-        if margin_in_votes > 0:
-            margin_text = f"D +{margin_in_votes:,.0f}"
-        else:
-            margin_text = f"R +{abs(margin_in_votes):,.0f}"
-        
-        hover_text = (
-            f"<b>County:</b> {county_name}, {state_abbr}<br>"
-            f"<b>County Seat:</b> {county_seat}<br><br>"
-            f"<b>Total Votes:</b> {votes_total:,}<br>"
-            f"<b>Vote % (Democrat):</b> {votes_pct_democrat:.1%}<br>"
-            f"<b>Vote % (Republican):</b> {votes_pct_republican:.1%}<br>"
-            f"<b>Raw Vote Margin:</b> {margin_text}<br><br>"
-            f"<b>% of Population (White):</b> {population_pct_white:.1%}<br>"
-            f"<b>% of Population (Black):</b> {population_pct_black:.1%}<br>"
-            f"<b>% of Population (Hispanic):</b> {population_pct_hispanic:.1%}<br><br>"
-            f"<b>Income (Median Household, 2010):</b> ${median_household_income_2010:,.0f}<br>"
-            f"<b>Poverty Rate (Overall, 2010):</b> {poverty_pct_overall_2010:.1%}<br>"
-            f"<b>Bachelor's Degree (% of Adults):</b> {bachelor_degree_pct_of_adults:.1%}<extra></extra>"
-        )
+    # One filled-path trace per color bin, which also serves as that bin's legend entry.
+    # Bins are picked by their uint8 code (the position of the label in color_order).
+    codes = dff[f"{selected_color_by}_code"].to_numpy()
+    palette = cbins.PALETTES[selected_color_by]
+    for code, label in enumerate(color_order):
+        xs, ys = rect_outline_paths(rects[codes == code])
         fig.add_trace(go.Scatter(
-            x=[r["x"] + r["dx"]/2],
-            y=[r["y"] + r["dy"]/2],
-            mode="markers",
-            marker=dict(size=max(r["dx"], r["dy"]) * 3, opacity=0, color=fill_color),
-            hovertemplate=hover_text,
-            showlegend=False
+            x=xs, y=ys,
+            mode="lines",
+            fill="toself",
+            fillcolor=palette[code],
+            line=dict(width=1, color="white"),
+            hoverinfo="skip",
+            name=label,
+            showlegend=True
         ))
-
-    # --- manual legend for your discrete bins ---
-    for label in [lbl for lbl in color_order if lbl in discrete_map]:
+    # Counties without a value for this color (e.g. swing in the first year) are still drawn, in gray.
+    missing = codes == cbins.NO_BIN
+    if missing.any():
+        xs, ys = rect_outline_paths(rects[missing])
         fig.add_trace(go.Scatter(
-            x=[None], y=[None],
-            mode="markers",
-            marker=dict(size=10, color=discrete_map[label]),
-            name=label,
+            x=xs, y=ys,
+            mode="lines",
+            fill="toself",
+            fillcolor=cbins.MISSING_COLOR,
+            line=dict(width=1, color="white"),
+            hoverinfo="skip",
+            name="No data",
             showlegend=True
         ))
 
+    # --- one invisible marker per rectangle carries all of the hover data ---
+    fig.add_trace(go.Scatter(
+        x=rects[:, 0] + rects[:, 2] / 2,
+        y=rects[:, 1] + rects[:, 3] / 2,
+        mode="markers",
+        marker=dict(size=np.maximum(rects[:, 2], rects[:, 3]) * 3, opacity=0),
+        customdata=customdata,
+        hovertemplate=cutils.HOVER_TEMPLATE,
+        showlegend=False
+    ))
+
     # --- critical: fix the axis ranges to match the 0..100 layout ---
     fig.update_xaxes(range=[0, W], visible=False, fixedrange=True)
     fig.update_yaxes(range=[H, 0], visible=False, fixedrange=True)  # top-left origin
@@ -224,13 +298,14 @@ def update_heatmap(state, year, selected_color_by):
     Input("state-dropdown", "value"),
     Input("year-dropdown", "value")
 )
+@cmetrics.instrument
 def update_summary_table(state, year):
     """Display state-level summary table for the heatmap"""
     if state is None or year is None:
         return None
     
-    # Calculate summary using utility function
-    summary = cutils.calculate_state_summary(df, state, year)
+    # Look up the precomputed summary
+    summary = cdata.get_state_summary(state, year)
     if summary is None:
         return None
     
@@ -1,99 +1,244 @@
 import dash
-from dash import html, dcc, Input, Output, State, ctx
-from dash.exceptions import PreventUpdate
+from dash import html, dcc, Input, Output, State, ClientsideFunction
+import numpy as np
 import pandas as pd
-import plotly.express as px
+import plotly.colors as pcolors
 import county_results_config as cfg
 import county_results_utils as cutils
+import county_results_data as cdata
+import county_results_filters as cfilters
+from county_results import bins as cbins
+import county_results_background as cbg
+import county_results_memory as cmemory
+import county_results_metrics as cmetrics
+from county_results import profiling as cprofiling
+import county_results_startup as cstartup
 
 # Register page
 dash.register_page(__name__, name="County Map", path="/county-map", order=1)
 
-# ---- Load data once ----
-df = pd.read_csv(
-    "../data/final/county_election_data_by_year.csv",
-    dtype={"county_fips": str, "code": str}
-)
-df["margin_bin"] = cutils.bin_counties_by_margin(df["votes_pct_two_party_democrat"])
-df["swing_bin"] = cutils.bin_counties_by_swing(df["votes_pct_swing_from_prev_election"])
-df["winning_margin_in_votes_bin"] = cutils.bin_counties_by_margin_in_votes(
-    df["votes_democrat"] - df["votes_republican"]
-)
-
-# Extract options for dropdowns
-available_years = sorted(df["year"].unique())
-available_states = ["All"] + sorted(df["state_name"].unique())
+# Color options for dropdowns
 available_colors = [
     {"label": "Margin of Victory (%)", "value": "margin_bin"},
     {"label": "Swing from Prior Election (%)", "value": "swing_bin"},
     {"label": "Margin of Victory (in Votes)", "value": "winning_margin_in_votes_bin"}
 ] + cfg.COLUMN_COUNTY_MAP_BY_YEAR
 
+COUNTY_GEOJSON_URL = "https://raw.githubusercontent.com/plotly/datasets/master/geojson-counties-fips.json"
+
+
+# ---- Client-side rendering data ----
+# Discrete color-by options: legend order, colors, and legend title for each bin column.
+DISCRETE_COLOR_BINS = {
+    "margin_bin": (cfg.MARGIN_LABELS, cfg.MARGIN_RED_BLUE_COLOR_SCALE, "Margin of Victory (%)"),
+    "swing_bin": (cfg.SWING_LABELS, cfg.SWING_RED_BLUE_COLOR_SCALE, "Swing from Prior Election (%)"),
+    "winning_margin_in_votes_bin": (
+        cfg.WINNING_MARGIN_VOTES_LABELS, cfg.WINNING_MARGIN_VOTES_RED_BLUE_COLOR_SCALE, "Margin of Victory (in Votes)"
+    ),
+}
+# Fields that never change from year to year for a county, so they are only sent once.
+CLIENT_STATIC_FIELDS = ["county_name", "state_abbr", "county_seat", "state_name"]
+
+
+def _to_json_list(series, decimals=4):
+    # Round floats so the payload stays small, and turn NaN into null.
+    if pd.api.types.is_float_dtype(series):
+        series = series.round(decimals)
+    return series.astype(object).where(series.notna(), None).tolist()
+
+
+def _client_year_columns(dfy, county_index):
+    # Everything the hover-box or a continuous color option needs for one year, aligned to an index into the counties
+    value_columns = list(dict.fromkeys(
+        [f for f in cutils.HOVER_FIELDS if f not in CLIENT_STATIC_FIELDS and f != "margin_text"]
+        + ["margin_in_votes"]
+        + [c["value"] for c in cfg.COLUMN_COUNTY_MAP_BY_YEAR]
+    ))
+    columns = {"county": county_index[dfy["county_fips"]].tolist()}
+    for col in value_columns:
+        columns[col] = _to_json_list(dfy[col])
+    for col in DISCRETE_COLOR_BINS:
+        codes = dfy[f"{col}_code"]
+        columns[col] = codes.astype(object).where(codes != cbins.NO_BIN, None).tolist()
+    return columns
+
+
+def build_client_map_data(df):
+    """
+    Build everything the browser needs to draw the county map without calling back to the server.
+
+    Counties are listed once, and each year holds columns aligned to an index into that list.
+    Bin columns are sent as small integer codes into their label list instead of the label strings.
+    The geometry is referenced by URL, so the browser downloads and caches it once.
+    """
+    dfc = df.dropna(subset=["county_fips"]).copy()
+    dfc["county_fips"] = dfc["county_fips"].astype(str).str.zfill(5)
+
+    counties = dfc.drop_duplicates("county_fips").sort_values("county_fips")
+    county_index = pd.Series(range(len(counties)), index=counties["county_fips"])
+    years = {str(int(year)): _client_year_columns(dfy, county_index) for year, dfy in dfc.groupby("year")}
+
+    available_color_labels = {c["value"]: c["label"] for c in available_colors}
+    return {
+        "geojson": COUNTY_GEOJSON_URL,
+        "counties": {
+            "county_fips": counties["county_fips"].tolist(),
+            **{col: _to_json_list(counties[col]) for col in CLIENT_STATIC_FIELDS},
+        },
+        "years": years,
+        "bins": {
+            col: {"labels": labels, "colors": [colors[lbl] for lbl in labels], "title": title}
+            for col, (labels, colors, title) in DISCRETE_COLOR_BINS.items()
+        },
+        "continuous": {
+            c["value"]: {
+                "label": available_color_labels.get(c["value"], c["value"]),
+                "range": list(cfg.COLOR_RANGE_MAP_BY_YEAR.get(c["value"], cfg.COLOR_RANGE_MAP_BY_YEAR["default"])),
+            }
+            for c in cfg.COLUMN_COUNTY_MAP_BY_YEAR
+        },
+        "colorscale": pcolors.make_colorscale(pcolors.sequential.algae),
+        "hover_fields": cutils.HOVER_FIELDS,
+        "hover_template": cutils.HOVER_TEMPLATE,
+        "state_map_params": cfg.STATE_MAP_PARAMS,
+    }
+
+
+@cutils.single_flight_cache(maxsize=None, generation=cdata.generation)
+def page_data():
+    """
+    What the layout needs from the data, built once: at import, or on first use with cfg.LAZY_STARTUP.
+    """
+    # plotly.express takes a while to import, so it is only loaded with the data (see create_map).
+    import plotly.express  # noqa: F401
+    years = cdata.load_available_years()
+    client_map_data = None
+    # Only pay for building (and shipping) the client payload when it will be used.
+    if cfg.COUNTY_MAP_RENDER_MODE == "clientside":
+        if cdata.BACKEND == "sqlite":
+            client_map_data = build_client_map_data(pd.concat([cdata.county_rows(year) for year in years]))
+        else:
+            client_map_data = build_client_map_data(cdata.load_county_data_by_year())
+    return {
+        "available_years": list(years),
+        "available_states": ["All"] + list(cdata.load_states()),
+        "client_map_data": client_map_data,
+    }
+
+
+def update_page_data(args, data, changes):
+    """
+    page_data after an update of some counties (see cdata.register_incremental): only the years they changed
+    are rebuilt in the client-side payload. The list of counties stays the same.
+    """
+    if data["client_map_data"] is None:
+        return data
+    client = data["client_map_data"]
+    county_index = pd.Series(range(len(client["counties"]["county_fips"])), index=client["counties"]["county_fips"])
+    years = dict(client["years"])
+    for year in changes.years:
+        dfy = cdata.county_rows(year).dropna(subset=["county_fips"])
+        dfy = dfy.assign(county_fips=dfy["county_fips"].astype(str).str.zfill(5))
+        years[str(year)] = _client_year_columns(dfy, county_index)
+    return dict(data, client_map_data=dict(client, years=years))
+
+
+cstartup.prepare("county map", page_data)
+cdata.register_incremental(page_data, update_page_data)
+cmemory.register_cache("county_map_page_data", page_data)
+
 
 # ---- Layout ----
-layout = html.Div([
-    html.H3("U.S. Presidential Election Results by County", style={"text-align": "center"}),
-    
-    # Comparison mode toggle
-    html.Div([
-        html.Label("Comparison Mode:", style={"font-weight": "bold", "margin-right": "10px"}),
-        dcc.RadioItems(
-            id="comparison-mode-dual",
-            options=[
-                {"label": " Single Map", "value": "single"},
-                {"label": " Side-by-Side Comparison", "value": "dual"}
-            ],
-            value="single",
-            inline=True,
-            labelStyle={"margin-right": "30px"},  # Add spacing between options
-            style={"margin-bottom": "20px"}
-        )
-    ], style={"text-align": "center", "margin-bottom": "20px"}),
-    
-    # Shared state control (always visible)
-    html.Div([
-        html.Label("Select State:"),
-        dcc.Dropdown(
-            id="state-dropdown-dual",
-            options=[{"label": s, "value": s} for s in available_states],
-            value="All",
-            clearable=False,
-        )
-    ], style={"width": "45%", "margin": "0 auto 20px auto"}),
-    
-    # Controls container - will show different controls based on mode
-    html.Div(id="controls-container-dual"),
+# Both sets of controls and both maps are always in the layout; comparison mode only shows or hides
+# the right-hand ones. That lets a single callback draw both maps for every user action.
+PANEL_STYLE = {"vertical-align": "top", "padding": "15px", "background-color": "#f8f9fa", "border-radius": "5px"}
+MODE_STYLES = {
+    "single": {
+        "left-controls": {"display": "flex", "flexWrap": "wrap", "gap": "20px", "marginBottom": "20px", "justify-content": "center"},
+        "left-title": {"display": "none"},
+        "left-year": {"width": "45%", "display": "inline-block", "margin-right": "5%"},
+        "left-color": {"width": "45%", "display": "inline-block"},
+        "right-controls": {"display": "none"},
+        "left-map": {"width": "100%"},
+        "right-map": {"display": "none"},
+    },
+    "dual": {
+        "left-controls": {"width": "48%", "display": "inline-block", **PANEL_STYLE},
+        "left-title": {"text-align": "center", "color": "#2c3e50"},
+        "left-year": {"margin-bottom": "15px"},
+        "left-color": {},
+        "right-controls": {"width": "48%", "display": "inline-block", **PANEL_STYLE, "margin-left": "2%"},
+        "left-map": {"width": "49.5%", "display": "inline-block"},
+        "right-map": {"width": "49.5%", "display": "inline-block", "margin-left": "1%"},
+    },
+}
+# Dropdown values each mode starts from: (left year, left color, right year, right color)
+MODE_DEFAULTS = {
+    "single": (2024, "margin_bin", 2024, "margin_bin"),
+    "dual": (2000, "margin_bin", 2024, "margin_bin"),
+}
+
+def layout(**kwargs):
+    # A function, so the data is only needed once the page is visited (see page_data)
+    data = page_data()
+    return html.Div([
+        html.H3("U.S. Presidential Election Results by County", style={"text-align": "center"}),
     
-    # Maps container
-    html.Div(id="maps-container-dual"),
+        # Comparison mode toggle
+        html.Div([
+            html.Label("Comparison Mode:", style={"font-weight": "bold", "margin-right": "10px"}),
+            dcc.RadioItems(
+                id="comparison-mode-dual",
+                options=[
+                    {"label": " Single Map", "value": "single"},
+                    {"label": " Side-by-Side Comparison", "value": "dual"}
+                ],
+                value="single",
+                inline=True,
+                labelStyle={"margin-right": "30px"},  # Add spacing between options
+                style={"margin-bottom": "20px"}
+            )
+        ], style={"text-align": "center", "margin-bottom": "20px"}),
     
-    # Summary table (only shows when a state is selected)
-    html.Div(id="summary-table-container-dual", style={"margin-top": "30px"})
-])
+        # Shared state control (always visible)
+        html.Div([
+            html.Label("Select State:"),
+            dcc.Dropdown(
+                id="state-dropdown-dual",
+                options=[{"label": s, "value": s} for s in data["available_states"]],
+                value="All",
+                clearable=False,
+            )
+        ], style={"width": "45%", "margin": "0 auto 20px auto"}),
 
-
-# ---- Callback to update controls based on mode ----
-@dash.callback(
-    Output("controls-container-dual", "children"),
-    Input("comparison-mode-dual", "value")
-)
-def update_controls(mode):
-    if mode == "single":
-        # Single map controls
-        return html.Div([
-            html.Div([
-                # Year dropdown
-                html.Div([
+        # Shared filter expression (see county_results_filters.py); metrics without a year use each map's year
+        html.Div([
+            html.Label("Filter Counties:"),
+            dcc.Input(
+                id="county-filter-dual",
+                type="text",
+                debounce=True,
+                placeholder="e.g. population_pct_hispanic > 0.3 and votes_total > 50000 and region = Southwest",
+                style={"width": "100%"}
+            ),
+            html.Div(id="county-filter-message-dual", style={"color": "#6c757d", "margin-top": "5px"})
+        ], style={"width": "45%", "margin": "0 auto 20px auto"}),
+    
+        # Controls - the right map's controls are hidden in single mode
+        html.Div([
+            # Left (or only) map controls
+            html.Div(id="left-controls-dual", style=MODE_STYLES["single"]["left-controls"], children=[
+                html.H5("Left Map", id="left-controls-title-dual", style=MODE_STYLES["single"]["left-title"]),
+                html.Div(id="left-year-control-dual", style=MODE_STYLES["single"]["left-year"], children=[
                     html.Label("Select Year:"),
                     dcc.Dropdown(
                         id="year-dropdown-dual",
-                        options=[{"label": str(y), "value": y} for y in available_years],
+                        options=[{"label": str(y), "value": y} for y in data["available_years"]],
                         value=2024,
                         clearable=False
                     )
-                ], style={"width": "45%", "display": "inline-block", "margin-right": "5%"}),
-                # Color dropdown
-                html.Div([
+                ]),
+                html.Div(id="left-color-control-dual", style=MODE_STYLES["single"]["left-color"], children=[
                     html.Label("Color By:"),
                     dcc.Dropdown(
                         id="color-by-dropdown-dual",
@@ -101,208 +246,212 @@ def update_controls(mode):
                         value="margin_bin",
                         clearable=False
                     )
-                ], style={"width": "45%", "display": "inline-block"}),
-            ], style={"display": "flex", "flexWrap": "wrap", "gap": "20px", "marginBottom": "20px", "justify-content": "center"}),
-        ])
-    else:
-        # Dual map controls - two sets of controls side by side
-        return html.Div([
-            # Two columns of controls
-            html.Div([
-                # Left map controls
+                ]),
+            ]),
+
+            # Right map controls
+            html.Div(id="right-controls-dual", style=MODE_STYLES["single"]["right-controls"], children=[
+                html.H5("Right Map", style={"text-align": "center", "color": "#2c3e50"}),
                 html.Div([
-                    html.H5("Left Map", style={"text-align": "center", "color": "#2c3e50"}),
-                    html.Div([
-                        html.Label("Year:"),
-                        dcc.Dropdown(
-                            id="year-dropdown-dual",
-                            options=[{"label": str(y), "value": y} for y in available_years],
-                            value=2000,
-                            clearable=False
-                        )
-                    ], style={"margin-bottom": "15px"}),
-                    html.Div([
-                        html.Label("Color By:"),
-                        dcc.Dropdown(
-                            id="color-by-dropdown-dual",
-                            options=[{"label": c["label"], "value": c["value"]} for c in available_colors],
-                            value="margin_bin",
-                            clearable=False
-                        )
-                    ]),
-                ], style={"width": "48%", "display": "inline-block", "vertical-align": "top", "padding": "15px", "background-color": "#f8f9fa", "border-radius": "5px"}),
-                
-                # Right map controls
+                    html.Label("Year:"),
+                    dcc.Dropdown(
+                        id="year-dropdown-2-dual",
+                        options=[{"label": str(y), "value": y} for y in data["available_years"]],
+                        value=2024,
+                        clearable=False
+                    )
+                ], style={"margin-bottom": "15px"}),
                 html.Div([
-                    html.H5("Right Map", style={"text-align": "center", "color": "#2c3e50"}),
-                    html.Div([
-                        html.Label("Year:"),
-                        dcc.Dropdown(
-                            id="year-dropdown-2-dual",
-                            options=[{"label": str(y), "value": y} for y in available_years],
-                            value=2024,
-                            clearable=False
-                        )
-                    ], style={"margin-bottom": "15px"}),
-                    html.Div([
-                        html.Label("Color By:"),
-                        dcc.Dropdown(
-                            id="color-by-dropdown-2-dual",
-                            options=[{"label": c["label"], "value": c["value"]} for c in available_colors],
-                            value="margin_bin",
-                            clearable=False
-                        )
-                    ]),
-                ], style={"width": "48%", "display": "inline-block", "vertical-align": "top", "padding": "15px", "background-color": "#f8f9fa", "border-radius": "5px", "margin-left": "2%"}),
-            ], style={"margin-bottom": "20px"}),
-        ])
-
-
-# ---- Callback to update maps container ----
-@dash.callback(
-    Output("maps-container-dual", "children"),
-    Input("comparison-mode-dual", "value")
-)
-def update_maps_container(mode):
-    if mode == "single":
-        return dcc.Graph(id="county-map-dual", style={"height": "85vh"})
-    else:
-        return html.Div([
+                    html.Label("Color By:"),
+                    dcc.Dropdown(
+                        id="color-by-dropdown-2-dual",
+                        options=[{"label": c["label"], "value": c["value"]} for c in available_colors],
+                        value="margin_bin",
+                        clearable=False
+                    )
+                ]),
+            ]),
+        ], style={"margin-bottom": "20px"}),
+    
+        # Maps - the right map is hidden in single mode
+        html.Div([
             html.Div([
                 dcc.Graph(id="county-map-dual", style={"height": "85vh"})
-            ], style={"width": "49.5%", "display": "inline-block"}),
+            ], id="left-map-container-dual", style=MODE_STYLES["single"]["left-map"]),
             html.Div([
                 dcc.Graph(id="county-map-2-dual", style={"height": "85vh"})
-            ], style={"width": "49.5%", "display": "inline-block", "margin-left": "1%"}),
-        ])
+            ], id="right-map-container-dual", style=MODE_STYLES["single"]["right-map"]),
+        ]),
+    
+        # Summary table (only shows when a state is selected)
+        html.Div(id="summary-table-container-dual", style={"margin-top": "30px"}),
 
+        # Per-county data for client-side rendering (empty when the server draws the maps)
+        dcc.Store(id="county-map-store-dual", data=data["client_map_data"]),
+        # Counties each year's map draws under the filter, for client-side rendering (None: every county)
+        dcc.Store(id="county-map-filter-dual"),
 
-# ---- Helper function to create a map ----
-def create_map(selected_year, selected_state, selected_color_by):
-    dff = df[df["year"] == selected_year].copy()
-    
-    # Calculate margin in votes for hover display
-    dff["margin_in_votes"] = dff["votes_democrat"] - dff["votes_republican"]
-    
-    # Pre-format margin text for display
-    dff["margin_text"] = dff["margin_in_votes"].apply(
-        lambda x: f"D +{x:,.0f}" if x > 0 else f"R +{abs(x):,.0f}"
+        # Year, state, color and filter each map currently shows, so unchanged maps are skipped
+        # and a state-only change can be sent as a Patch
+        dcc.Store(id="county-map-views-dual")
+    ])
+
+
+# ---- Callback to switch comparison mode ----
+# Only styles and starting values change; the map callback below redraws whatever is affected.
+@dash.callback(
+    Output("left-controls-dual", "style"),
+    Output("left-controls-title-dual", "style"),
+    Output("left-year-control-dual", "style"),
+    Output("left-color-control-dual", "style"),
+    Output("right-controls-dual", "style"),
+    Output("left-map-container-dual", "style"),
+    Output("right-map-container-dual", "style"),
+    Output("year-dropdown-dual", "value"),
+    Output("color-by-dropdown-dual", "value"),
+    Output("year-dropdown-2-dual", "value"),
+    Output("color-by-dropdown-2-dual", "value"),
+    Input("comparison-mode-dual", "value")
+)
+@cmetrics.instrument
+def update_mode(mode):
+    styles = MODE_STYLES.get(mode, MODE_STYLES["single"])
+    return (
+        styles["left-controls"], styles["left-title"], styles["left-year"], styles["left-color"],
+        styles["right-controls"], styles["left-map"], styles["right-map"],
+        *MODE_DEFAULTS.get(mode, MODE_DEFAULTS["single"])
     )
-    
+
+
+# ---- Helper functions to create or move a map ----
+def map_view(selected_year, selected_state):
+    """
+    Title and geo settings that zoom a map to a state, or to the whole U.S. for "All".
+
+    Returns:
+        (title text, dict of layout.geo settings)
+    """
+    if selected_state != "All":
+        # This config will center the map based on which state is selected.
+        center_map_params = cfg.STATE_MAP_PARAMS.get(selected_state, cfg.STATE_MAP_PARAMS["All"])
+        # A few western states are set to Mercator so they don't slant way offline.
+        projection_type = center_map_params.get("projection_type", "albers usa")
+        return f"{selected_year} Election – {selected_state}", dict(
+            # only apply scope if projection is albers usa
+            scope="usa" if projection_type == "albers usa" else None,
+            center=center_map_params["center"],
+            projection=dict(type=projection_type, scale=center_map_params["projection_scale"]),
+            visible=False
+        )
+    # When looking at the full U.S., this zooms out slightly by default so that lower regions aren't cut off.
+    center_map_params = cfg.STATE_MAP_PARAMS["All"]
+    return f"{selected_year} U.S. Presidential Election by County", dict(
+        scope=center_map_params["scope"],
+        center=center_map_params["center"],
+        projection=dict(type="albers usa", scale=center_map_params["projection_scale"]),
+        visible=False
+    )
+
+
+def zoom_map(selected_year, selected_state):
+    """Patch that only moves an already drawn map to another state, leaving its traces untouched."""
+    title, geo = map_view(selected_year, selected_state)
+    patch = dash.Patch()
+    patch["layout"]["title"]["text"] = title
+    for key, value in geo.items():
+        patch["layout"]["geo"][key] = value
+    return patch
+
+
+def discrete_map_figure(dff, bin_column, legend_title, scope):
+    """
+    Choropleth of a bin column, with one trace (and legend entry) per bin in label order.
+    Counties are grouped by their uint8 bin code and each trace's fill is gathered from the bin's palette,
+    like the heatmap does, instead of grouping the label strings and mapping them to colors.
+    Counties without a bin (e.g. swing in the first year) are drawn gray, under "No data".
+    """
+    import plotly.graph_objects as go
+    labels = cbins.BIN_COLUMNS[bin_column][1]
+    codes = dff[f"{bin_column}_code"].to_numpy()
+    fips = dff["county_fips"].to_numpy()
+    present = np.unique(codes)
+    traces = []
+    for code, color in zip(present, cbins.colors_from_codes(bin_column, present)):
+        locations = fips[codes == code]
+        traces.append(go.Choropleth(
+            geojson=COUNTY_GEOJSON_URL,
+            locations=locations,
+            z=np.ones(len(locations)),
+            colorscale=[[0.0, color], [1.0, color]],
+            showscale=False,
+            showlegend=True,
+            name="No data" if code == cbins.NO_BIN else labels[code],
+        ))
+    fig = go.Figure(traces)
+    fig.update_layout(
+        geo={"domain": {"x": [0.0, 1.0], "y": [0.0, 1.0]}, "scope": scope},
+        legend={"title": {"text": legend_title}, "tracegroupgap": 0},
+    )
+    return fig
+
+
+def create_map(selected_year, selected_state, selected_color_by, county_filter=None):
+    import plotly.express as px
     # Filter for state if selected
     if selected_state != "All":
-        dff = dff[dff["state_name"] == selected_state]
+        dff = cdata.county_rows(selected_year, selected_state)
         scope = None
     else:
+        dff = cdata.county_rows(selected_year)
         scope = "usa"
+    # Counties outside the filter expression aren't drawn. Its mask is cached, so this is one indexing step.
+    try:
+        keep = cfilters.row_mask(county_filter, dff["county_fips"], selected_year)
+    except cfilters.FilterError:
+        keep = None
+    dff = dff.copy() if keep is None else dff[keep]
+
+    # Pre-format margin text for display
+    dff["margin_text"] = cutils.format_margin_text(dff["margin_in_votes"])
 
     # Index dff properly so that hover overlay will work, later.
     dff = dff.dropna(subset=["county_fips"]).copy()
     dff["county_fips"] = dff["county_fips"].astype(str).str.zfill(5)
     ix = dff.set_index("county_fips")
 
-    # Custom Color By Fields (which use a different palette than the default greenscale)
-    if selected_color_by == "margin_bin":
-        color_discrete_map=cfg.MARGIN_RED_BLUE_COLOR_SCALE
-        category_orders={"margin_bin": cfg.MARGIN_LABELS}  # keep order consistent in legend        
-        color_continuous_scale = None
-        color_range = None
-        available_color_label_text = "Margin of Victory (%)"
-    elif selected_color_by == "swing_bin":
-        color_discrete_map=cfg.SWING_RED_BLUE_COLOR_SCALE
-        category_orders={"swing_bin": cfg.SWING_LABELS}  # keep order consistent in legend
-        color_continuous_scale = None
-        color_range = None
-        available_color_label_text = "Swing from Prior Election (%)"
-    elif selected_color_by == "winning_margin_in_votes_bin":
-        color_discrete_map=cfg.WINNING_MARGIN_VOTES_RED_BLUE_COLOR_SCALE
-        category_orders={"winning_margin_in_votes_bin": cfg.WINNING_MARGIN_VOTES_LABELS}  # keep order consistent in legend
-        color_continuous_scale = None
-        color_range = None
-        available_color_label_text = "Margin of Victory (in Votes)"
+    # Bin columns are drawn from their uint8 codes and palettes (see discrete_map_figure),
+    # the other columns with a continuous greenscale
+    available_color_labels = {c["value"]: c["label"] for c in available_colors}
+    available_color_label_text = available_color_labels.get(selected_color_by, selected_color_by)
+    if selected_color_by in cbins.BIN_COLUMNS:
+        fig = discrete_map_figure(dff, selected_color_by, available_color_label_text, scope)
     else:
-        color_discrete_map = None
-        category_orders = None
-        color_continuous_scale="algae"
-        color_range = cfg.COLOR_RANGE_MAP_BY_YEAR.get(selected_color_by, cfg.COLOR_RANGE_MAP_BY_YEAR["default"])
-        available_color_labels = {c["value"]: c["label"] for c in available_colors}
-        available_color_label_text = available_color_labels.get(selected_color_by, selected_color_by)
-    labels={selected_color_by: available_color_label_text}
-
-    fig = px.choropleth(
-        dff,
-        geojson="https://raw.githubusercontent.com/plotly/datasets/master/geojson-counties-fips.json",
-        locations="county_fips",
-        color=selected_color_by,
-        color_discrete_map=color_discrete_map,
-        category_orders=category_orders,
-        color_continuous_scale=color_continuous_scale,
-        range_color=color_range,
-        scope=scope,
-        labels=labels
-    )
+        fig = px.choropleth(
+            dff,
+            geojson=COUNTY_GEOJSON_URL,
+            locations="county_fips",
+            color=selected_color_by,
+            color_continuous_scale="algae",
+            range_color=cfg.COLOR_RANGE_MAP_BY_YEAR.get(selected_color_by, cfg.COLOR_RANGE_MAP_BY_YEAR["default"]),
+            scope=scope,
+            labels={selected_color_by: available_color_label_text}
+        )
 
     
-    # Build the hover-box properly
-    hover_fields = [
-        "county_name", "state_abbr", "county_seat",
-        "votes_total", "votes_pct_democrat", "votes_pct_republican", "margin_text",
-        "population_pct_white", "population_pct_black", "population_pct_hispanic",
-        "median_household_income_2010", "poverty_pct_overall_2010", "bachelor_degree_pct_of_adults"
-    ]
-    customdata = dff[hover_fields]
-    hover_template = (
-        "<b>County:</b> %{customdata[0]}, %{customdata[1]}<br>" +
-        "<b>County Seat:</b> %{customdata[2]}<br><br>" +
-        "<b>Total Votes:</b> %{customdata[3]:,}<br>" +
-        "<b>Vote % (Democrat):</b> %{customdata[4]:.1%}<br>" +
-        "<b>Vote % (Republican):</b> %{customdata[5]:.1%}<br>" +
-        "<b>Raw Vote Margin:</b> %{customdata[6]}<br><br>" +
-        "<b>% of Population (White):</b> %{customdata[7]:.1%}<br>" +
-        "<b>% of Population (Black):</b> %{customdata[8]:.1%}<br>" +
-        "<b>% of Population (Hispanic):</b> %{customdata[9]:.1%}<br><br>" +
-        "<b>Income (Median Household, 2010):</b> $%{customdata[10]:,}<br>" +
-        "<b>Poverty Rate (Overall, 2010):</b> %{customdata[11]:.1%}<br>" +
-        "<b>Bachelor's Degree (% of Adults):</b> %{customdata[12]:.1%}" +
-        "<extra></extra>"
-    )
     # Each group by the map color is one "trace".
     # For each trace we must separately create hovers by FIPS, or else they will be completely misaligned.
     # i.e. every county X will show data for some other county Y
-    for tr in fig.data:
-        # FIPS for just this trace, in the same order as the trace
-        locs = list(tr.locations)
-        aligned = ix.loc[locs, hover_fields]
-        tr.customdata = aligned.to_numpy()
+    # All traces are aligned with one lookup, then split back apart.
+    customdata_by_trace = cutils.build_hover_customdata_by_trace(ix, [tr.locations for tr in fig.data])
+    for tr, customdata in zip(fig.data, customdata_by_trace):
+        tr.customdata = customdata
         # This will actually apply template per trace
-        tr.hovertemplate = hover_template
+        tr.hovertemplate = cutils.HOVER_TEMPLATE
 
 
     # If zooming to a specific state, tighten the view
-    if selected_state != "All":
-        fig.update_layout(title_text=f"{selected_year} Election – {selected_state}")
-        # This config will center the map based on which state is selected.
-        center_map_params = cfg.STATE_MAP_PARAMS.get(selected_state, cfg.STATE_MAP_PARAMS["All"])
-        fig.update_geos(
-            # only apply scope if projection is albers usa
-            # A few western states are set to Mercator so they don't slant way offline.
-            scope="usa" if center_map_params.get("projection_type", "albers usa") == "albers usa" else None,
-            center=center_map_params["center"],
-            projection_scale=center_map_params["projection_scale"],
-            projection_type=center_map_params.get("projection_type", "albers usa"),
-            visible=False
-        )
-    else:
-        fig.update_layout(title_text=f"{selected_year} U.S. Presidential Election by County",
-                          geo=dict(scope="usa"))
-        # When looking at the full U.S., this zooms out slightly by default so that lower regions aren't cut off.
-        center_map_params = cfg.STATE_MAP_PARAMS["All"]
-        fig.update_geos(
-            scope=center_map_params["scope"],
-            center=center_map_params["center"],
-            projection_scale=center_map_params["projection_scale"],
-            visible=False
-        )
+    title, geo = map_view(selected_year, selected_state)
+    fig.update_layout(title_text=title, geo=geo)
     fig.update_layout(
         title_x=0.5,
         margin={"r":0,"t":40,"l":0,"b":0}
@@ -311,54 +460,135 @@ def create_map(selected_year, selected_state, selected_color_by):
     return fig
 
 
-# ---- Single callback for left map that works in both modes ----
-@dash.callback(
-    Output("county-map-dual", "figure"),
-    Input("year-dropdown-dual", "value"),
-    Input("state-dropdown-dual", "value"),
-    Input("color-by-dropdown-dual", "value")
-)
-def update_map_left(selected_year, selected_state, selected_color_by):
-    return create_map(selected_year, selected_state, selected_color_by)
+@cutils.single_flight_cache(maxsize=cfg.COUNTY_MAP_FIGURE_CACHE_SIZE, generation=cdata.generation)
+def shared_map(selected_year, selected_state, selected_color_by, county_filter=""):
+    """
+    create_map, computed once per (year, state, color, filter) and shared by both panes and by concurrent requests.
+    The cached figure is only ever serialized, never modified.
+    """
+    with cbg.render_slot():
+        return create_map(selected_year, selected_state, selected_color_by, county_filter)
 
 
-# ---- Callback for right map (only active in dual mode) ----
-# Using State instead of Input for the comparison mode check
-@dash.callback(
-    Output("county-map-2-dual", "figure"),
-    Input("comparison-mode-dual", "value"),
-    State("year-dropdown-2-dual", "value"),
-    State("state-dropdown-dual", "value"),
-    State("color-by-dropdown-2-dual", "value"),
-    prevent_initial_call=False
+# Only the figures of years with changed counties are drawn again after an update
+# (and filtered ones, whose filter may read any year)
+cdata.register_incremental(
+    shared_map, lambda args, fig, changes: None if int(args[0]) in changes.years or args[3] else fig
 )
-def update_map_right(mode, selected_year, selected_state, selected_color_by):
-    # Only render if we're in dual mode and have valid inputs
-    if mode == "dual" and selected_year is not None and selected_color_by is not None:
-        return create_map(selected_year, selected_state, selected_color_by)
-    # Return empty figure if in single mode
-    return {}
+cmemory.register_cache("county_map_figures", shared_map)
 
 
-# ---- Additional callback to update right map when its dropdowns OR state changes ----
+if cfg.COUNTY_MAP_RENDER_MODE == "clientside":
+    # ---- Both maps are drawn in the browser, see assets/county_map_clientside.js ----
+    dash.clientside_callback(
+        ClientsideFunction(namespace="county_map", function_name="render"),
+        Output("county-map-dual", "figure"),
+        Input("county-map-store-dual", "data"),
+        Input("year-dropdown-dual", "value"),
+        Input("state-dropdown-dual", "value"),
+        Input("color-by-dropdown-dual", "value"),
+        Input("county-map-filter-dual", "data")
+    )
+
+    # The right map is only drawn while it is visible, in dual mode.
+    dash.clientside_callback(
+        ClientsideFunction(namespace="county_map", function_name="render_if_dual"),
+        Output("county-map-2-dual", "figure"),
+        Input("county-map-store-dual", "data"),
+        Input("year-dropdown-2-dual", "value"),
+        Input("state-dropdown-dual", "value"),
+        Input("color-by-dropdown-2-dual", "value"),
+        Input("comparison-mode-dual", "value"),
+        Input("county-map-filter-dual", "data")
+    )
+
+    @dash.callback(
+        Output("county-map-filter-dual", "data"),
+        Input("county-filter-dual", "value"),
+        Input("year-dropdown-dual", "value"),
+        Input("year-dropdown-2-dual", "value")
+    )
+    @cmetrics.instrument
+    def update_client_filter(county_filter, year_left, year_right):
+        """Positions in the client payload's county list of the counties each year's map draws, or None for all."""
+        client_fips = pd.Index(page_data()["client_map_data"]["counties"]["county_fips"])
+        identifiers = cdata.load_county_identifiers()["county_fips"].astype(str).str.zfill(5)
+        allowed = {}
+        for year in {year_left, year_right} - {None}:
+            try:
+                mask = cfilters.county_mask(county_filter, year)
+            except cfilters.FilterError:
+                mask = None
+            if mask is None:
+                return None
+            positions = client_fips.get_indexer(identifiers[mask])
+            allowed[str(year)] = sorted(positions[positions >= 0].tolist())
+        return allowed
+else:
+    # ---- One callback draws both maps ----
+    # Each pane is only redrawn when its own year/state/color/filter changed, a state change on the map of every
+    # county is a Patch, and identical (year, state, color, filter) renders are shared through shared_map.
+    # With background callbacks on, this runs in a job process, where shared_map only lives as long as the job.
+    @dash.callback(
+        Output("county-map-dual", "figure"),
+        Output("county-map-2-dual", "figure"),
+        Output("county-map-views-dual", "data"),
+        Input("comparison-mode-dual", "value"),
+        Input("year-dropdown-dual", "value"),
+        Input("year-dropdown-2-dual", "value"),
+        Input("state-dropdown-dual", "value"),
+        Input("color-by-dropdown-dual", "value"),
+        Input("color-by-dropdown-2-dual", "value"),
+        Input("county-filter-dual", "value"),
+        State("county-map-views-dual", "data"),
+        **cbg.HEAVY_CALLBACK_OPTIONS
+    )
+    @cmetrics.instrument
+    @cprofiling.profile
+    def update_maps(mode, year_left, year_right, selected_state, color_left, color_right, county_filter, drawn_views):
+        drawn_views = drawn_views or {}
+        county_filter = (county_filter or "").strip()
+        panes = {"left": (year_left, color_left)}
+        # The right map is hidden in single mode, so it isn't drawn until it is shown again.
+        if mode == "dual":
+            panes["right"] = (year_right, color_right)
+
+        figures = {"left": dash.no_update, "right": dash.no_update}
+        views = dict(drawn_views)
+        for pane, (selected_year, selected_color_by) in panes.items():
+            if selected_year is None or selected_color_by is None:
+                continue
+            # "figure" is the state whose counties the drawn figure holds, "state" the one it is zoomed to
+            view = {
+                "year": selected_year, "state": selected_state, "color": selected_color_by, "filter": county_filter,
+                "figure": selected_state,
+            }
+            drawn = drawn_views.get(pane)
+            if drawn and {**drawn, "figure": selected_state} == view:
+                # This pane already shows exactly this map
+                continue
+            # Only a figure of every county can be moved to another state: a state's figure only holds its counties
+            if cfg.COUNTY_MAP_PATCH_STATE_ZOOM and drawn and drawn.get("figure") == "All" and (
+                drawn["year"], drawn["color"], drawn.get("filter", "")
+            ) == (selected_year, selected_color_by, county_filter):
+                figures[pane] = zoom_map(selected_year, selected_state)
+                view["figure"] = "All"
+            else:
+                figures[pane] = shared_map(selected_year, selected_state, selected_color_by, county_filter)
+            views[pane] = view
+        return figures["left"], figures["right"], views
+
+
+# ---- Callback for the filter's message ----
 @dash.callback(
-    Output("county-map-2-dual", "figure", allow_duplicate=True),
-    Input("year-dropdown-2-dual", "value"),
-    Input("color-by-dropdown-2-dual", "value"),
-    Input("state-dropdown-dual", "value"),
-    State("comparison-mode-dual", "value"),
-    prevent_initial_call=True
+    Output("county-filter-message-dual", "children"),
+    Input("county-filter-dual", "value"),
+    Input("year-dropdown-dual", "value")
 )
-def update_map_right_on_change(selected_year, selected_color_by, selected_state, mode):
-    # Only update if we're in dual mode
-    if mode != "dual":
-        raise PreventUpdate
-    
-    # If any required value is None, don't update
-    if selected_year is None or selected_color_by is None:
-        raise PreventUpdate
-        
-    return create_map(selected_year, selected_state, selected_color_by)
+@cmetrics.instrument
+def update_filter_message(county_filter, year_left):
+    # An invalid filter leaves the maps unfiltered; this says why
+    return cfilters.describe(county_filter, year_left)
 
 
 # ---- Callback for summary table ----
@@ -366,10 +596,11 @@ def update_map_right_on_change(selected_year, selected_color_by, selected_state,
     Output("summary-table-container-dual", "children"),
     Input("state-dropdown-dual", "value"),
     Input("year-dropdown-dual", "value"),
-    Input("comparison-mode-dual", "value"),
-    prevent_initial_call=False
+    Input("year-dropdown-2-dual", "value"),
+    Input("comparison-mode-dual", "value")
 )
-def update_summary_table(selected_state, year_left, mode):
+@cmetrics.instrument
+def update_summary_table(selected_state, year_left, year_right, mode):
     try:
         # Only show table when a specific state is selected (not "All")
         if selected_state == "All" or selected_state is None:
@@ -378,56 +609,16 @@ def update_summary_table(selected_state, year_left, mode):
         if year_left is None:
             return None
         
-        # In single mode, only show one table
-        if mode == "single":
-            summary_data = cutils.calculate_state_summary(df, selected_state, year_left)
-            if summary_data:
-                table = cutils.create_state_summary_table(summary_data)
-                return cutils.create_state_summary_container([table])
-            return None
-        
-        # In dual mode, we need to handle this separately since we can't access year-dropdown-2-dual as State
-        # We'll show just the left table for now, and add a separate callback for dual mode
-        summary_data = cutils.calculate_state_summary(df, selected_state, year_left)
-        if summary_data:
-            table = cutils.create_state_summary_table(summary_data)
-            return cutils.create_state_summary_container([table])
-        return None
-    except Exception:
-        # Silently fail if there are any issues
-        return None
-
+        # Left table always, and the right one in dual mode (even if same year as left)
+        years = [year_left]
+        if mode == "dual" and year_right is not None:
+            years.append(year_right)
 
-# ---- Additional callback for dual mode summary table ----
-@dash.callback(
-    Output("summary-table-container-dual", "children", allow_duplicate=True),
-    Input("year-dropdown-2-dual", "value"),
-    Input("year-dropdown-dual", "value"),
-    Input("comparison-mode-dual", "value"),
-    Input("state-dropdown-dual", "value"),
-    prevent_initial_call=True
-)
-def update_summary_table_dual(year_right, year_left, mode, selected_state):
-    try:
-        # Only update in dual mode with a valid state
-        if mode != "dual" or selected_state == "All" or selected_state is None:
-            raise PreventUpdate
-        
-        # If we don't have the left year, can't show anything
-        if year_left is None:
-            raise PreventUpdate
-        
-        # Create tables - show left, and right if available
         tables = []
-        summary_left = cutils.calculate_state_summary(df, selected_state, year_left)
-        if summary_left:
-            tables.append(cutils.create_state_summary_table(summary_left))
-        
-        # Show right table if year exists (even if same as left)
-        if year_right is not None:
-            summary_right = cutils.calculate_state_summary(df, selected_state, year_right)
-            if summary_right:
-                tables.append(cutils.create_state_summary_table(summary_right))
+        for year in years:
+            summary_data = cdata.get_state_summary(selected_state, year)
+            if summary_data:
+                tables.append(cutils.create_state_summary_table(summary_data))
         
         if len(tables) == 0:
             return None
@@ -435,4 +626,4 @@ def update_summary_table_dual(year_right, year_left, mode, selected_state):
         return cutils.create_state_summary_container(tables)
     except Exception:
         # Silently fail if there are any issues
-        raise PreventUpdate
+        return None
@@ -1,114 +1,243 @@
 import dash
 from dash import html, dcc, Input, Output
-import pandas as pd
-import plotly.express as px
+import numpy as np
 from collections import defaultdict
 import county_results_config as cfg
+import county_results_utils as cutils
+import county_results_data as cdata
+import county_results_filters as cfilters
+import county_results_background as cbg
+import county_results_metrics as cmetrics
+from county_results import profiling as cprofiling
+import county_results_startup as cstartup
 
 # Register page
 dash.register_page(__name__, name="Scatterplot Explorer", path="/scatterplot", order=2)
 
-# Load data once
-df = pd.read_csv(
-    "../data/final/county_election_data_overall.csv",
-    dtype={"county_fips": str}
-)
 
-# Group columns by category (for cleaner drop-down)
-# Also load human-friendly readable names.
-grouped = defaultdict(list)
-for col, meta in cfg.COLUMN_MAP_OVERALL.items():
-    if col in df.columns:
-        grouped[meta.get("group", "Other")].append(
-            {"label": meta.get("label", col), "value": col}
-        )
-# We need a flat structure where the group is incorporated directly into each option.
-# FIXME: Make this play nice with dcc.Dropdown when having Group (Demographics, Economics) included.
-dropdown_options = [
-    {"label": group, "options": sorted(opts, key=lambda x: x["label"])}
-    for group, opts in grouped.items()
-]
-flattened_dropdown_options = [
-    {"label": opt["label"], "value": opt["value"]}
-    for group_block in dropdown_options
-    for group, opts in [(group_block["label"], group_block["options"])]
-    for opt in opts
-]
-# Only allow coloring by certain 
-# Only allow dot sizing by vote total, it doesn't make a lot of sense for most other dimensions and adds clutter.
-size_dropdown_options = [
-    f for f in flattened_dropdown_options if f["value"].startswith("votes_total")
-]
+@cutils.single_flight_cache(maxsize=None, generation=cdata.generation)
+def page_data():
+    """
+    What the layout needs from the data, built once: at import, or on first use with cfg.LAZY_STARTUP.
+    """
+    # plotly.express takes a while to import, so it is only loaded with the data (see create_scatter).
+    import plotly.express  # noqa: F401
+    # The wide (one row per county) columns are built on demand from the by-year data, see county_results_data.
+
+    # Group columns by category (for cleaner drop-down)
+    # Also load human-friendly readable names.
+    grouped = defaultdict(list)
+    for col, meta in cfg.COLUMN_MAP_OVERALL.items():
+        if cdata.is_overall_column(col):
+            grouped[meta.get("group", "Other")].append(
+                {"label": meta.get("label", col), "value": col}
+            )
+    # We need a flat structure where the group is incorporated directly into each option.
+    # FIXME: Make this play nice with dcc.Dropdown when having Group (Demographics, Economics) included.
+    dropdown_options = [
+        {"label": group, "options": sorted(opts, key=lambda x: x["label"])}
+        for group, opts in grouped.items()
+    ]
+    flattened_dropdown_options = [
+        {"label": opt["label"], "value": opt["value"]}
+        for group_block in dropdown_options
+        for group, opts in [(group_block["label"], group_block["options"])]
+        for opt in opts
+    ]
+    # Only allow coloring by certain 
+    # Only allow dot sizing by vote total, it doesn't make a lot of sense for most other dimensions and adds clutter.
+    size_dropdown_options = [
+        f for f in flattened_dropdown_options if f["value"].startswith("votes_total")
+    ]
+    return {
+        "states": list(cdata.load_states()),
+        "flattened_dropdown_options": flattened_dropdown_options,
+        "size_dropdown_options": size_dropdown_options,
+    }
+
+
+cstartup.prepare("scatterplot", page_data)
+# The dropdowns only change with the counties and years, which an update of results doesn't
+cdata.register_incremental(page_data)
+
 
 # ---- Layout ----
-layout = html.Div([
-    html.H3("County Election Scatterplot", style={"text-align": "center"}),
+def layout(**kwargs):
+    # A function, so the data is only needed once the page is visited (see page_data)
+    data = page_data()
+    return html.Div([
+        html.H3("County Election Scatterplot", style={"text-align": "center"}),
 
-    html.Div([
-        # X-axis dropdown
         html.Div([
-            html.Label("X-axis"),
-            dcc.Dropdown(
-                id="x-axis",
-                options=flattened_dropdown_options,
-                value="votes_pct_democrat_2020"
-            )
-        ], style={"width": "21%", "display": "inline-block", "margin-left": "1%", "margin-right": "1%"}),
+            # X-axis dropdown
+            html.Div([
+                html.Label("X-axis"),
+                dcc.Dropdown(
+                    id="x-axis",
+                    options=data["flattened_dropdown_options"],
+                    value="votes_pct_democrat_2020"
+                )
+            ], style={"width": "21%", "display": "inline-block", "margin-left": "1%", "margin-right": "1%"}),
 
-        html.Div([
-            html.Label("Y-axis"),
-            dcc.Dropdown(
-                id="y-axis",
-                options=flattened_dropdown_options,
-                value="votes_pct_democrat_2024"
-            )
-        ], style={"width": "21%", "display": "inline-block", "margin-right": "1%"}),
+            html.Div([
+                html.Label("Y-axis"),
+                dcc.Dropdown(
+                    id="y-axis",
+                    options=data["flattened_dropdown_options"],
+                    value="votes_pct_democrat_2024"
+                )
+            ], style={"width": "21%", "display": "inline-block", "margin-right": "1%"}),
 
-        html.Div([
-            html.Label("Color by"),
-            dcc.Dropdown(
-                id="color-dim",
-                options=flattened_dropdown_options,
-                value="population_pct_hispanic_2024",
-                placeholder="Optional"
-            )
-        ], style={"width": "20%", "display": "inline-block", "margin-right": "1%"}),
+            html.Div([
+                html.Label("Color by"),
+                dcc.Dropdown(
+                    id="color-dim",
+                    options=data["flattened_dropdown_options"],
+                    value="population_pct_hispanic_2024",
+                    placeholder="Optional"
+                )
+            ], style={"width": "20%", "display": "inline-block", "margin-right": "1%"}),
+
+            html.Div([
+                html.Label("Size by"),
+                dcc.Dropdown(
+                    id="size-dim",
+                    options=data["size_dropdown_options"],
+                    value="votes_total_2024",
+                    placeholder="Optional"
+                )
+            ], style={"width": "14%", "display": "inline-block", "margin-right": "1%"}),
 
+            # State filter dropdown
+            # For now, only filter on State.
+            html.Div([
+                html.Label("Select state"),
+                dcc.Dropdown(
+                    id="state-filter",
+                    options=[{"label": "All", "value": "All"}] +
+                            [{"label": s, "value": s} for s in data["states"]],
+                    value="All"
+                )
+            ], style={"width": "13%", "display": "inline-block"})
+
+        ]),
+
+        # Filter expression over any columns, see county_results_filters.py. Applied on Enter or when leaving the box.
         html.Div([
-            html.Label("Size by"),
-            dcc.Dropdown(
-                id="size-dim",
-                options=size_dropdown_options,
-                value="votes_total_2024",
-                placeholder="Optional"
-            )
-        ], style={"width": "14%", "display": "inline-block", "margin-right": "1%"}),
+            html.Label("Filter counties:", style={"font-weight": "bold", "margin-right": "10px"}),
+            dcc.Input(
+                id="scatter-filter",
+                type="text",
+                debounce=True,
+                placeholder="e.g. population_pct_hispanic_2024 > 0.3 and votes_total_2024 > 50000 and region = Southwest",
+                style={"width": "60%"}
+            ),
+            html.Div(id="scatter-filter-message", style={"color": "#6c757d", "margin-top": "5px"})
+        ], style={"text-align": "center", "margin-top": "15px"}),
 
-        # State filter dropdown
-        # For now, only filter on State.
+        # Rendering mode. WebGL keeps large point sets responsive, SVG draws crisper markers.
+        # Density bins the points on the server and only sends the grid.
         html.Div([
-            html.Label("Select state"),
-            dcc.Dropdown(
-                id="state-filter",
-                options=[{"label": "All", "value": "All"}] +
-                        [{"label": s, "value": s} for s in sorted(df["state_name"].dropna().unique())],
-                value="All"
+            html.Label("Display as:", style={"font-weight": "bold", "margin-right": "10px"}),
+            dcc.RadioItems(
+                id="scatter-render-mode",
+                options=[
+                    {"label": " Auto", "value": "auto"},
+                    {"label": " Points (SVG)", "value": "svg"},
+                    {"label": " Points (WebGL)", "value": "webgl"},
+                    {"label": " Density", "value": "density"}
+                ],
+                value="auto",
+                inline=True,
+                labelStyle={"margin-right": "30px"}
             )
-        ], style={"width": "13%", "display": "inline-block"})
-
-    ]),
-
-    # Generate the graph and center it in the screen.
-    html.Div(
-        dcc.Graph(id="scatterplot"),
-        style={
-            "display": "flex",
-            "justifyContent": "center",
-            "alignItems": "center",  # vertical centering
-            "width": "100%",
-        },
+        ], style={"text-align": "center", "margin-top": "15px"}),
+
+        # Generate the graph and center it in the screen.
+        html.Div(
+            dcc.Graph(id="scatterplot"),
+            style={
+                "display": "flex",
+                "justifyContent": "center",
+                "alignItems": "center",  # vertical centering
+                "width": "100%",
+            },
+        )
+    ])
+
+
+def create_density_figure(dff, x_col, y_col, weight_col, display_x, display_y, display_weight, x_range, y_range):
+    """
+    Build a fixed-size 2-D density view of the scatterplot.
+
+    Points are binned server-side into a SCATTER_DENSITY_BINS x SCATTER_DENSITY_BINS grid,
+    optionally weighted by weight_col (e.g. total votes). Counties in near-empty cells
+    are overlaid as individual markers, capped at SCATTER_DENSITY_MAX_OUTLIERS.
+    """
+    import plotly.graph_objects as go
+    bins = cfg.SCATTER_DENSITY_BINS
+    weights = dff[weight_col].to_numpy(dtype=float) if weight_col else None
+    grid = cutils.bin_points_2d(
+        dff[x_col].to_numpy(dtype=float), dff[y_col].to_numpy(dtype=float),
+        bins, x_range=x_range, y_range=y_range, weights=weights
+    )
+    counts = grid["counts"]
+    z = grid["weighted"] if weights is not None else counts
+    x_centers = (grid["x_edges"][:-1] + grid["x_edges"][1:]) / 2
+    y_centers = (grid["y_edges"][:-1] + grid["y_edges"][1:]) / 2
+
+    hover = (
+        f"<b>{display_x}:</b> %{{x:.3f}}<br>"
+        f"<b>{display_y}:</b> %{{y:.3f}}<br>"
+        "<b>Counties:</b> %{customdata:,}"
     )
-])
+    if weights is not None:
+        hover += f"<br><b>{display_weight}:</b> %{{z:,.0f}}"
+
+    fig = go.Figure(go.Heatmap(
+        # Heatmap z is indexed [row=y, column=x]; empty cells are left blank.
+        z=np.where(counts > 0, z, np.nan).T,
+        x=x_centers,
+        y=y_centers,
+        customdata=counts.T,
+        colorscale="viridis_r",
+        hovertemplate=hover + "<extra></extra>",
+        colorbar=dict(
+            title=display_weight if weights is not None else "Counties",
+            xanchor="left",
+            x=1.02,
+            y=0.5,
+            len=0.85,
+            thickness=16,
+            outlinewidth=0,
+        )
+    ))
+
+    # Overlay the counties that sit in sparse cells, largest (by weight) first.
+    cell = grid["cell"]
+    sparse = (cell >= 0) & (counts.ravel()[np.maximum(cell, 0)] <= cfg.SCATTER_DENSITY_OUTLIER_CELL_COUNT)
+    outliers = np.flatnonzero(sparse)
+    if weights is not None:
+        outliers = outliers[np.argsort(-weights[outliers], kind="stable")]
+    outliers = outliers[:cfg.SCATTER_DENSITY_MAX_OUTLIERS]
+    if len(outliers):
+        points = dff.iloc[outliers]
+        fig.add_trace(go.Scatter(
+            x=points[x_col],
+            y=points[y_col],
+            mode="markers",
+            marker=dict(size=5, color="rgba(40,40,40,0.7)"),
+            customdata=points[["county_name", "state_abbr", "county_seat"]].to_numpy(),
+            hovertemplate=(
+                "<b>%{customdata[0]}, %{customdata[1]}</b><br>"
+                "<b>County Seat:</b> %{customdata[2]}<br><br>"
+                f"<b>{display_x}:</b> %{{x:.3f}}<br>"
+                f"<b>{display_y}:</b> %{{y:.3f}}<extra></extra>"
+            ),
+            name="Outlier counties",
+            showlegend=False
+        ))
+    return fig
 
 
 # ---- Main scatterplot callback ----
@@ -120,49 +249,91 @@ layout = html.Div([
         Input("color-dim", "value"),
         Input("size-dim", "value"),
         Input("state-filter", "value"),
+        Input("scatter-render-mode", "value"),
+        Input("scatter-filter", "value"),
     ],
+    **cbg.HEAVY_CALLBACK_OPTIONS
+)
+@cmetrics.instrument
+@cprofiling.profile
+def update_scatter(x_col, y_col, color_col, size_col, state_filter, render_mode="auto", county_filter=None):
+    with cbg.render_slot():
+        return create_scatter(x_col, y_col, color_col, size_col, state_filter, render_mode, county_filter)
+
+
+@dash.callback(
+    Output("scatter-filter-message", "children"),
+    Input("scatter-filter", "value")
 )
-def update_scatter(x_col, y_col, color_col, size_col, state_filter):
-    # Create a hard copy of our main data frame which can be modified without touching the original.
-    # i.e. filtering out certain states, etc.
-    dff = df.copy()
+@cmetrics.instrument
+def update_filter_message(county_filter):
+    # An invalid filter leaves the plot unfiltered; this says why
+    return cfilters.describe(county_filter)
+
+
+def create_scatter(x_col, y_col, color_col, size_col, state_filter, render_mode="auto", county_filter=None):
+    # Only build the handful of columns this plot uses, instead of the whole wide table.
+    # The result is a new frame, so it can be filtered without touching the original.
+    columns = [
+        "county_name", "state_abbr", "county_seat", "state_name",
+        x_col, y_col, color_col, size_col
+    ]
+    dff = cdata.get_county_data_overall([c for c in columns if c])
+    # The state and the filter expression are combined into one mask, so the rows are only selected once.
+    # The filter's mask is aligned to the same counties as dff (cached, see county_results_filters).
+    try:
+        keep = cfilters.county_mask(county_filter)
+    except cfilters.FilterError:
+        keep = None
     if state_filter != "All":
-        dff = dff[dff["state_name"] == state_filter]
+        in_state = (dff["state_name"] == state_filter).to_numpy()
+        keep = in_state if keep is None else keep & in_state
+    if keep is not None:
+        dff = dff[keep]
     # Remove rows that don't have a value for the specified color_col and size_col.
     display_color = None
     if color_col:
         dff = dff.dropna(subset=[color_col])
-        display_color = cfg.COLUMN_MAP_OVERALL.get(color_col, {}).get("label", color_col)
+        display_color = cutils.overall_column_meta(color_col).get("label", color_col)
     display_size = None
     if size_col:
         dff = dff.dropna(subset=[size_col])
-        display_size = cfg.COLUMN_MAP_OVERALL.get(size_col, {}).get("label", size_col)
+        display_size = cutils.overall_column_meta(size_col).get("label", size_col)
 
     # Use the mapping config to get the human-name and range for each column.
-    display_x = cfg.COLUMN_MAP_OVERALL.get(x_col, {}).get("label", x_col)
-    display_y = cfg.COLUMN_MAP_OVERALL.get(y_col, {}).get("label", y_col)
+    display_x = cutils.overall_column_meta(x_col).get("label", x_col)
+    display_y = cutils.overall_column_meta(y_col).get("label", y_col)
     scatter_labels = {x_col: display_x, y_col: display_y}
     # apply scale if defined.
     # Mainly to make the axes on 0-1 pct dimensions show the full 0-1 range.
-    x_min = cfg.COLUMN_MAP_OVERALL.get(x_col, {}).get("min")
-    x_max = cfg.COLUMN_MAP_OVERALL.get(x_col, {}).get("max")
-    y_min = cfg.COLUMN_MAP_OVERALL.get(y_col, {}).get("min")
-    y_max = cfg.COLUMN_MAP_OVERALL.get(y_col, {}).get("max")
-
-    fig = px.scatter(
-        dff,
-        x=x_col,
-        y=y_col,
-        color=color_col if color_col else None,
-        color_continuous_scale="viridis_r",
-        size=size_col if size_col else None,
-        size_max=40,
-        custom_data=[
-            "county_name", "state_abbr", "county_seat",
-            x_col, y_col, color_col, size_col
-        ],
-        labels=scatter_labels
-    )
+    x_min = cutils.overall_column_meta(x_col).get("min")
+    x_max = cutils.overall_column_meta(x_col).get("max")
+    y_min = cutils.overall_column_meta(y_col).get("min")
+    y_max = cutils.overall_column_meta(y_col).get("max")
+
+    if render_mode == "density":
+        # Weight the density by the vote-total sizing column, when one is picked.
+        fig = create_density_figure(
+            dff, x_col, y_col, size_col, display_x, display_y, display_size, (x_min, x_max), (y_min, y_max)
+        )
+    else:
+        import plotly.express as px
+        fig = px.scatter(
+            dff,
+            x=x_col,
+            y=y_col,
+            color=color_col if color_col else None,
+            color_continuous_scale="viridis_r",
+            size=size_col if size_col else None,
+            size_max=40,
+            # "auto" switches to WebGL (scattergl) once there are more than 1,000 points.
+            render_mode=render_mode or "auto",
+            custom_data=[
+                "county_name", "state_abbr", "county_seat",
+                x_col, y_col, color_col, size_col
+            ],
+            labels=scatter_labels
+        )
 
     # Keep the plot area square *by size*, not by units.
     # (No scaleanchor/scaleratio — that’s what was blowing up your 0–1 axes.)
@@ -191,6 +362,10 @@ def update_scatter(x_col, y_col, color_col, size_col, state_filter):
         layer="below",
     )
 
+    # The density view has its own hover-boxes and colorbar.
+    if render_mode == "density":
+        return fig
+
     # Control the pop-up window over each dot when hovering.
     # County Name, State, and Seat plus the data points in the chart.
     parts = [
@@ -215,7 +390,7 @@ def update_scatter(x_col, y_col, color_col, size_col, state_filter):
     if color_col:
         fig.update_layout(
             coloraxis_colorbar=dict(
-                title=cfg.COLUMN_MAP_OVERALL.get(color_col, {}).get("label", color_col),
+                title=cutils.overall_column_meta(color_col).get("label", color_col),
                 xanchor="left",
                 x=7,        # >1 pushes it outside the plot into the right margin
                 y=0.5,
@@ -0,0 +1,7 @@
+# Production entry point, run from dash_app/ with:
+#   gunicorn -c gunicorn.conf.py wsgi:server
+# Importing app builds the page registry, which loads each page's data and everything else that would
+# otherwise be built on a worker's first request (see county_results_startup).
+# With cfg.LAZY_STARTUP it only registers the pages; each worker then builds the data in a background
+# thread started from gunicorn.conf.py (post_worker_init).
+from app import app, server
@@ -0,0 +1,6 @@
+# Should run from exactly this directory for file loads, imports to work
+cd dash_app
+
+# Run the Dash app behind gunicorn, with data preloaded before workers fork.
+# Set WEB_CONCURRENCY to control the number of worker processes, PORT for the port.
+gunicorn -c gunicorn.conf.py wsgi:server
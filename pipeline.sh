@@ -17,8 +17,9 @@ python pipeline/load_csvs_to_raw_data_tables.py
 
 # sqlite3 us_county_election_results.db
 # Run specific files to process raw data with sqlite
-sqlite3 us_county_election_results.db < pipeline/transform_raw_data_to_staging.sql
-sqlite3 us_county_election_results.db < pipeline/transform_staging_to_final.sql
+# run_sql_file.py runs them like the sqlite3 tool would, and lists each file's slowest statements
+python pipeline/run_sql_file.py us_county_election_results.db pipeline/transform_raw_data_to_staging.sql
+python pipeline/run_sql_file.py us_county_election_results.db pipeline/transform_staging_to_final.sql
 
 # This loads the final tables from processing into csv's that can be used by the front-end analytics side.
 python pipeline/save_datatables_to_csv.py
@@ -0,0 +1,131 @@
+"""
+Election-night ingestion: apply county results as they arrive, without rerunning the pipeline.
+
+Watches a drop directory for csv files of county results (county_fips, year, votes_democrat, votes_republican,
+and votes_other or votes_total: each county's counts so far, not increments). Every new batch of files is
+upserted into the published by-year data (see county_results/ingest.py): only the changed
+(county_fips, year) rows have their percentages, margins, swing and bins recomputed. The changed rows are
+published as a small update file on top of the current dataset version, which running Dash workers apply to
+the data they have loaded within a few seconds (DATASET_POLL_SECONDS). The same rows are upserted into
+final__county_election_data_by_year in the sqlite database. Processed files are moved to <drop dir>/processed.
+
+Write files into the drop directory under a temporary name (e.g. a leading "." or a .tmp suffix) and rename
+them when complete; files are processed in name order, so name them by arrival time.
+After --compact-after update files, the whole table is published as a new snapshot instead.
+
+Run from the top-level of the repo, after the pipeline has published a dataset version:
+    python pipeline/ingest_results.py --drop-dir data/incoming
+"""
+import argparse
+import os
+import shutil
+import sqlite3
+import sys
+import time
+import pandas as pd
+
+from county_results import ingest as cingest
+from county_results import manifest as cmanifest
+from save_datatables_to_csv import save_arrow_snapshot
+
+DATA_SET = "county_election_data_by_year"
+TABLE = "final__county_election_data_by_year"
+
+
+def load_published(data_dir):
+    """The published by-year data, with its update files applied, and its manifest."""
+    manifest = cmanifest.read_manifest(data_dir)
+    if manifest is None:
+        sys.exit(f"No dataset version is published in {data_dir}, run the pipeline first.")
+    df = pd.read_feather(cmanifest.file_path(data_dir, manifest, DATA_SET))
+    for path in cmanifest.update_paths(data_dir, manifest):
+        df, _, _ = cingest.apply_rows(df, pd.read_feather(path))
+    return cingest.ResultsTable(df), manifest
+
+
+def pending_files(drop_dir):
+    """Complete csv files waiting in the drop directory, in name order."""
+    return sorted(
+        os.path.join(drop_dir, name) for name in os.listdir(drop_dir)
+        if name.endswith(".csv") and not name.startswith(".")
+    )
+
+
+def upsert_database(con, changed):
+    """Replace (or add) the changed rows of the by-year table in the sqlite database."""
+    columns = [row[1] for row in con.execute(f"pragma table_info({TABLE})") if row[1] in changed.columns]
+    # Without it, every row would be found by scanning the whole table
+    con.execute(f"create index if not exists {TABLE}__county_fips_year on {TABLE} (county_fips, year)")
+    values = changed[columns].astype(object).where(changed[columns].notna(), None)
+    keys = changed[cingest.KEY_COLUMNS].astype(object).values.tolist()
+    with con:
+        con.executemany(f"delete from {TABLE} where county_fips = ? and year = ?", keys)
+        con.executemany(
+            f"insert into {TABLE} ({', '.join(columns)}) values ({', '.join('?' * len(columns))})",
+            values.values.tolist()
+        )
+
+
+def publish_changes(data_dir, manifest, table, changed, compact_after):
+    """Publish the changed rows as an update file (or the whole table, once there are enough updates)."""
+    version = cmanifest.new_version()
+    directory = cmanifest.version_dir(data_dir, version)
+    if len(manifest["updates"]) >= compact_after:
+        path = os.path.join(directory, f"{DATA_SET}.arrow")
+        save_arrow_snapshot(table.df, path)
+        return cmanifest.publish(data_dir, version, {DATA_SET: path})
+    path = os.path.join(directory, f"{DATA_SET}.update.arrow")
+    save_arrow_snapshot(changed, path)
+    return cmanifest.publish(
+        data_dir, version,
+        {DATA_SET: cmanifest.file_path(data_dir, manifest, DATA_SET)},
+        updates=cmanifest.update_paths(data_dir, manifest) + [path]
+    )
+
+
+def ingest(paths, table, manifest, args, con):
+    """Upsert one batch of drop files and publish what changed. Returns the manifest now published."""
+    start = time.perf_counter()
+    updates = cingest.latest_updates([cingest.read_update_file(path) for path in paths])
+    changed, unknown = table.upsert(updates)
+    if len(unknown):
+        print(f"Skipped {len(unknown)} rows for unknown counties: {', '.join(sorted(unknown['county_fips'].unique())[:10])}")
+    if len(changed):
+        manifest = publish_changes(args.data_dir, manifest, table, changed, args.compact_after)
+        if con is not None:
+            upsert_database(con, changed)
+    processed = os.path.join(args.drop_dir, "processed")
+    os.makedirs(processed, exist_ok=True)
+    for path in paths:
+        shutil.move(path, os.path.join(processed, os.path.basename(path)))
+    print(
+        f"{len(paths)} files, {len(updates)} county results, {len(changed)} rows changed"
+        f" -> version {manifest['version']} in {time.perf_counter() - start:.3f}s"
+    )
+    return manifest
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--drop-dir", default="data/incoming", help="directory to watch for result files")
+    parser.add_argument("--data-dir", default="data/final", help="directory with the published dataset versions")
+    parser.add_argument("--database", default="us_county_election_results.db", help="sqlite database to update too ('' to skip)")
+    parser.add_argument("--interval", type=float, default=1.0, help="seconds between checks of the drop directory")
+    parser.add_argument("--compact-after", type=int, default=100, help="update files before a full snapshot is published")
+    parser.add_argument("--once", action="store_true", help="process the files waiting now, then exit")
+    args = parser.parse_args()
+
+    os.makedirs(args.drop_dir, exist_ok=True)
+    table, manifest = load_published(args.data_dir)
+    con = sqlite3.connect(args.database) if args.database and os.path.exists(args.database) else None
+    print(f"Watching {args.drop_dir} for results, on top of version {manifest['version']} ({len(table.df):,} rows)")
+    while True:
+        paths = pending_files(args.drop_dir)
+        if paths and cmanifest.read_manifest(args.data_dir)["version"] != manifest["version"]:
+            # Another version was published meanwhile (e.g. a full pipeline run): apply the results on top of it
+            table, manifest = load_published(args.data_dir)
+        if paths:
+            manifest = ingest(paths, table, manifest, args, con)
+        if args.once:
+            break
+        time.sleep(args.interval)
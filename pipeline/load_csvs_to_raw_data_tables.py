@@ -1,12 +1,16 @@
 import pandas as pd
 import sqlite3
 
+# Profiling (off unless COUNTY_RESULTS_PROFILE_DIR is set) is in the county_results package shared with the Dash app.
+from county_results import profiling as cprofiling
+
 
 def load_csv_to_sqlite(input_file_name, output_table_name, con):
     print(f"Loading {input_file_name} to {output_table_name} ...")
-    df = pd.read_csv(input_file_name)
-    df.to_sql(name=output_table_name, con=con, if_exists="replace")
-    del df
+    with cprofiling.profiled(f"load_csvs.{output_table_name}"):
+        df = pd.read_csv(input_file_name)
+        df.to_sql(name=output_table_name, con=con, if_exists="replace")
+        del df
     return True
 
 
@@ -0,0 +1,104 @@
+"""
+Run a pipeline SQL file against the sqlite database one statement at a time, timing each statement.
+
+Does what `sqlite3 <database> < <file>` does for the pipeline's SQL files: the statements run in order, and the
+rows of the check queries (duplicate counts, ...) are printed. The sqlite3 dot-commands (.header, .mode, ...)
+only change how the command line tool prints, so they are skipped. After the last statement, the slowest
+statements are listed with their wall times. When COUNTY_RESULTS_PROFILE_DIR is set, every statement's time
+is also written there as a .folded profile named after the SQL file (see county_results/profiling.py).
+
+Run from the top-level of the repo, like pipeline.sh:
+    python pipeline/run_sql_file.py us_county_election_results.db pipeline/transform_staging_to_final.sql
+"""
+import argparse
+import os
+import re
+import sqlite3
+import time
+from county_results import profiling as cprofiling
+
+# Slowest statements listed after a run
+SLOWEST_SHOWN = 10
+COMMENTS = re.compile(r"--[^\n]*|/\*.*?\*/", flags=re.DOTALL)
+
+
+def read_statements(sql_file):
+    """
+    Split a SQL file into its statements, skipping the sqlite3 dot-commands.
+
+    Returns:
+        List of (line number of the statement's first line, statement text)
+    """
+    statements = []
+    buffer, buffer_line = "", 1
+    with open(sql_file) as f:
+        for number, line in enumerate(f, start=1):
+            # Dot-commands only count between statements, where the buffer holds at most comments
+            if line.lstrip().startswith(".") and not COMMENTS.sub("", buffer).strip():
+                buffer, buffer_line = "", number + 1
+                continue
+            buffer += line
+            if sqlite3.complete_statement(buffer):
+                statements.append(_statement(buffer, buffer_line))
+                buffer, buffer_line = "", number + 1
+    # A statement after the last ";" (trailing comments are left out)
+    if COMMENTS.sub("", buffer).strip():
+        statements.append(_statement(buffer, buffer_line))
+    return statements
+
+
+def _statement(buffer, buffer_line):
+    """(line number, text) of the statement in buffer, which starts at buffer_line, after its leading comments."""
+    # Comments blanked out, keeping their line breaks
+    code = COMMENTS.sub(lambda comment: re.sub(r"[^\n]", " ", comment.group()), buffer)
+    start = len(code) - len(code.lstrip())
+    return buffer_line + buffer.count("\n", 0, start), buffer.strip()
+
+
+def describe(line, statement):
+    """Short name of a statement for the timings: its line and first words, without the comments."""
+    words = " ".join(COMMENTS.sub(" ", statement).split())
+    return f"line {line}: {words[:60]}"
+
+
+def print_rows(cursor):
+    """Print a query's rows under its column names, like the sqlite3 tool with .header on."""
+    print("  ".join(column[0] for column in cursor.description))
+    for row in cursor:
+        print("  ".join("" if value is None else str(value) for value in row))
+    print()
+
+
+def run_sql_file(database, sql_file):
+    """
+    Run every statement of sql_file on the database, in order.
+
+    Returns:
+        List of (statement description, seconds), in the order the statements ran
+    """
+    timings = []
+    con = sqlite3.connect(database, isolation_level=None)
+    try:
+        for line, statement in read_statements(sql_file):
+            start = time.perf_counter()
+            cursor = con.execute(statement)
+            if cursor.description is not None:
+                print_rows(cursor)
+            timings.append((describe(line, statement), time.perf_counter() - start))
+    finally:
+        con.close()
+    return timings
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("database")
+    parser.add_argument("sql_file")
+    args = parser.parse_args()
+
+    timings = run_sql_file(args.database, args.sql_file)
+    name = os.path.splitext(os.path.basename(args.sql_file))[0]
+    print(f"{name}: {len(timings)} statements in {sum(seconds for _, seconds in timings):.2f}s, slowest:")
+    for step, seconds in sorted(timings, key=lambda timing: -timing[1])[:SLOWEST_SHOWN]:
+        print(f"  {seconds:8.3f}s  {step}")
+    cprofiling.write_timings(f"sql.{name}", timings)
@@ -1,17 +1,64 @@
+import os
 import pandas as pd
+import pyarrow as pa
+import pyarrow.feather as feather
 import sqlite3
 
+# Binning, dataset versions and profiling are in the county_results package, shared with the Dash app.
+from county_results import bins as cbins
+from county_results import manifest as cmanifest
+from county_results import profiling as cprofiling
+
+# Low-cardinality text columns, stored once per distinct value in the Arrow snapshot.
+DICTIONARY_COLUMNS = ["county_name", "county_seat", "state_name", "state_abbr", "winning_party"]
+
+
+def save_arrow_snapshot(df, path):
+	"""
+	Save a final table as an uncompressed Arrow IPC (Feather v2) file.
+	Uncompressed, fixed-width columns can be memory-mapped and read without copying by the Dash app,
+	so every worker process shares the same physical pages.
+	"""
+	# Keep FIPS as text, exactly like the csv is read.
+	df = df.copy()
+	df["county_fips"] = df["county_fips"].where(df["county_fips"].isna(), df["county_fips"].astype(str))
+	table = pa.Table.from_pandas(df, preserve_index=False)
+	for column in DICTIONARY_COLUMNS:
+		if column in table.column_names:
+			index = table.column_names.index(column)
+			table = table.set_column(index, column, table[column].dictionary_encode())
+	# Write to a temporary file first, so readers never see a half-written snapshot.
+	tmp_path = f"{path}.tmp"
+	feather.write_feather(table, tmp_path, compression="uncompressed")
+	os.replace(tmp_path, path)
+	return True
+
+
 if __name__ == '__main__':
 	## Connect to the sqlite database where tables have been built.
 	con = sqlite3.connect("us_county_election_results.db")
 	
 	## Save two final tables to a csv file.
+	## Each table is profiled when COUNTY_RESULTS_PROFILE_DIR is set (see county_results/profiling.py).
+	## The Arrow snapshot goes into a new dataset version, which running Dash workers swap in once it is
+	## published below (see county_results/manifest.py).
+	version = cmanifest.new_version()
+	snapshot_path = os.path.join(cmanifest.version_dir("data/final", version), "county_election_data_by_year.arrow")
 	print("Saving final__county_election_data_by_year to csv")
-	df = pd.read_sql(sql="select * from final__county_election_data_by_year", con=con)
-	df.to_csv("data/final/county_election_data_by_year.csv", index=False)
-	del df
+	with cprofiling.profiled("save_csvs.county_election_data_by_year"):
+		df = pd.read_sql(sql="select * from final__county_election_data_by_year", con=con)
+		## Bin every county once here, so the app can load the uint8 bin codes instead of binning at startup.
+		cbins.add_bin_codes(df)
+		df.to_csv("data/final/county_election_data_by_year.csv", index=False)
+		print("Saving final__county_election_data_by_year to an Arrow snapshot")
+		save_arrow_snapshot(df, snapshot_path)
+		del df
 
 	print("Saving final__county_election_data_overall to csv")	
-	df = pd.read_sql(sql="select * from final__county_election_data_overall", con=con)
-	df.to_csv("data/final/county_election_data_overall.csv", index=False)
-	del df
+	with cprofiling.profiled("save_csvs.county_election_data_overall"):
+		df = pd.read_sql(sql="select * from final__county_election_data_overall", con=con)
+		df.to_csv("data/final/county_election_data_overall.csv", index=False)
+		del df
+
+	print(f"Publishing dataset version {version}")
+	cmanifest.publish("data/final", version, {"county_election_data_by_year": snapshot_path})
@@ -90,6 +90,13 @@ from
         on ec.county_fips = res.county_fips
 ;
 
+-- The Dash app's sqlite backend (dash_app/county_results_sql.py) reads one year, or one state and year, at a time.
+-- The election-night ingester (pipeline/ingest_results.py) replaces rows by county and year.
+CREATE INDEX final__county_election_data_by_year__year_state_name
+    on final__county_election_data_by_year (year, state_name);
+CREATE INDEX final__county_election_data_by_year__county_fips_year
+    on final__county_election_data_by_year (county_fips, year);
+
 -- Checks (should return 0 results)
 -- Unique FIPS
 select county_fips, year, count(*) from final__county_election_data_by_year
@@ -0,0 +1,93 @@
+"""
+Shared setup for the tests, run from the top-level of the repo with: python -m pytest tests
+
+The app's modules are flat (imported as county_results_*, like the app does from dash_app/), and so are the
+pipeline's and benchmarks' scripts; the county_results package they share is imported from the top-level. county_results_data reads COUNTY_RESULTS_DATA_DIR when it is imported, so it
+is pointed here, before any test imports it, at a small synthetic data set (benchmarks/synthetic_data.py)
+published as a dataset version in a temporary directory.
+"""
+import atexit
+import importlib
+import os
+import shutil
+import sys
+import tempfile
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+for directory in ("", "dash_app", "pipeline", "benchmarks"):
+    sys.path.insert(0, os.path.join(ROOT, directory))
+
+import pandas as pd  # noqa: E402
+import pytest  # noqa: E402
+import synthetic_data  # noqa: E402
+from county_results import ingest as cingest  # noqa: E402
+from county_results import manifest as cmanifest  # noqa: E402
+import ingest_results  # noqa: E402
+
+DATA_SET = "county_election_data_by_year"
+# ~310 counties in every state, 7 elections
+SCALE = 0.1
+
+
+def publish_synthetic_data(data_dir, scale=SCALE, seed=0):
+    """Write a synthetic data set and publish its Arrow snapshot as the first dataset version of data_dir."""
+    source_dir = os.path.join(data_dir, "source")
+    df = synthetic_data.write_data_set(source_dir, scale=scale, seed=seed)
+    version = cmanifest.new_version()
+    path = os.path.join(cmanifest.version_dir(data_dir, version), f"{DATA_SET}.arrow")
+    shutil.copy(os.path.join(source_dir, f"{DATA_SET}.arrow"), path)
+    return df, cmanifest.publish(data_dir, version, {DATA_SET: path})
+
+
+_work_dir = tempfile.mkdtemp(prefix="county_results_tests_")
+atexit.register(shutil.rmtree, _work_dir, ignore_errors=True)
+os.environ["COUNTY_RESULTS_DATA_DIR"] = os.path.join(_work_dir, "final")
+os.environ.pop("COUNTY_RESULTS_DATA_BACKEND", None)
+publish_synthetic_data(os.environ["COUNTY_RESULTS_DATA_DIR"])
+
+
+@pytest.fixture
+def published_data(tmp_path, monkeypatch):
+    """
+    county_results_data serving its own published copy of a smaller synthetic data set, which a test may
+    publish new versions or update files on. The shared data set is served again afterwards.
+
+    Returns:
+        (data directory, manifest of the first version)
+    """
+    import county_results_data as cdata
+
+    data_dir = str(tmp_path / "final")
+    _, manifest = publish_synthetic_data(data_dir, scale=0.02, seed=1)
+    monkeypatch.setattr(cdata, "DATA_DIR", data_dir)
+    monkeypatch.setattr(cdata, "_active", None)
+    yield data_dir, manifest
+    # A fresh snapshot of the shared data set, newer than every generation the test cached
+    monkeypatch.undo()
+    cdata._active = None
+
+
+@pytest.fixture
+def publish_update():
+    """
+    Upsert vote counts the way the election-night ingester does, and publish them as an update file.
+
+    Returns:
+        Function (data_dir, manifest, *(county_fips, year, dem, rep, other)) returning the new manifest
+    """
+    def publish(data_dir, manifest, *rows):
+        table, _ = ingest_results.load_published(data_dir)
+        changed, _ = table.upsert(pd.DataFrame(rows, columns=cingest.KEY_COLUMNS + cingest.VOTE_COLUMNS))
+        return ingest_results.publish_changes(data_dir, manifest, table, changed, compact_after=10)
+
+    return publish
+
+
+@pytest.fixture(scope="session")
+def pages():
+    """
+    The Dash app's page modules, by name (e.g. pages("nationwide_map")), built on the shared data set.
+    dash only lets pages register while an app is created, so this imports the app once.
+    """
+    import app  # noqa: F401
+    return lambda name: importlib.import_module(f"pages.{name}")
@@ -0,0 +1,42 @@
+import threading
+import time
+import diskcache
+import pytest
+import county_results_background as cbg
+import county_results_config as cfg
+
+
+def test_background_callbacks_are_off_by_default():
+    assert not cfg.BACKGROUND_CALLBACKS
+    assert cbg.HEAVY_CALLBACK_OPTIONS == {} and cbg.cache is None
+    # Renders in the web workers aren't bounded any further
+    with cbg.render_slot():
+        pass
+
+
+def test_render_slot_bounds_concurrent_renders(tmp_path, monkeypatch):
+    monkeypatch.setattr(cbg, "cache", diskcache.Cache(str(tmp_path)))
+    monkeypatch.setattr(cfg, "BACKGROUND_MAX_CONCURRENT_RENDERS", 2)
+    lock = threading.Lock()
+    running, most = [0], [0]
+
+    def render():
+        with cbg.render_slot():
+            with lock:
+                running[0] += 1
+                most[0] = max(most[0], running[0])
+            time.sleep(0.05)
+            with lock:
+                running[0] -= 1
+
+    threads = [threading.Thread(target=render) for _ in range(6)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(10)
+    assert most[0] == 2 and running[0] == 0
+    # Every slot is given back, also by a render that fails
+    with pytest.raises(ValueError):
+        with cbg.render_slot():
+            raise ValueError
+    assert cbg.cache.get("render-slots") == 2
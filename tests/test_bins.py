@@ -0,0 +1,47 @@
+import numpy as np
+import pandas as pd
+import pytest
+from county_results import bins as cbins
+import county_results_data as cdata
+
+
+@pytest.mark.parametrize("bin_column", list(cbins.BIN_COLUMNS))
+def test_bin_codes_match_pd_cut(bin_column):
+    bins, labels, colors = cbins.BIN_COLUMNS[bin_column]
+    df = cdata.load_county_data_by_year()
+    sources = {
+        "margin_bin": df["votes_pct_two_party_democrat"],
+        "swing_bin": df["votes_pct_swing_from_prev_election"],
+        "winning_margin_in_votes_bin": df["votes_democrat"] - df["votes_republican"],
+    }
+    # The data, every edge and its neighbours, values outside the edges and NaN
+    edges = np.asarray(bins, dtype=float)
+    finite = edges[np.isfinite(edges)]
+    extra = np.concatenate([finite, np.nextafter(finite, np.inf), np.nextafter(finite, -np.inf), [np.nan]])
+    values = np.concatenate([sources[bin_column].to_numpy(dtype=float), extra])
+
+    codes = cbins.bin_codes(values, bins)
+    expected = pd.cut(values, bins=bins, labels=labels, include_lowest=True)
+    assert codes.tolist() == np.where(expected.codes == -1, cbins.NO_BIN, expected.codes.astype(int)).tolist()
+    assert cbins.labels_from_codes(bin_column, codes).astype(object).equals(pd.Series(expected).astype(object))
+    # The published codes are the same as binning the data again
+    assert df[f"{bin_column}_code"].tolist() == codes[:len(df)].tolist()
+
+
+def test_map_colors_come_from_the_palette(pages):
+    nationwide_map = pages("nationwide_map")
+    fig = nationwide_map.create_map(2024, "All", "swing_bin")
+    rows = cdata.county_rows(2024).set_index("county_fips")
+    labels = cbins.BIN_COLUMNS["swing_bin"][1]
+    for trace in fig.data:
+        codes = set(rows.loc[list(trace.locations), "swing_bin_code"])
+        assert len(codes) == 1
+        code = codes.pop()
+        assert trace.name == ("No data" if code == cbins.NO_BIN else labels[code])
+        assert trace.colorscale[0][1] == trace.colorscale[1][1] == cbins.PALETTES["swing_bin"][min(code, len(labels))]
+    assert sum(len(trace.locations) for trace in fig.data) == len(rows)
+    # Legend in bin order, the counties without a bin last and gray
+    names = [trace.name for trace in fig.data]
+    assert names == sorted(names, key=lambda name: labels.index(name) if name in labels else len(labels))
+    missing = [trace for trace in fig.data if trace.name == "No data"]
+    assert all(trace.colorscale[0][1] == cbins.MISSING_COLOR for trace in missing)
@@ -0,0 +1,40 @@
+import json
+import county_results_data as cdata
+
+
+def test_client_map_data(pages):
+    nationwide_map = pages("nationwide_map")
+    df = cdata.load_county_data_by_year()
+    payload = nationwide_map.build_client_map_data(df)
+    # Plain JSON, for a dcc.Store
+    json.dumps(payload)
+
+    fips = payload["counties"]["county_fips"]
+    assert fips == sorted(df["county_fips"].unique()) and all(len(f) == 5 for f in fips)
+    assert sorted(payload["years"]) == [str(year) for year in cdata.load_available_years()]
+
+    # Every year's columns are aligned to an index into the counties, bins are codes into their labels
+    year = payload["years"]["2024"]
+    rows = df[df["year"] == 2024].set_index("county_fips")
+    counties = [fips[i] for i in year["county"]]
+    assert sorted(counties) == sorted(rows.index)
+    assert year["votes_total"] == rows.loc[counties, "votes_total"].tolist()
+    assert year["votes_pct_democrat"] == rows.loc[counties, "votes_pct_democrat"].round(4).tolist()
+    for column, bins in payload["bins"].items():
+        labels = [None if code is None else bins["labels"][code] for code in year[column]]
+        expected = rows.loc[counties, column].astype(object)
+        assert labels == expected.where(expected.notna(), None).tolist()
+        assert len(bins["colors"]) == len(bins["labels"])
+    names = dict(zip(fips, payload["counties"]["county_name"]))
+    assert [names[f] for f in counties] == rows.loc[counties, "county_name"].astype(str).tolist()
+
+
+def test_client_map_data_update_rebuilds_changed_years(pages):
+    nationwide_map = pages("nationwide_map")
+    data = {"client_map_data": nationwide_map.build_client_map_data(cdata.load_county_data_by_year())}
+    updated = nationwide_map.update_page_data((), data, cdata.Changes(set(), {2024}, None, None, None))
+    old_years, new_years = data["client_map_data"]["years"], updated["client_map_data"]["years"]
+    assert new_years["2024"] == old_years["2024"] and new_years["2024"] is not old_years["2024"]
+    assert all(new_years[year] is old_years[year] for year in old_years if year != "2024")
+    # Without a client payload (server-side rendering) there is nothing to update
+    assert nationwide_map.update_page_data((), {"client_map_data": None}, None) == {"client_map_data": None}
@@ -0,0 +1,54 @@
+import dash
+import plotly.graph_objects as go
+import county_results_config as cfg
+import county_results_data as cdata
+
+
+def draw(nationwide_map, state, drawn, year=2024, color="margin_bin", county_filter=""):
+    """The left pane of update_maps in single mode: (figure, the views store after it)."""
+    left, right, views = nationwide_map.update_maps("single", year, 2020, state, color, "margin_bin", county_filter, drawn)
+    assert right is dash.no_update
+    return left, views
+
+
+def test_update_maps_patches_only_a_state_change_on_the_national_figure(pages, monkeypatch):
+    nationwide_map = pages("nationwide_map")
+    monkeypatch.setattr(cfg, "COUNTY_MAP_PATCH_STATE_ZOOM", True)
+    national, views = draw(nationwide_map, "All", None)
+    assert isinstance(national, go.Figure) and views["left"]["figure"] == "All"
+
+    # Same year, color and filter on the map of every county: only moved
+    zoomed, zoomed_views = draw(nationwide_map, "Ohio", views)
+    assert isinstance(zoomed, dash.Patch)
+    assert zoomed_views["left"] == {**views["left"], "state": "Ohio"}
+    # Nothing changed at all
+    assert draw(nationwide_map, "Ohio", zoomed_views)[0] is dash.no_update
+
+    # Anything else draws a new figure of the state's counties
+    for changed in [{"year": 2020}, {"color": "swing_bin"}, {"county_filter": "votes_total > 1000"}]:
+        figure, changed_views = draw(nationwide_map, "Ohio", views, **changed)
+        assert isinstance(figure, go.Figure), changed
+        assert changed_views["left"]["figure"] == "Ohio"
+    state_figure, state_views = draw(nationwide_map, "Ohio", views, year=2020)
+    # A state's figure doesn't hold the other states' counties, so it is never moved
+    assert isinstance(draw(nationwide_map, "Texas", state_views, year=2020)[0], go.Figure)
+
+
+def test_update_maps_draws_state_figures_by_default(pages):
+    nationwide_map = pages("nationwide_map")
+    assert not cfg.COUNTY_MAP_PATCH_STATE_ZOOM
+    _, views = draw(nationwide_map, "All", None)
+    figure, views = draw(nationwide_map, "Ohio", views)
+    # Only the state's counties, not the country's moved to Ohio
+    assert isinstance(figure, go.Figure) and views["left"]["figure"] == "Ohio"
+    drawn = sorted(fips for trace in figure.data for fips in trace.locations)
+    assert drawn == sorted(cdata.county_rows(2024, "Ohio")["county_fips"].str.zfill(5))
+
+
+def test_both_panes_share_one_render(pages):
+    nationwide_map = pages("nationwide_map")
+    nationwide_map.shared_map.cache_clear()
+    left, right, views = nationwide_map.update_maps("dual", 2024, 2024, "All", "swing_bin", "swing_bin", "", None)
+    assert left is right
+    info = nationwide_map.shared_map.cache_info()
+    assert (info.misses, info.hits, info.maxsize) == (1, 1, cfg.COUNTY_MAP_FIGURE_CACHE_SIZE)
@@ -0,0 +1,58 @@
+import pandas as pd
+import county_results_data as cdata
+from county_results import manifest as cmanifest
+import county_results_utils as cutils
+
+
+def full_load(data_dir):
+    return cdata.load_snapshot(cmanifest.read_manifest(data_dir))
+
+
+def test_refresh_applies_update_files_incrementally(published_data, publish_update):
+    data_dir, manifest = published_data
+    cdata.preload()
+    fips = cdata.load_county_identifiers()["county_fips"][0]
+    unchanged, changed = cdata._overall_column("votes_total_2016"), cdata._overall_column("votes_total_2024")
+    years = []
+
+    @cutils.single_flight_cache(maxsize=None, generation=cdata.generation)
+    def page_data():
+        return object()
+
+    def update(args, result, changes):
+        years.append(changes.years)
+        return result
+
+    cdata.register_incremental(page_data, update)
+    try:
+        before = page_data()
+        manifest = publish_update(data_dir, manifest, (fips, 2024, 123456, 1, 0))
+        new = cdata.refresh()
+        assert new.version == manifest["version"] and len(new.updates) == 1
+        assert cdata.snapshot() is new
+        # Carried over: the hook saw the changed year, and the other years' columns are the same objects
+        assert years == [{2024}] and page_data() is before
+        assert cdata._overall_column("votes_total_2016") is unchanged
+        assert cdata._overall_column("votes_total_2024") is not changed
+    finally:
+        cdata._incremental.remove((page_data, update))
+
+    columns = ["votes_total_2016", "votes_total_2024", "votes_pct_democrat_2024", "margin_bin_2024"]
+    incremental, summaries = cdata.get_county_data_overall(columns), cdata.load_state_summaries()
+    assert incremental["votes_total_2024"][0] == 123457
+    with cdata.using(full_load(data_dir)) as full:
+        pd.testing.assert_frame_equal(incremental, cdata.get_county_data_overall(columns))
+        assert summaries == cutils.build_state_summaries(full.df)
+
+
+def test_refresh_loads_new_years_in_full(published_data, publish_update):
+    data_dir, manifest = published_data
+    cdata.preload()
+    fips = cdata.load_county_identifiers()["county_fips"][0]
+    identifiers = cdata.load_county_identifiers()
+    publish_update(data_dir, manifest, (fips, 2028, 10, 20, 0))
+    new = cdata.refresh()
+    # The first rows of a new election: nothing is carried over
+    assert new is not None and cdata.load_available_years()[-1] == 2028
+    assert cdata.load_county_identifiers() is not identifiers
+    assert cdata.get_county_data_overall(["votes_total_2028"])["votes_total_2028"][0] == 30
@@ -0,0 +1,182 @@
+import re
+import numpy as np
+import pytest
+import county_results_config as cfg
+import county_results_data as cdata
+import county_results_filters as cfilters
+
+
+def wide(*columns):
+    return cdata.get_county_data_overall(list(columns))
+
+
+def matches(text, year=None):
+    return cfilters.county_mask(text, year).tolist()
+
+
+def test_tokenize():
+    assert cfilters.tokenize("votes_total_2024 >= 1e4 AND state in ('Ohio', \"Texas\")") == [
+        ("word", "votes_total_2024"), ("symbol", ">="), ("number", cfilters.Number(1e4, "1e4")), ("keyword", "and"),
+        ("word", "state"), ("keyword", "in"), ("symbol", "("), ("text", "Ohio"), ("symbol", ","), ("text", "Texas"),
+        ("symbol", ")"),
+    ]
+    # Percentages are fractions, and numbers keep their text as typed
+    assert cfilters.tokenize("30% -.5 01001") == [
+        ("number", cfilters.Number(0.3, "30%")), ("number", cfilters.Number(-0.5, "-.5")),
+        ("number", cfilters.Number(1001.0, "01001")),
+    ]
+    assert cfilters.tokenize("   ") == []
+
+
+@pytest.mark.parametrize("text", ["votes_total_2024 > 5 ;", "county = 'Cook", "a > 1 & b > 2"])
+def test_tokenize_errors(text):
+    with pytest.raises(cfilters.FilterError, match="Unexpected"):
+        cfilters.tokenize(text)
+
+
+def test_parse():
+    a = ("compare", "a", ">", cfilters.Number(1.0, "1"))
+    b = ("compare", "b", "==", "x")
+    c = ("compare", "c", "<", cfilters.Number(2.0, "2"))
+    # "and" binds tighter than "or"
+    assert cfilters.parse("a > 1 or b = x and c < 2") == ("or", a, ("and", b, c))
+    assert cfilters.parse("(a > 1 or b = x) and c < 2") == ("and", ("or", a, b), c)
+    assert cfilters.parse("not a > 1 and not (b = x)") == ("and", ("not", a), ("not", b))
+    assert cfilters.parse("A not in (x, 'y z')") == ("not in", "a", ("x", "y z"))
+    assert cfilters.parse("a not between 1 and 2") == (
+        "not between", "a", cfilters.Number(1.0, "1"), cfilters.Number(2.0, "2"))
+    assert cfilters.parse("") is None
+
+
+@pytest.mark.parametrize("text, message", [
+    ("a >", "Expected a value at the end"),
+    ("a > 1 and", "Expected a column name at the end"),
+    ("(a > 1", "Expected ')' at the end"),
+    ("a > 1)", "Unexpected ')'"),
+    ("a 1", "Expected a comparison after 'a' before '1'"),
+    ("a not = 1", "Expected 'in' or 'between' after 'not' before '='"),
+    ("a in 1", "Expected '(' after 'in' before '1'"),
+    ("a between 1 or 2", "Expected 'and' in 'between' before 'or'"),
+    ("5 > a", "Expected a column name before '5'"),
+])
+def test_parse_errors(text, message):
+    with pytest.raises(cfilters.FilterError, match=re.escape(message)):
+        cfilters.parse(text)
+
+
+def test_county_mask_numbers():
+    df = wide("votes_total_2024", "population_pct_hispanic_2024")
+    expected = (df["votes_total_2024"] > 20000) & (df["population_pct_hispanic_2024"] <= 0.1)
+    mask = cfilters.county_mask("votes_total_2024 > 20000 and population_pct_hispanic_2024 <= 0.1")
+    assert mask.tolist() == expected.tolist()
+    assert 0 < mask.sum() < len(mask)
+    assert not mask.flags.writeable
+    # 10% is 0.1
+    assert matches("population_pct_hispanic_2024 <= 10%") == matches("population_pct_hispanic_2024 <= 0.1")
+
+
+def test_county_mask_between_is_inclusive():
+    votes = wide("votes_total_2024")["votes_total_2024"]
+    low, high = votes.iloc[0], votes.iloc[1]
+    low, high = min(low, high), max(low, high)
+    expected = votes.between(low, high)
+    assert matches(f"votes_total_2024 between {low} and {high}") == expected.tolist()
+    assert matches(f"votes_total_2024 not between {low} and {high}") == (~expected).tolist()
+    assert matches(f"votes_total_2024 in ({low}, {high})") == votes.isin([low, high]).tolist()
+
+
+def test_county_mask_text():
+    states = cdata.load_county_identifiers()["state_name"].astype(str)
+    # Case-insensitive, with aliases for the identifier columns
+    assert matches("state = oHIO") == (states == "Ohio").tolist()
+    assert matches("state != Ohio") == (states != "Ohio").tolist()
+    assert matches("state_name in (Ohio, 'New York')") == states.isin(["Ohio", "New York"]).tolist()
+    assert matches("not state not in (Ohio)") == (states == "Ohio").tolist()
+
+
+def test_county_mask_leading_zero_fips():
+    fips = cdata.load_county_identifiers()["county_fips"]
+    # Compared as typed, not as the number 1001
+    assert fips[cfilters.county_mask("county_fips = 01001")].tolist() == ["01001"]
+    assert fips[cfilters.county_mask("fips in (01001, '01003')")].tolist() == ["01001", "01003"]
+    assert not cfilters.county_mask("county_fips = 1001").any()
+
+
+def test_county_mask_region():
+    states = cdata.load_county_identifiers()["state_name"].astype(str)
+    southwest = states.isin(cfg.REGIONS["Southwest"])
+    assert matches("region = southwest") == southwest.tolist()
+    assert matches("region != Southwest") == (~southwest).tolist()
+    assert matches("region in (Southwest, 'New England')") == (
+        southwest | states.isin(cfg.REGIONS["New England"])).tolist()
+
+
+def test_county_mask_metric_without_year():
+    df = wide("votes_total_2016", "votes_total_2024")
+    # The map's year, or an error naming one without it
+    assert matches("votes_total > 20000", 2016) == (df["votes_total_2016"] > 20000).tolist()
+    assert matches("votes_total > 20000", 2024) == (df["votes_total_2024"] > 20000).tolist()
+    with pytest.raises(cfilters.FilterError, match="needs a year, like votes_total_2024"):
+        cfilters.county_mask("votes_total > 20000")
+
+
+@pytest.mark.parametrize("text, year, message", [
+    ("year = 2024", None, "'year' isn't a county column: put the year in the metric's name, like votes_total_2024$"),
+    ("year = 2024", 2024, "or leave it out for the map's year"),
+    ("votes_totl_2024 > 1", None, "Unknown column 'votes_totl_2024'. Use region, a county column \\(county_fips"),
+    ("state > Ohio", None, "state_name is text, it can only be compared with =, != or in"),
+    ("state between a and b", None, "state_name is text"),
+    ("votes_total_2024 = many", None, "votes_total_2024 is a number, compare it with numbers"),
+    ("region = Atlantis", None, "Unknown region 'Atlantis', pick one of: New England"),
+    ("region > Southwest", None, "Regions can only be compared with"),
+])
+def test_county_mask_errors(text, year, message):
+    with pytest.raises(cfilters.FilterError, match=message):
+        cfilters.county_mask(text, year)
+
+
+@pytest.mark.parametrize("text", [
+    "not votes_total_2028 < 0",
+    "not (votes_total_2028 < 0 or state = Ohio)",
+    "votes_total_2028 not in (1, 2)",
+    "votes_total_2028 not between 1 and 2",
+    "votes_total_2028 != 1",
+    "not votes_total between 1 and 2",
+])
+def test_negations_never_match_missing_values(published_data, publish_update, text):
+    data_dir, manifest = published_data
+    fips = cdata.load_county_identifiers()["county_fips"][0]
+    # The first results of a new election: every other county has no votes_total_2028
+    publish_update(data_dir, manifest, (fips, 2028, 10, 20, 0))
+    cdata.refresh()
+    assert cdata.get_county_data_overall(["votes_total_2028"])["votes_total_2028"].isna().sum() > 0
+    expected = cdata.load_county_identifiers()["county_fips"] == fips
+    assert cfilters.county_mask(text, 2028).tolist() == expected.tolist()
+
+
+def test_county_mask_shares_sub_masks():
+    cfilters.county_mask("votes_total_2024 > 1000 and state = Ohio")
+    misses = cfilters._mask.cache_info().misses
+    cfilters.county_mask("votes_total_2024 > 1000 and state = Texas")
+    # Only "state = Texas" and the new "and" are computed
+    assert cfilters._mask.cache_info().misses == misses + 2
+    # Aliases and the spelling of keywords and values don't make a new mask
+    cfilters.county_mask("VOTES_TOTAL_2024 > 1e3 AND state_name = Texas")
+    assert cfilters._mask.cache_info().misses == misses + 2
+
+
+def test_row_mask():
+    rows = cdata.county_rows(2024)
+    mask = cfilters.row_mask("state = Ohio", rows["county_fips"], 2024)
+    assert mask.tolist() == (rows["state_name"] == "Ohio").tolist()
+    # Counties the wide data doesn't know never match
+    assert cfilters.row_mask("state != Ohio", np.array(["99999"]), 2024).tolist() == [False]
+    assert cfilters.row_mask(" ", rows["county_fips"]) is None
+
+
+def test_describe():
+    total = len(cdata.load_county_identifiers())
+    ohio = int((cdata.load_county_identifiers()["state_name"] == "Ohio").sum())
+    assert cfilters.describe("state = Ohio") == f"{ohio:,} of {total:,} counties match"
+    assert cfilters.describe("") == ""
+    assert cfilters.describe("state >") == "Filter not applied: Expected a value at the end"
@@ -0,0 +1,49 @@
+import numpy as np
+import county_results_data as cdata
+
+
+def test_treemap_layouts_line_up_with_the_positions(pages):
+    heatmap = pages("heatmap")
+    df = cdata.load_county_data_by_year()
+    layouts = heatmap.build_treemap_layouts(df)
+    states_years = df[["state_name", "year"]].drop_duplicates()
+    assert len(layouts) == len(states_years) * len(heatmap.TREEMAP_SIZE_DIMS)
+
+    for (state, year, size_dim), (positions, rects) in layouts.items():
+        rows = df.iloc[positions]
+        # Every county of the state and year once, Democrat wins first
+        assert (rows["state_name"] == state).all() and (rows["year"] == year).all()
+        group = (df["state_name"] == state) & (df["year"] == year)
+        assert sorted(positions) == np.flatnonzero(group.to_numpy()).tolist()
+        assert rows["margin_in_votes"].is_monotonic_decreasing
+        # One rectangle per county, with an area in proportion to its size column, filling the treemap
+        assert rects.shape == (len(rows), 4)
+        areas = rects[:, 2].astype(float) * rects[:, 3]
+        assert np.isclose(areas.sum(), heatmap.TREEMAP_WIDTH * heatmap.TREEMAP_HEIGHT, rtol=1e-4)
+        sizes = rows[size_dim].astype(float).clip(lower=1e-9).to_numpy()
+        assert np.allclose(areas / areas.sum(), sizes / sizes.sum(), atol=1e-5)
+
+
+def test_treemap_layouts_of_some_rows(pages):
+    heatmap = pages("heatmap")
+    df = cdata.load_county_data_by_year()
+    full = heatmap.build_treemap_layouts(df)
+    rows = np.flatnonzero(((df["state_name"] == "Ohio") & (df["year"] == 2024)).to_numpy())
+    partial = heatmap.build_treemap_layouts(df, rows)
+    assert list(partial) == [("Ohio", 2024, "winning_margin_in_votes_abs")]
+    positions, rects = partial[("Ohio", 2024, "winning_margin_in_votes_abs")]
+    assert positions.tolist() == full[("Ohio", 2024, "winning_margin_in_votes_abs")][0].tolist()
+    assert np.array_equal(rects, full[("Ohio", 2024, "winning_margin_in_votes_abs")][1])
+
+
+def test_heatmap_draws_every_county_of_the_layout(pages):
+    heatmap = pages("heatmap")
+    dff, rects = heatmap.treemap_layout("Ohio", 2024, "winning_margin_in_votes_abs")
+    fig = heatmap.create_heatmap("Ohio", 2024, "margin_bin")
+    # Five corners and a gap per rectangle, across the traces of the color bins
+    outlines = sum(len(trace.x) for trace in fig.data if trace.mode == "lines")
+    assert outlines == 6 * len(rects) == 6 * len(dff)
+    # The hover markers sit on the rectangles, in the same order
+    markers = fig.data[-1]
+    assert np.allclose(markers.x, rects[:, 0] + rects[:, 2] / 2)
+    assert [row[0] for row in markers.customdata] == dff["county_name"].astype(str).tolist()
@@ -0,0 +1,40 @@
+import numpy as np
+import pandas as pd
+import county_results_data as cdata
+import county_results_utils as cutils
+
+
+def hover_frame(fips):
+    df = pd.DataFrame({field: [f"{field} {i}" for i in range(len(fips))] for field in cutils.HOVER_FIELDS})
+    return df.set_index(pd.Index(fips, name="county_fips"))
+
+
+def test_build_hover_customdata_follows_the_trace_order():
+    ix = hover_frame(["01001", "01003", "01005"])
+    customdata = cutils.build_hover_customdata(ix, ["01005", "01001", "99999"])
+    assert customdata[:, 0].tolist()[:2] == ["county_name 2", "county_name 0"]
+    # Unknown counties get no hover values
+    assert all(pd.isna(value) for value in customdata[2])
+    assert cutils.build_hover_customdata(ix.iloc[:0], ["01001"]).shape == (1, len(cutils.HOVER_FIELDS))
+
+
+def test_build_hover_customdata_with_duplicate_fips():
+    ix = hover_frame(["01001", "01003", "01001"])
+    customdata = cutils.build_hover_customdata(ix, ["01003", "01001", "01001"])
+    # The first row of a duplicated FIPS
+    assert customdata[:, 0].tolist() == ["county_name 1", "county_name 0", "county_name 0"]
+    parts = cutils.build_hover_customdata_by_trace(ix, [["01001"], ["01003", "01001"]])
+    assert [part[:, 0].tolist() for part in parts] == [["county_name 0"], ["county_name 1", "county_name 0"]]
+
+
+def test_map_hovers_with_duplicate_fips(pages, monkeypatch):
+    nationwide_map = pages("nationwide_map")
+    rows = cdata.county_rows(2024)
+    # A county listed twice, like FIPS 11001 in some years of the raw data
+    duplicated = pd.concat([rows, rows.iloc[:1]], ignore_index=True)
+    monkeypatch.setattr(cdata, "county_rows", lambda year, state_name=None: duplicated)
+    fig = nationwide_map.create_map(2024, "All", "margin_bin")
+    names = dict(zip(rows["county_fips"].str.zfill(5), rows["county_name"].astype(str)))
+    for trace in fig.data:
+        assert np.asarray(trace.customdata)[:, 0].tolist() == [names[fips] for fips in trace.locations]
+    assert sum(len(trace.locations) for trace in fig.data) == len(duplicated)
@@ -0,0 +1,140 @@
+import os
+import numpy as np
+import pandas as pd
+import pytest
+from county_results import bins as cbins
+from county_results import ingest as cingest
+import ingest_results
+
+
+@pytest.fixture
+def table():
+    table, _ = ingest_results.load_published(os.environ["COUNTY_RESULTS_DATA_DIR"])
+    return table
+
+
+def updates(*rows):
+    return pd.DataFrame(rows, columns=cingest.KEY_COLUMNS + cingest.VOTE_COLUMNS)
+
+
+def county(table, fips):
+    return table.df[table.df["county_fips"] == fips].set_index("year")
+
+
+def test_read_update_file(tmp_path):
+    path = tmp_path / "update.csv"
+    path.write_text(
+        "county_fips,year,votes_democrat,votes_republican,votes_total\n"
+        "1001,2024,10,20,35\n"
+        "6037.0,2024,7,3,10\n"
+    )
+    df = cingest.read_update_file(path)
+    assert df.columns.tolist() == cingest.KEY_COLUMNS + cingest.VOTE_COLUMNS
+    assert df["county_fips"].tolist() == ["01001", "06037"]
+    assert df["votes_other"].tolist() == [5, 0]
+
+
+def test_latest_updates_keeps_the_last_counts():
+    first = updates(("01001", 2024, 1, 2, 3), ("01003", 2024, 1, 1, 1))
+    second = updates(("01001", 2024, 5, 6, 7))
+    latest = cingest.latest_updates([first, second]).sort_values("county_fips")
+    assert latest.values.tolist() == [["01001", 2024, 5, 6, 7], ["01003", 2024, 1, 1, 1]]
+
+
+def test_compute_results():
+    rows = cingest.compute_results(updates(
+        ("a", 2024, 60, 30, 10), ("b", 2024, 40, 40, 20), ("c", 2024, 20, 10, 70), ("d", 2023, 0, 0, 0),
+    ))
+    assert rows["votes_total"].tolist() == [100, 100, 100, 0]
+    assert rows["votes_pct_democrat"].tolist()[:3] == [0.6, 0.4, 0.2]
+    assert rows["votes_pct_two_party_democrat"].tolist()[:3] == [0.66667, 0.5, 0.66667]
+    # Ties go to the Democrat
+    assert rows["winning_party"].tolist()[:3] == ["DEMOCRAT", "DEMOCRAT", "OTHER"]
+    assert rows["winning_margin"].tolist()[:3] == [0.3, 0.0, 0.5]
+    assert rows["winning_two_party_margin"].tolist()[:3] == [0.3, 0.0, 0.0]
+    national_dem, national_rep = cingest.NATIONAL_VOTE_PCT[2024]
+    assert rows["votes_pct_partisan_index"][0] == round(((0.6 - national_dem) - (0.3 - national_rep)) / 2, 5)
+    # No votes and no national result: missing, not an error
+    assert rows.iloc[3][["votes_pct_democrat", "winning_margin", "votes_pct_partisan_index"]].isna().all()
+
+
+def test_compute_swing():
+    rows = pd.DataFrame({
+        "county_fips": ["b", "a", "a", "b", "a"],
+        "year": [2020, 2024, 2016, 2016, 2020],
+        "votes_pct_democrat": [0.5, 0.45, 0.4, 0.3, 0.5],
+        "votes_pct_republican": [0.5, 0.55, 0.6, 0.7, 0.5],
+    })
+    swing = cingest.compute_swing(rows)
+    assert swing.index.tolist() == rows.index.tolist()
+    assert swing[0] == 0.4 and swing[1] == -0.1 and swing[4] == 0.2
+    assert np.isnan(swing[2]) and np.isnan(swing[3])
+
+
+def test_apply_rows_leaves_the_frame_unchanged():
+    df = pd.DataFrame({
+        "county_fips": ["01001", "01001", "01003"],
+        "year": [2020, 2024, 2024],
+        "votes_total": [10, 20, 30],
+        "state_name": pd.Categorical(["Alabama"] * 3),
+    })
+    rows = pd.DataFrame({
+        "county_fips": ["01003", "01005"], "year": [2024, 2024], "votes_total": [31, 40],
+        "state_name": ["Alabama", "Alaska"], "ignored": [1, 2],
+    })
+    new, positions, appended = cingest.apply_rows(df, rows)
+    assert df["votes_total"].tolist() == [10, 20, 30]
+    assert new["votes_total"].tolist() == [10, 20, 31, 40]
+    assert positions.tolist() == [2, 3] and appended
+    assert "ignored" not in new.columns
+    assert isinstance(new["state_name"].dtype, pd.CategoricalDtype)
+    assert new["state_name"].tolist() == ["Alabama", "Alabama", "Alabama", "Alaska"]
+
+    new, positions, appended = cingest.apply_rows(df, rows.iloc[:1])
+    assert positions.tolist() == [2] and not appended
+    assert new["votes_total"].tolist() == [10, 20, 31]
+
+
+def test_upsert_recomputes_the_rows_and_the_next_swing(table):
+    before = county(table, "01001")
+    changed, unknown = table.upsert(updates(("01001", 2020, 1000, 3000, 0)))
+    after = county(table, "01001")
+    assert len(unknown) == 0
+    assert after.loc[2020, "votes_total"] == 4000
+    assert after.loc[2020, "votes_pct_democrat"] == 0.25
+    assert after.loc[2020, "winning_party"] == "REPUBLICAN"
+    # 2020's own swing and 2024's, against the new 2020
+    for year in (2020, 2024):
+        previous = after.loc[year - 4]
+        expected = round(
+            (after.loc[year, "votes_pct_democrat"] - previous["votes_pct_democrat"])
+            - (after.loc[year, "votes_pct_republican"] - previous["votes_pct_republican"]), 5
+        )
+        assert after.loc[year, "votes_pct_swing_from_prev_election"] == pytest.approx(expected)
+    # Only the rows that changed are reported, with their bins
+    assert sorted(changed["year"]) == [2020, 2024]
+    assert (changed["county_fips"] == "01001").all()
+    assert changed["margin_bin_code"].tolist() == cbins.add_bin_codes(changed.copy())["margin_bin_code"].tolist()
+    assert after.loc[2016].equals(before.loc[2016])
+
+
+def test_upsert_unknown_counties_new_years_and_no_ops(table):
+    rows = len(table.df)
+    latest = county(table, "01003").loc[2024]
+    changed, unknown = table.upsert(updates(
+        ("99999", 2024, 1, 2, 3),
+        ("01003", 2028, 300, 200, 0),
+    ))
+    assert unknown["county_fips"].tolist() == ["99999"]
+    assert len(table.df) == rows + 1
+    # A new election: the county's other columns come from its latest year
+    new = county(table, "01003").loc[2028]
+    assert new["county_name"] == latest["county_name"]
+    assert new["population_total"] == latest["population_total"]
+    assert new["votes_pct_democrat"] == 0.6
+    assert changed["year"].tolist() == [2028]
+
+    # The same counts again change nothing
+    changed, unknown = table.upsert(updates(("01003", 2028, 300, 200, 0)))
+    assert len(changed) == 0 and len(unknown) == 0
+    assert len(table.df) == rows + 1
@@ -0,0 +1,57 @@
+import re
+import sys
+import pytest
+import county_results_metrics as cmetrics
+from measure_workers import callback_payload
+
+SAMPLE = re.compile(r'(\w+)\{callback="([^"]+)",pid="\d+"(?:,le="([^"]+)")?\} (\S+)')
+
+
+def samples(text):
+    """(metric, callback, le or None) -> value of every sample line of render_metrics()."""
+    return {
+        (match[1], match[2], match[3]): float(match[4])
+        for match in map(SAMPLE.fullmatch, text.splitlines()) if match
+    }
+
+
+def test_render_metrics_cumulative_buckets(monkeypatch):
+    monkeypatch.setattr(cmetrics, "_histograms", {})
+    for value in (0.003, 0.2, 30.0):
+        cmetrics.observe("callback_compute_seconds", "page.callback", value)
+    text = cmetrics.render_metrics()
+    assert "# TYPE callback_compute_seconds histogram" in text.splitlines()
+    values = samples(text)
+    # Each bucket counts the observations up to its bound, +Inf all of them
+    buckets = {le: values[("callback_compute_seconds_bucket", "page.callback", le)] for le in ("0.005", "0.25", "10", "+Inf")}
+    assert buckets == {"0.005": 1, "0.25": 2, "10": 2, "+Inf": 3}
+    assert values[("callback_compute_seconds_sum", "page.callback", None)] == pytest.approx(30.203)
+    assert values[("callback_compute_seconds_count", "page.callback", None)] == 3
+    # Metrics without observations have only their header
+    assert not any(key[0].startswith("callback_response_bytes") for key in values)
+
+
+def test_metrics_endpoint_records_callback_requests(pages, monkeypatch):
+    pages("nationwide_map")
+    monkeypatch.setattr(cmetrics, "_histograms", {})
+    client = sys.modules["app"].app.server.test_client()
+    body = callback_payload("county-filter-message-dual.children", {
+        ("county-filter-dual", "value"): "votes_total > 1000",
+        ("year-dropdown-dual", "value"): 2024,
+    })
+    for _ in range(2):
+        assert client.post("/_dash-update-component", json=body).status_code == 200
+    # Not a callback: not recorded
+    client.get("/metrics")
+
+    response = client.get("/metrics")
+    assert response.mimetype == "text/plain"
+    values = samples(response.get_data(as_text=True))
+    callback = "nationwide_map.update_filter_message"
+    assert {key[1] for key in values} == {callback}
+    for metric in cmetrics.METRICS:
+        assert values[(f"{metric}_count", callback, None)] == 2
+        assert values[(f"{metric}_bucket", callback, "+Inf")] == 2
+    assert values[("callback_response_bytes_sum", callback, None)] > 0
+    # The whole request takes at least as long as the callback in it
+    assert values[("callback_request_seconds_sum", callback, None)] >= values[("callback_compute_seconds_sum", callback, None)]
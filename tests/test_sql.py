@@ -0,0 +1,60 @@
+import os
+import sqlite3
+import threading
+import numpy as np
+import pandas as pd
+import pytest
+import county_results_data as cdata
+import county_results_sql as csql
+
+
+@pytest.fixture
+def database(tmp_path, monkeypatch):
+    """The shared data set as the pipeline's database has it (without the bin codes it adds when saving)."""
+    source = os.path.join(cdata.DATA_DIR, "source", "county_election_data_by_year.csv")
+    df = pd.read_csv(source, dtype={"county_fips": str})
+    path = str(tmp_path / "us_county_election_results.db")
+    with sqlite3.connect(path) as con:
+        df.drop(columns=[c for c in df.columns if c.endswith("_code")]).to_sql(csql.TABLE, con, index=False)
+    con.close()
+    monkeypatch.setattr(csql, "DATABASE", path)
+    # Connections of an earlier database stay with the thread otherwise
+    monkeypatch.setattr(csql, "_local", threading.local())
+    return path
+
+
+def assert_same_rows(rows, expected):
+    rows, expected = rows.reset_index(drop=True), expected.reset_index(drop=True)
+    for column in expected.columns:
+        if pd.api.types.is_numeric_dtype(expected[column]) and not pd.api.types.is_bool_dtype(expected[column]):
+            assert np.allclose(rows[column].astype(float), expected[column].astype(float), equal_nan=True), column
+        else:
+            assert rows[column].astype(object).where(rows[column].notna(), None).tolist() == \
+                expected[column].astype(object).where(expected[column].notna(), None).tolist(), column
+
+
+@pytest.mark.parametrize("state_name", [None, "Ohio"])
+def test_sqlite_county_rows_match_the_memory_backend(database, state_name):
+    expected = cdata.county_rows(2024, state_name)
+    rows = csql.county_rows(2024, state_name)
+    assert len(rows) == len(expected) > 0
+    # Every column the pages use, with the derived ones and the bins
+    assert set(expected.columns) <= set(rows.columns)
+    assert_same_rows(rows, expected)
+
+
+def test_sqlite_state_summaries_match_the_memory_backend(database):
+    for state_name in ["All", "Ohio", "Texas"]:
+        for year in cdata.load_available_years():
+            assert csql.state_summary(state_name, year) == pytest.approx(cdata.get_state_summary(state_name, year))
+    assert csql.state_summary("Ohio", 1999) is None
+
+
+def test_sqlite_sees_a_changed_database(database):
+    before = csql.county_rows(2024, "Ohio")
+    with sqlite3.connect(database) as con:
+        con.execute(f"update {csql.TABLE} set votes_democrat = votes_democrat + 1000000 where state_name = 'Ohio'")
+    con.close()
+    after = csql.county_rows(2024, "Ohio")
+    assert after is not before
+    assert (after["votes_democrat"] - before["votes_democrat"] == 1000000).all()
@@ -0,0 +1,41 @@
+import pandas as pd
+import pytest
+import county_results_data as cdata
+import county_results_utils as cutils
+
+
+def assert_same_summary(summary, expected):
+    assert summary.keys() == expected.keys()
+    for key, value in expected.items():
+        assert summary[key] == (pytest.approx(value) if isinstance(value, float) else value), key
+
+
+def test_build_state_summaries_match_calculate_state_summary():
+    df = cdata.load_county_data_by_year()
+    summaries = cutils.build_state_summaries(df)
+    keys = set(zip(df["state_name"].astype(str), df["year"]))
+    assert set(summaries) == keys | {("All", year) for year in cdata.load_available_years()}
+    for state_name, year in keys:
+        assert_same_summary(summaries[(state_name, year)], cutils.calculate_state_summary(df, state_name, year))
+    # National rows: every county's votes, as one "state"
+    national = cutils.calculate_state_summary(df.assign(state_name="United States"), "United States", 2024)
+    assert_same_summary(summaries[("All", 2024)], national)
+    assert cdata.get_state_summary("Ohio", 2024) == summaries[("Ohio", 2024)]
+    assert cdata.get_state_summary("Ohio", 1999) is None
+
+
+def test_update_state_summaries_match_a_rebuild():
+    df = cdata.load_county_data_by_year().reset_index(drop=True)
+    summaries = cutils.build_state_summaries(df)
+    changed = df.index[(df["state_name"] == "Ohio") & (df["year"] == 2024)][:3]
+    new = df.copy()
+    # The Republican takes the lead in a few counties, and a new year starts with one county
+    new.loc[changed, "votes_republican"] += 10_000_000
+    added = new.loc[changed[:1]].assign(year=2028)
+    new = pd.concat([new, added], ignore_index=True)
+
+    updated = cutils.update_state_summaries(summaries, df.loc[changed], pd.concat([new.loc[changed], added]))
+    assert updated == cutils.build_state_summaries(new)
+    assert updated[("Ohio", 2024)]["winner"] == "Republican"
+    # The original is left as it was
+    assert summaries == cutils.build_state_summaries(df)
@@ -0,0 +1,120 @@
+import threading
+import time
+import numpy as np
+import pandas as pd
+import pytest
+import county_results_utils as cutils
+
+
+def test_single_flight_cache_caches_results():
+    calls = []
+
+    @cutils.single_flight_cache(maxsize=2)
+    def square(x):
+        calls.append(x)
+        return x * x
+
+    assert [square(2), square(2), square(3)] == [4, 4, 9]
+    assert calls == [2, 3]
+    assert square.cache_info() == cutils.CacheInfo(hits=1, misses=2, maxsize=2, currsize=2)
+    # Least recently used is dropped past maxsize
+    square(4)
+    square(2)
+    assert calls == [2, 3, 4, 2]
+
+
+def test_single_flight_cache_computes_once_for_concurrent_callers():
+    started, release = threading.Event(), threading.Event()
+    calls = []
+
+    @cutils.single_flight_cache()
+    def slow(x):
+        calls.append(x)
+        started.set()
+        release.wait(5)
+        return object()
+
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(slow(1))) for _ in range(4)]
+    threads[0].start()
+    started.wait(5)
+    for thread in threads[1:]:
+        thread.start()
+    time.sleep(0.05)
+    release.set()
+    for thread in threads:
+        thread.join(5)
+    assert calls == [1]
+    assert len(results) == 4 and all(result is results[0] for result in results)
+    assert slow.cache_in_flight() == 0
+
+
+def test_single_flight_cache_failures_leave_nothing_behind():
+    attempts = []
+
+    @cutils.single_flight_cache(maxsize=None)
+    def parse(text):
+        attempts.append(text)
+        if text.startswith("bad"):
+            raise ValueError(text)
+        return text.upper()
+
+    for i in range(100):
+        with pytest.raises(ValueError):
+            parse(f"bad {i}")
+    # Neither a lock per failed call nor a cached failure
+    assert parse.cache_in_flight() == 0
+    assert parse.cache_info().currsize == 0
+    with pytest.raises(ValueError):
+        parse("bad 0")
+    assert attempts.count("bad 0") == 2
+    assert parse("ok") == "OK"
+
+
+def test_single_flight_cache_generations_and_carry_over():
+    generation = [1]
+
+    @cutils.single_flight_cache(maxsize=None, generation=lambda: generation[0])
+    def double(x):
+        return 2 * x * generation[0]
+
+    assert [double(1), double(2)] == [2, 4]
+    double.carry_over(1, 2, lambda args, result: None if args == (2,) else result)
+    generation[0] = 2
+    # Carried over as it was, and recomputed for the new generation
+    assert double(1) == 2
+    assert double(2) == 8
+    # Only the two newest generations are kept
+    generation[0] = 3
+    double(1)
+    assert double.cache_info().currsize == 3
+
+
+def test_format_margin_text():
+    margins = pd.Series([1234.0, -56.0, None, 0.0])
+    assert cutils.format_margin_text(margins).tolist() == ["D +1,234", "R +56", "", "R +0"]
+
+
+def test_bin_points_2d_totals():
+    rng = np.random.default_rng(0)
+    x, y, weights = rng.normal(size=1000), rng.uniform(-1, 1, size=1000), rng.integers(1, 100, size=1000)
+    x[:5] = np.nan
+    grid = cutils.bin_points_2d(x, y, 20, weights=weights)
+    finite = np.isfinite(x)
+    # The same cells as numpy's histogram over the data's range, upper edges included
+    counts, _, _ = np.histogram2d(x[finite], y[finite], bins=[grid["x_edges"], grid["y_edges"]])
+    assert np.array_equal(grid["counts"], counts)
+    assert grid["counts"].sum() == finite.sum()
+    assert grid["weighted"].sum() == weights[finite].sum()
+    assert (grid["cell"][~finite] == -1).all()
+    cells = grid["cell"][finite]
+    assert np.array_equal(np.bincount(cells, minlength=400).reshape(20, 20), grid["counts"])
+
+
+def test_bin_points_2d_fixed_ranges():
+    grid = cutils.bin_points_2d([0.0, 0.5, 1.0, 2.0], [0.0, 0.5, 1.0, 0.5], 2, x_range=(0, 1), y_range=(0, 1))
+    # The point past the x range is off the grid; the one on the upper edge is in the last cell
+    assert grid["cell"].tolist() == [0, 3, 3, -1]
+    assert grid["counts"].tolist() == [[1, 0], [0, 2]]
+    assert grid["weighted"] is None
+    assert cutils.bin_points_2d([], [], 3)["counts"].sum() == 0